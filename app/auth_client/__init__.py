@@ -3,6 +3,10 @@ from fastapi.security import OAuth2PasswordBearer
 from loguru import logger
 
 from app.auth_client.auth_client import AuthClient
+from app.auth_client.user_info_cache import UserInfoCache
+from app.core.settings import Settings
+from app.core.tracing import tracer
+from app.schemas.enums import TokenVerification
 from app.schemas.users import UserInfo
 
 security_scheme: OAuth2PasswordBearer = OAuth2PasswordBearer(
@@ -10,20 +14,26 @@ security_scheme: OAuth2PasswordBearer = OAuth2PasswordBearer(
 )
 
 
-def logged_user(
+async def logged_user(
         request: Request,
         token: str = Depends(security_scheme),
-        client: AuthClient = Depends(AuthClient.create_client)
+        client: AuthClient = Depends(AuthClient.create_client),
+        settings: Settings = Depends(Settings.get)
 ) -> UserInfo:
     """
     Returns id of currently logged user.
     :param request: current request
     :param client: identity provider client
     :param token: access token
+    :param settings: app settings
     :return: user id
     :rtype: str
     """
-    user_info = client.fetch_user_info(token)
+    with tracer.start_as_current_span('logged_user'):
+        if settings.auth_token_verification == TokenVerification.LOCAL:
+            user_info = await UserInfoCache.get().fetch_user_info(token, client)
+        else:
+            user_info = await client.fetch_user_info(token)
 
     logger.info(
         f'User: {user_info.email} accessed: |{request.method}| => {request.url}'
@@ -1,30 +1,46 @@
 from __future__ import annotations
 
-from typing import List
+import asyncio
+from time import perf_counter
+from typing import List, Dict, Any, Optional, Union
 
-from fusionauth.fusionauth_client import FusionAuthClient
-from fusionauth.rest_client import ClientResponse
+import httpx
+from fastapi import Request
+from loguru import logger
 
 from app.schemas.tokens import Token
 from app.schemas.users import UserRegistrationForm, UserInfo, RegistrationRequest, \
     AppRegistrationForm, UserSignUp
+from ..core.metrics import auth_request_duration, auth_request_errors
 from ..core.settings import Settings
-from ..errors import UserSignUpError, UserSignInError, UserInfoNotFoundError
+from ..core.tracing import traced
+from ..errors import UserSignUpError, UserSignInError, UserInfoNotFoundError, AuthServiceUnavailableError
 
 
+@traced
 class AuthClient:
     """
-    Provides a way to communicate with authentication and authorization service.
+    | Provides a way to communicate with authentication and authorization service.
+    | One instance is shared by all requests handled by a worker, so connections
+    | to identity provider are kept alive and reused. Number of concurrent requests
+    | is bounded, requests over the limit wait for a free connection.
     """
 
-    def __init__(self) -> None:
-        self._settings: Settings = Settings.get()
-        self._client: FusionAuthClient = FusionAuthClient(
-            self._settings.api_key.get_secret_value(),
-            self._settings.auth_provider_url
+    def __init__(self, settings: Settings, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self._settings: Settings = settings
+        self._client: httpx.AsyncClient = httpx.AsyncClient(
+            base_url=settings.auth_provider_url,
+            timeout=settings.auth_request_timeout_seconds,
+            limits=httpx.Limits(
+                max_connections=settings.auth_max_connections,
+                max_keepalive_connections=settings.auth_max_keepalive_connections
+            ),
+            transport=transport
         )
+        # created lazily - it must belong to the event loop that serves requests
+        self._semaphore: Optional[asyncio.Semaphore] = None
 
-    def register_user(self, user: UserSignUp, roles: List[str]) -> UserInfo:
+    async def register_user(self, user: UserSignUp, roles: List[str]) -> UserInfo:
         """
         Creates new user account and registers it with selected application.
         :rtype: UserInfo
@@ -45,51 +61,115 @@ class AuthClient:
             )
         ).dict(exclude_none=True)
 
-        response: ClientResponse = self._client.register(request)
+        response: httpx.Response = await self._send(
+            'POST', '/api/user/registration',
+            json=request,
+            headers={'authorization': self._settings.api_key.get_secret_value()}
+        )
 
-        if response.was_successful():
-            return UserInfo(**response.success_response['user'])
+        if not response.is_error:
+            return UserInfo(**response.json()['user'])
         else:
-            raise UserSignUpError(response.error_response)
+            raise UserSignUpError(self._error_message(response))
 
-    def login_user(self, email: str, password: str) -> Token:
+    async def login_user(self, email: str, password: str) -> Token:
         """
         Obtains access token - password grant type.
         :rtype: Token
         """
-        response = self._client.exchange_user_credentials_for_access_token(
-            username=email,
-            password=password,
-            client_id=self._settings.client_id.get_secret_value(),
-            client_secret=self._settings.client_secret.get_secret_value()
+        response: httpx.Response = await self._send(
+            'POST', '/oauth2/token',
+            data={
+                'grant_type': 'password',
+                'username': email,
+                'password': password,
+                'client_id': self._settings.client_id.get_secret_value(),
+                'client_secret': self._settings.client_secret.get_secret_value()
+            }
         )
 
-        if response.was_successful():
-            return Token(**response.success_response)
+        if not response.is_error:
+            return Token(**response.json())
         else:
-            raise UserSignInError(response.error_response)
+            raise UserSignInError(self._error_message(response))
 
-    def fetch_user_info(self, access_token: str) -> UserInfo:
+    async def fetch_user_info(self, access_token: str) -> UserInfo:
         """
         Fetches info about user from valid access token.
         :param access_token: access token obtained after signing in
         :return: information about logged user
         :rtype: UserInfo
         """
-        response: ClientResponse = self._client.retrieve_user_using_jwt(access_token)
+        response: httpx.Response = await self._send(
+            'GET', '/api/user',
+            headers={'authorization': f'Bearer {access_token}'}
+        )
+
+        if not response.is_error:
+            return UserInfo(**response.json()['user'])
+        else:
+            raise UserInfoNotFoundError(
+                error_code=response.status_code,
+                error_message=self._error_message(response)
+            )
+
+    async def fetch_json_web_keys(self) -> Dict[str, Any]:
+        """
+        Fetches public keys used by identity provider to sign access tokens.
+        :return: JSON Web Key Set
+        :rtype: Dict[str, Any]
+        """
+        response: httpx.Response = await self._send('GET', '/.well-known/jwks.json')
 
-        if response.was_successful():
-            return UserInfo(**response.success_response['user'])
+        if not response.is_error:
+            return response.json()
         else:
             raise UserInfoNotFoundError(
-                error_code=response.status,
-                error_message=response.error_response
+                error_code=response.status_code,
+                error_message=self._error_message(response)
             )
 
+    async def close(self) -> None:
+        """
+        Closes all connections to identity provider.
+        """
+        await self._client.aclose()
+
+    async def _send(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._settings.auth_max_connections)
+
+        # waiting for a free connection is included, it's part of the latency requests see
+        start: float = perf_counter()
+        try:
+            async with self._semaphore:
+                response: httpx.Response = await self._client.request(method, url, **kwargs)
+        except httpx.HTTPError as error:
+            logger.error(f'Identity provider request |{method}| {url} failed: {error!r}')
+            auth_request_errors.labels(url, 'unavailable').inc()
+            raise AuthServiceUnavailableError()
+        finally:
+            auth_request_duration.labels(url).observe(perf_counter() - start)
+
+        if response.is_error:
+            auth_request_errors.labels(url, str(response.status_code)).inc()
+        return response
+
+    @staticmethod
+    def _error_message(response: httpx.Response) -> Union[str, Dict[str, Any]]:
+        try:
+            error_message: Any = response.json()
+        except ValueError:
+            error_message = response.text
+
+        if isinstance(error_message, dict) or (isinstance(error_message, str) and error_message):
+            return error_message
+        return response.reason_phrase
+
     @classmethod
-    def create_client(cls) -> AuthClient:
+    def create_client(cls, request: Request) -> AuthClient:
         """
-        Returns new instance of self.
+        Returns client shared by whole worker.
         :rtype: AuthClient
         """
-        return AuthClient()
+        return request.app.state.auth_client
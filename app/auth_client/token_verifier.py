@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from functools import lru_cache
+import asyncio
+from time import monotonic
+from typing import Dict, Any, Optional, Tuple
+
+import jwt
+from jwt.algorithms import get_default_algorithms, Algorithm
+from loguru import logger
+
+from .auth_client import AuthClient
+from ..core.settings import Settings
+from ..errors import UserInfoNotFoundError, AuthServiceUnavailableError
+
+
+class TokenVerifier:
+    """
+    | Verifies access tokens locally, without calling identity provider.
+    | Public keys of identity provider (JWKS) are cached. They are fetched again
+    | when cache expires or when token is signed with a key that isn't known yet.
+    """
+
+    min_refresh_interval_seconds: float = 30
+    """Prevents tokens with made up key ids from forcing JWKS download on every request"""
+
+    def __init__(self, settings: Settings) -> None:
+        self._settings: Settings = settings
+        self._algorithms: Dict[str, Algorithm] = get_default_algorithms()
+        self._keys: Dict[str, Tuple[str, Any]] = {}
+        self._fetched_at: Optional[float] = None
+        # created lazily - it must belong to the event loop that serves requests
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def verify(self, access_token: str, client: AuthClient) -> Dict[str, Any]:
+        """
+        Checks signature, expiration, audience and issuer of access token.
+        :param access_token: access token obtained after signing in
+        :param client: identity provider client, used to fetch public keys
+        :return: claims of the token
+        :raises UserInfoNotFoundError: token is invalid
+        """
+        try:
+            header: Dict[str, Any] = jwt.get_unverified_header(access_token)
+        except jwt.PyJWTError as error:
+            raise self._invalid_token(error)
+
+        algorithm: str = header.get('alg', '')
+        key: Any
+
+        if algorithm == 'HS256' and self._settings.jwt_hmac_secret:
+            key = self._settings.jwt_hmac_secret.get_secret_value()
+        else:
+            public_key: Optional[Tuple[str, Any]] = await self._find_key(header.get('kid'), client)
+            if public_key is None or public_key[0] != algorithm:
+                raise self._invalid_token('Token is signed with unknown key.')
+            key = public_key[1]
+
+        try:
+            claims: Dict[str, Any] = jwt.decode(
+                access_token,
+                key=key,
+                algorithms=[algorithm],
+                audience=self._settings.app_id.get_secret_value(),
+                issuer=self._settings.jwt_issuer,
+                options={'require': ['exp', 'sub']}
+            )
+        except jwt.PyJWTError as error:
+            raise self._invalid_token(error)
+
+        return claims
+
+    async def _find_key(self, key_id: Optional[str], client: AuthClient) -> Optional[Tuple[str, Any]]:
+        if key_id is None:
+            return None
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            age: float = monotonic() - self._fetched_at if self._fetched_at is not None else float('inf')
+
+            if age > self._settings.jwks_cache_ttl_seconds or \
+                    (key_id not in self._keys and age > self.min_refresh_interval_seconds):
+                await self._refresh_keys(client)
+
+            return self._keys.get(key_id)
+
+    async def _refresh_keys(self, client: AuthClient) -> None:
+        try:
+            key_set: Dict[str, Any] = await client.fetch_json_web_keys()
+        except (UserInfoNotFoundError, AuthServiceUnavailableError) as error:
+            # identity provider unavailable - keep using keys fetched earlier
+            logger.warning(f'Fetching JSON Web Key Set failed: {error}')
+            return
+
+        keys: Dict[str, Tuple[str, Any]] = {}
+        for json_web_key in key_set.get('keys', []):
+            algorithm: str = json_web_key.get('alg', '')
+            try:
+                if algorithm == 'none' or algorithm.startswith('HS'):
+                    raise jwt.InvalidKeyError('Only public keys are accepted.')
+                keys[json_web_key['kid']] = (
+                    algorithm, self._algorithms[algorithm].from_jwk(json_web_key)
+                )
+            except (KeyError, jwt.PyJWTError):
+                logger.warning(f"Unsupported JSON Web Key skipped: {json_web_key.get('kid')}")
+
+        self._keys = keys
+        self._fetched_at = monotonic()
+
+    @staticmethod
+    def _invalid_token(reason: Any) -> UserInfoNotFoundError:
+        return UserInfoNotFoundError(error_code=401, error_message=f'Invalid access token. {reason}')
+
+    @classmethod
+    @lru_cache()
+    def get(cls) -> TokenVerifier:
+        """
+        Returns verifier shared by whole process.
+        :rtype: TokenVerifier
+        """
+        return TokenVerifier(Settings.get())
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import hashlib
+from functools import lru_cache
+from time import time
+from typing import Dict, Any, Optional
+
+from .auth_client import AuthClient
+from .token_verifier import TokenVerifier
+from ..core.settings import Settings
+from ..core.ttl_cache import TTLCache
+from ..errors import UserInfoNotFoundError
+from ..schemas.users import UserInfo
+
+
+class UserInfoCache:
+    """
+    | Resolves access tokens to user info with as few identity provider calls as possible.
+    | Token is verified locally first, then user info is served from cache.
+    | Identity provider is asked only on cache miss.
+    """
+
+    def __init__(self, settings: Settings, token_verifier: TokenVerifier) -> None:
+        self._token_verifier: TokenVerifier = token_verifier
+        self._cache: TTLCache[str, UserInfo] = TTLCache(
+            settings.user_info_cache_max_size, settings.user_info_cache_ttl_seconds
+        )
+
+    async def fetch_user_info(self, access_token: str, client: AuthClient) -> UserInfo:
+        """
+        Returns info about user identified by access token.
+        :param access_token: access token obtained after signing in
+        :param client: identity provider client, used on cache miss
+        :return: information about logged user
+        :rtype: UserInfo
+        :raises UserInfoNotFoundError: token is invalid
+        """
+        claims: Dict[str, Any] = await self._token_verifier.verify(access_token, client)
+
+        # raw tokens are never kept in memory
+        token_hash: str = hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+
+        user_info: Optional[UserInfo] = self._cache.get(token_hash)
+        if user_info is not None:
+            return user_info
+
+        user_info = await client.fetch_user_info(access_token)
+
+        if user_info.id != claims['sub']:
+            raise UserInfoNotFoundError(
+                error_code=401, error_message='Access token subject does not match user.'
+            )
+
+        # cached user info must not outlive token
+        self._cache.set(token_hash, user_info, ttl_seconds=claims['exp'] - time())
+
+        return user_info
+
+    def invalidate(self, access_token: str) -> None:
+        self._cache.invalidate(hashlib.sha256(access_token.encode('utf-8')).hexdigest())
+
+    @classmethod
+    @lru_cache()
+    def get(cls) -> UserInfoCache:
+        """
+        Returns cache shared by whole process.
+        :rtype: UserInfoCache
+        """
+        return UserInfoCache(Settings.get(), TokenVerifier.get())
@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import suppress
 from typing import Callable, Any
 
 from aredis import StrictRedis
@@ -5,6 +7,10 @@ from databases import Database
 from fastapi import FastAPI, Response, Request
 
 from .logging import configure_logging
+from .metrics import register_metrics, instrument_database, InstrumentedRedis
+from .tracing import configure_tracing, register_tracing
+from .ttl_cache import TTLCache
+from ..auth_client.auth_client import AuthClient
 from .settings import Settings
 from ..errors import register_error_handlers
 from ..routers import register_routers
@@ -43,7 +49,33 @@ def create_app() -> FastAPI:
     )
 
     # register redis
-    redis: StrictRedis = StrictRedis.from_url(_settings.redis_dsn)
+    redis: StrictRedis = (
+        InstrumentedRedis if _settings.metrics_enabled or _settings.tracing_enabled else StrictRedis
+    ).from_url(_settings.redis_dsn)
+
+    # register metrics middleware and endpoint
+    if _settings.metrics_enabled:
+        instrument_database(db_pool)
+        register_metrics(app)
+
+    # register tracing middleware, spans are written to file
+    if _settings.tracing_enabled:
+        configure_tracing(_settings)
+        register_tracing(app)
+
+    # register identity provider client, shared by all requests of this worker
+    app.state.auth_client = AuthClient(_settings)
+
+    # register metadata cache of downloaded files, shared by all requests of this worker
+    app.state.file_metadata_cache = TTLCache(
+        _settings.file_metadata_cache_max_size, _settings.file_metadata_cache_ttl_seconds
+    )
+
+    # background removal of blobs left by abandoned uploads
+    app.state.blob_reaper_task = None
+
+    # background removal of blobs queued when files were deleted or updated
+    app.state.blob_deletion_task = None
 
     # register database middleware
     @app.middleware('http')
@@ -68,19 +100,51 @@ def create_app() -> FastAPI:
     async def startup() -> None:
         """
         Starts database connection pool
-        with application start.
+        (and blob reaper and deletion worker, if enabled) with application start.
         :return:
         """
         await db_pool.connect()
 
+        if _settings.blob_deletion_queue and _settings.blob_deletion_concurrency > 0:
+            # imported here - repositories depend on this module
+            from ..maintenance import BlobDeletionWorker
+            from ..repositories.blob_deletion_queue import BlobDeletionQueue
+            from ..repositories.blob_storage import get_blob_storage
+
+            blob_deletion_worker: BlobDeletionWorker = BlobDeletionWorker(
+                get_blob_storage(db_pool, _settings), BlobDeletionQueue(db_pool), _settings
+            )
+            app.state.blob_deletion_task = asyncio.create_task(blob_deletion_worker.run_forever())
+
+        if _settings.blob_reaper_interval_seconds > 0:
+            # imported here - repositories depend on this module
+            from ..maintenance import BlobReaper
+            from ..repositories.blob_storage import get_blob_storage
+            from ..repositories.upload_sessions_repository import UploadSessionsRepository
+
+            blob_reaper: BlobReaper = BlobReaper(
+                get_blob_storage(db_pool, _settings), UploadSessionsRepository(redis, _settings), _settings
+            )
+            app.state.blob_reaper_task = asyncio.create_task(
+                blob_reaper.run_forever(_settings.blob_reaper_interval_seconds)
+            )
+
     @app.on_event('shutdown')
     async def shutdown() -> None:
         """
         Disconnects database connection pool
-        before application shuts down.
+        and identity provider client before application shuts down.
         :return:
         """
+        for task in [app.state.blob_reaper_task, app.state.blob_deletion_task]:
+            if task is not None:
+                task.cancel()
+                # background task must not be left mid-query when pool is closed
+                with suppress(asyncio.CancelledError):
+                    await task
+
         await db_pool.disconnect()
+        await app.state.auth_client.close()
 
     return app
 
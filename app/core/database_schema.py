@@ -1,6 +1,12 @@
 import sqlalchemy as sa
-from sqlalchemy import UniqueConstraint, BigInteger
-from sqlalchemy.dialects.postgresql import INTEGER, TEXT, OID
+from sqlalchemy import UniqueConstraint, BigInteger, DDL
+from sqlalchemy.dialects.postgresql import INTEGER, TEXT, OID, TIMESTAMP
+
+from app.repositories.queries.blob_queries import create_get_lo_size_function, \
+    create_lo_concat_function
+from app.repositories.queries.directory_queries import create_file_directory_function, \
+    create_update_directories_function, create_files_update_directories_function, \
+    create_files_update_directories_trigger
 
 db_schema = sa.MetaData()
 """Stores full schema information"""
@@ -13,5 +19,84 @@ files_table: sa.Table = sa.Table(
     sa.Column('file_path', TEXT, nullable=False),
     sa.Column('file_size_bytes', BigInteger, nullable=False),
     sa.Column('file_checksum', TEXT, nullable=True),
-    UniqueConstraint('owner_id', 'file_path', name='unique_paths_per_user')
+    UniqueConstraint('owner_id', 'file_path', name='unique_paths_per_user'),
+    sa.Index('files_by_oid', 'oid')
+)
+
+file_directory_function: DDL = DDL(create_file_directory_function)
+"""Returns directory of the file, indexed so files of a directory are found without scanning all user's files"""
+
+sa.event.listen(db_schema, 'before_create', file_directory_function)
+
+sa.Index(
+    'files_by_directory', files_table.c.owner_id, sa.func.file_directory(files_table.c.file_path),
+    files_table.c.file_path
+)
+
+directories_table: sa.Table = sa.Table(
+    'directories', db_schema,
+    sa.Column('owner_id', TEXT, primary_key=True),
+    sa.Column('path', TEXT, primary_key=True),
+    sa.Column('parent_path', TEXT, nullable=True),
+    sa.Column('file_count', BigInteger, nullable=False),
+    sa.Column('total_size_bytes', BigInteger, nullable=False),
+    sa.Index('directories_by_parent', 'owner_id', 'parent_path')
+)
+"""
+Directories that contain files, with recursive file count and size.
+Maintained by trigger on files table, so aggregates are read without visiting files.
+"""
+
+blobs_table: sa.Table = sa.Table(
+    'blobs', db_schema,
+    sa.Column('oid', OID, primary_key=True),
+    sa.Column('content_hash', TEXT, nullable=True),
+    sa.Column('size_bytes', BigInteger, nullable=False),
+    sa.Column('reference_count', INTEGER, nullable=False),
+    UniqueConstraint('content_hash', name='unique_blob_content')
 )
+"""Stored blobs shared by files, blob is removed when no file references it"""
+
+blob_frames_table: sa.Table = sa.Table(
+    'blob_frames', db_schema,
+    sa.Column('oid', OID, primary_key=True),
+    sa.Column('logical_offset', BigInteger, primary_key=True),
+    sa.Column('logical_size', BigInteger, nullable=False),
+    sa.Column('stored_offset', BigInteger, nullable=False),
+    sa.Column('stored_size', BigInteger, nullable=False),
+    sa.Column('compression', TEXT, nullable=False),
+    sa.Column('content_crc', BigInteger, nullable=True)
+)
+"""Index of separately compressed frames of blobs, blobs without frames are stored as they are"""
+
+blob_deletions_table: sa.Table = sa.Table(
+    'blob_deletions', db_schema,
+    sa.Column('oid', OID, primary_key=True),
+    sa.Column('queued_at', TIMESTAMP(timezone=True), nullable=False, server_default=sa.func.now()),
+    sa.Index('blob_deletions_by_queued_at', 'queued_at')
+)
+"""Queue of blobs no longer referenced by files, removed by background worker instead of request that released them"""
+
+get_lo_size_function: DDL = DDL(create_get_lo_size_function)
+"""Returns size of large object, installed once with schema instead of on every call"""
+
+sa.event.listen(db_schema, 'after_create', get_lo_size_function)
+
+lo_concat_function: DDL = DDL(create_lo_concat_function)
+"""Appends parts to target large object (and removes them), returns size of target"""
+
+sa.event.listen(db_schema, 'after_create', lo_concat_function)
+
+update_directories_function: DDL = DDL(create_update_directories_function)
+"""Adds file count and size to every ancestor directory of the file"""
+
+sa.event.listen(db_schema, 'after_create', update_directories_function)
+
+files_update_directories_function: DDL = DDL(create_files_update_directories_function)
+
+sa.event.listen(db_schema, 'after_create', files_update_directories_function)
+
+files_update_directories_trigger: DDL = DDL(create_files_update_directories_trigger)
+"""Keeps directories table up to date with every change of files"""
+
+sa.event.listen(db_schema, 'after_create', files_update_directories_trigger)
@@ -0,0 +1,190 @@
+import os
+from functools import wraps
+from inspect import iscoroutinefunction
+from time import perf_counter
+from typing import Callable, Any, Optional, TypeVar, Awaitable, ContextManager
+
+from aredis import StrictRedis
+from databases import Database
+from fastapi import FastAPI
+from opentelemetry.semconv.trace import SpanAttributes
+from opentelemetry.trace import Span, SpanKind
+from prometheus_client import Histogram, Counter, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, \
+    generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+from .route_paths import RoutePaths
+from .tracing import tracer
+
+C = TypeVar('C', bound=type)
+
+_byte_buckets = tuple(1024 * 4 ** exponent for exponent in range(10)) + (float('inf'),)
+"""1 KiB, 4 KiB, ... 256 MiB"""
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Time from receiving request to sending the last byte of response.',
+    ['method', 'route', 'status']
+)
+received_bytes = Counter('http_received_bytes', 'Bytes of request bodies (uploaded).', ['route'])
+sent_bytes = Counter('http_sent_bytes', 'Bytes of response bodies (downloaded).', ['route'])
+chunk_size = Histogram('upload_chunk_size_bytes', 'Sizes of chunks written to uploads.', buckets=_byte_buckets)
+repository_call_duration = Histogram(
+    'repository_call_duration_seconds', 'Time spent in repository methods.', ['repository', 'method']
+)
+db_checkout_duration = Histogram(
+    'db_pool_checkout_duration_seconds', 'Time spent waiting for a connection from database pool.'
+)
+redis_command_duration = Histogram('redis_command_duration_seconds', 'Time of redis commands.', ['command'])
+auth_request_duration = Histogram(
+    'auth_request_duration_seconds', 'Time of identity provider requests.', ['endpoint']
+)
+auth_request_errors = Counter(
+    'auth_request_errors', "Identity provider requests that failed ('unavailable') or returned error status.",
+    ['endpoint', 'error']
+)
+
+
+def instrumented(cls: C) -> C:
+    """
+    Class decorator - time of every public coroutine method of the class
+    is observed in repository_call_duration, labelled with class and method name.
+    Context managers and async generators are left out, they are used on the chunk path.
+    """
+    for name, method in list(vars(cls).items()):
+        if not name.startswith('_') and iscoroutinefunction(method):
+            setattr(cls, name, _timed(method, repository_call_duration.labels(cls.__name__, name)))
+    return cls
+
+
+def _timed(method: Callable[..., Awaitable[Any]], histogram: Histogram) -> Callable[..., Awaitable[Any]]:
+    @wraps(method)
+    async def timed_method(*args: Any, **kwargs: Any) -> Any:
+        start: float = perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            histogram.observe(perf_counter() - start)
+
+    return timed_method
+
+
+class InstrumentedRedis(StrictRedis):
+    """
+    Redis client that observes time of every command (and pipeline) in redis_command_duration
+    and runs it in its own span.
+    """
+
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        command: str = str(args[0]).upper()
+        start: float = perf_counter()
+        try:
+            with _redis_span(command):
+                return await super().execute_command(*args, **options)
+        finally:
+            redis_command_duration.labels(command).observe(perf_counter() - start)
+
+    async def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> Any:
+        pipeline: Any = await super().pipeline(transaction, shard_hint)
+        # queued commands are sent all at once, pipeline is observed as a single command
+        execute: Callable[..., Awaitable[Any]] = _timed(pipeline.execute, redis_command_duration.labels('PIPELINE'))
+
+        async def traced_execute(*args: Any, **kwargs: Any) -> Any:
+            with _redis_span('PIPELINE'):
+                return await execute(*args, **kwargs)
+
+        pipeline.execute = traced_execute
+        return pipeline
+
+
+def _redis_span(command: str) -> ContextManager[Span]:
+    return tracer.start_as_current_span(
+        command, kind=SpanKind.CLIENT,
+        attributes={SpanAttributes.DB_SYSTEM: 'redis', SpanAttributes.DB_OPERATION: command}
+    )
+
+
+def instrument_database(db_pool: Database) -> None:
+    """
+    Observes time that database connections wait for the pool in db_checkout_duration.
+    """
+    # 'databases' has no hook for pool checkout, connections of its backend are wrapped instead
+    backend: Any = db_pool._backend
+    create_connection: Callable[[], Any] = backend.connection
+
+    def connection() -> Any:
+        connection: Any = create_connection()
+        connection.acquire = _timed(connection.acquire, db_checkout_duration)
+        return connection
+
+    backend.connection = connection
+
+
+class MetricsMiddleware:
+    """
+    | Observes duration and body sizes of requests handled by API routes.
+    | Route is labelled with its path template, see RoutePaths.
+    | Requests of other routes (docs, metrics, not found) aren't observed.
+    """
+
+    def __init__(self, app: ASGIApp, api: FastAPI) -> None:
+        self._app: ASGIApp = app
+        self._route_paths: RoutePaths = RoutePaths(api)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self._app(scope, receive, send)
+            return
+
+        start: float = perf_counter()
+        received: int = 0
+        sent: int = 0
+        status: int = 500
+
+        async def counting_receive() -> Message:
+            nonlocal received
+            message: Message = await receive()
+            received += len(message.get('body', b''))
+            return message
+
+        async def counting_send(message: Message) -> None:
+            nonlocal sent, status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                sent += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self._app(scope, counting_receive, counting_send)
+        finally:
+            route: Optional[str] = self._route_paths.get(scope)
+            if route is not None:
+                request_duration.labels(scope['method'], route, str(status)).observe(perf_counter() - start)
+                received_bytes.labels(route).inc(received)
+                sent_bytes.labels(route).inc(sent)
+
+
+def metrics_endpoint(request: Request) -> Response:
+    """
+    Returns all metrics in Prometheus text format.
+    Metrics of all worker processes are merged when PROMETHEUS_MULTIPROC_DIR is set.
+    """
+    registry: CollectorRegistry = REGISTRY
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def register_metrics(app: FastAPI) -> None:
+    """
+    Registers metrics middleware and '/metrics' route, hidden from API docs.
+    :param app: FastAPI application instance
+    """
+    app.add_middleware(MetricsMiddleware, api=app)
+    app.add_route('/metrics', metrics_endpoint, methods=['GET'], include_in_schema=False)
@@ -0,0 +1,29 @@
+from typing import Callable, Any, Dict, Optional
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from starlette.types import Scope
+
+
+class RoutePaths:
+    """
+    | Path templates of API routes, found by endpoint that router stores in request scope.
+    | Requests are labelled with templates, so files of all users share one label.
+    """
+
+    def __init__(self, app: FastAPI) -> None:
+        self._app: FastAPI = app
+        self._paths: Optional[Dict[Callable[..., Any], str]] = None
+
+    def get(self, scope: Scope) -> Optional[str]:
+        """
+        Returns path template of the route that handled request.
+        :return: path template, None if request didn't match any API route (docs, metrics, not found)
+        :rtype: Optional[str]
+        """
+        # routes are all registered before the first request
+        if self._paths is None:
+            self._paths = {
+                route.endpoint: route.path for route in self._app.routes if isinstance(route, APIRoute)
+            }
+        return self._paths.get(scope.get('endpoint'))
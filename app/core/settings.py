@@ -2,9 +2,12 @@ from __future__ import annotations
 
 import os
 from functools import lru_cache
-from typing import List
+from importlib.util import find_spec
+from typing import List, Optional
 
-from pydantic import BaseSettings, PostgresDsn, SecretStr, RedisDsn
+from pydantic import BaseSettings, PostgresDsn, SecretStr, RedisDsn, validator
+
+from app.schemas.enums import TokenVerification, BlobStorageType, BlobCompression
 
 DB_SCHEMA = './database_schema.py'
 
@@ -48,6 +51,16 @@ class Settings(BaseSettings):
             * app_id - application id
             * auth_provider_url - base address of identity provider
             * token_url - url that should be used to obtain access token
+            * auth_token_verification - 'remote' (identity provider checks every token)
+              or 'local' (token signature verified against cached JWKS, user info cached)
+            * jwt_issuer - expected issuer of access tokens, not checked if empty
+            * jwt_hmac_secret - secret of HS256 signed access tokens, if identity provider uses them
+            * jwks_cache_ttl_seconds - how long public keys of identity provider are cached
+            * user_info_cache_ttl_seconds - how long user info is cached (never longer than token lifetime)
+            * user_info_cache_max_size - maximal number of cached user infos
+            * auth_request_timeout_seconds - timeout of a single identity provider request
+            * auth_max_connections - maximal number of concurrent identity provider requests of one worker
+            * auth_max_keepalive_connections - number of idle connections to identity provider kept open
         5. Scopes/Roles:
             * standard_user_roles - roles assigned by default to standard user account
         6. Logging:
@@ -56,6 +69,45 @@ class Settings(BaseSettings):
             * log_file_path - path to log file
         7. Files:
             * max_chunk_size - maximal size of a single chunk
+            * stream_chunk_size - size of a single slice read from storage while streaming downloads
+            * upload_session_ttl_seconds - unconfirmed upload expires when no chunk is written for this long
+            * upload_claim_timeout_seconds - how long a chunk write may hold its upload offset,
+              claim of a crashed request is released after this time
+            * blob_reaper_interval_seconds - how often background reaper removes blobs of abandoned uploads,
+              0 disables it (blobs can still be removed with: python -m app.maintenance reap-blobs)
+            * blob_reaper_batch_size - number of blobs scanned/removed at once by the reaper
+            * blob_reaper_batch_pause_seconds - pause between reaper batches, limits load on database
+            * blob_storage - where blob data is kept: 'postgres' (large objects)
+              or 'filesystem' (files in blob_storage_path, downloads are served straight from disk)
+            * blob_storage_path - root directory of 'filesystem' blob storage
+            * blob_compression - how new blobs are compressed: 'identity' (not compressed),
+              'gzip' or 'zstd' (requires 'zstandard' package), blobs already stored are read either way
+            * blob_compression_frame_size - number of bytes compressed separately,
+              reading at random offset decompresses only frames it touches
+            * delta_block_size - default size of blocks that signatures are calculated for
+              when file is updated with delta
+            * file_metadata_cache_ttl_seconds - how long metadata of downloaded files is cached, 0 disables cache
+            * file_metadata_cache_max_size - maximal number of files cached by a single worker
+            * file_metadata_cache_redis - cache metadata in redis instead of worker memory,
+              so files deleted or updated through one worker are invalidated for all of them
+            * blob_deletion_queue - blobs no longer referenced by files are queued and removed in background,
+              so deleting or updating a file doesn't wait for removal of its blob
+            * blob_deletion_concurrency - number of queued blobs removed at once by a single worker,
+              0 - queue isn't drained by this worker (python -m app.maintenance drain-deletions drains it)
+            * blob_deletion_rate - maximal number of queued blobs removed per second by a single worker, 0 - no limit
+            * blob_deletion_poll_seconds - how often empty queue is checked for new blobs
+            * blob_unlink_batch_size - number of blobs removed by a single statement when many files are deleted at once
+            * download_url_secret - secret that download URLs are signed with, signed URLs are disabled if empty
+            * download_url_ttl_seconds - how long signed download URL is valid
+        8. Monitoring:
+            * metrics_enabled - request, storage, database, redis and identity provider metrics
+              are exposed in Prometheus format at /metrics (merged from all workers when
+              PROMETHEUS_MULTIPROC_DIR environment variable is set)
+            * tracing_enabled - requests are traced with OpenTelemetry spans (routes, repositories,
+              redis commands and identity provider requests), no collector is needed
+            * tracing_sample_ratio - fraction of new traces that are recorded,
+              requests that continue trace of the caller ('traceparent' header) follow its decision
+            * tracing_file_path - file that finished spans are appended to, one JSON object per line
     """
 
     # General environment info
@@ -81,6 +133,16 @@ class Settings(BaseSettings):
     auth_provider_url: str
     token_url: str
 
+    auth_token_verification: TokenVerification = TokenVerification.REMOTE
+    jwt_issuer: Optional[str] = None
+    jwt_hmac_secret: Optional[SecretStr] = None
+    jwks_cache_ttl_seconds: int = 3600
+    user_info_cache_ttl_seconds: int = 300
+    user_info_cache_max_size: int = 10000
+    auth_request_timeout_seconds: float = 10.0
+    auth_max_connections: int = 20
+    auth_max_keepalive_connections: int = 10
+
     # roles\scopes
     standard_user_roles_list: str
 
@@ -92,6 +154,39 @@ class Settings(BaseSettings):
     # files
     location_url_bytes: int
     max_chunk_size: int
+    stream_chunk_size: int = 1024 * 1024
+    upload_session_ttl_seconds: int = 24 * 60 * 60
+    upload_claim_timeout_seconds: int = 60
+    blob_reaper_interval_seconds: int = 0
+    blob_reaper_batch_size: int = 1000
+    blob_reaper_batch_pause_seconds: float = 0.5
+    blob_storage: BlobStorageType = BlobStorageType.POSTGRES
+    blob_storage_path: str = './blobs'
+    blob_compression: BlobCompression = BlobCompression.IDENTITY
+    blob_compression_frame_size: int = 256 * 1024
+    delta_block_size: int = 64 * 1024
+    file_metadata_cache_ttl_seconds: int = 30
+    file_metadata_cache_max_size: int = 10000
+    file_metadata_cache_redis: bool = False
+    blob_deletion_queue: bool = True
+    blob_deletion_concurrency: int = 1
+    blob_deletion_rate: float = 0
+    blob_deletion_poll_seconds: float = 1.0
+    blob_unlink_batch_size: int = 1000
+    download_url_secret: Optional[SecretStr] = None
+    download_url_ttl_seconds: int = 300
+
+    # monitoring
+    metrics_enabled: bool = True
+    tracing_enabled: bool = False
+    tracing_sample_ratio: float = 1.0
+    tracing_file_path: str = './traces.jsonl'
+
+    @validator('blob_compression')
+    def compression_must_be_available(cls, v: BlobCompression) -> BlobCompression:
+        if v == BlobCompression.ZSTD and find_spec('zstandard') is None:
+            raise ValueError("'zstd' compression requires 'zstandard' package.")
+        return v
 
     @property
     def standard_user_roles(self) -> List[str]:
@@ -0,0 +1,186 @@
+import os
+from contextlib import asynccontextmanager
+from functools import wraps
+from inspect import iscoroutinefunction, isasyncgenfunction, signature, Signature, BoundArguments
+from typing import Callable, Any, Dict, List, Tuple, TypeVar, Awaitable, AsyncIterator, Optional
+
+from fastapi import FastAPI
+from opentelemetry import trace, propagate
+from opentelemetry.sdk.resources import Resource, SERVICE_NAME
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.semconv.trace import SpanAttributes
+from opentelemetry.trace import Span, SpanKind, Status, StatusCode
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+from .route_paths import RoutePaths
+from .settings import Settings
+
+C = TypeVar('C', bound=type)
+
+tracer: trace.Tracer = trace.get_tracer('pylocker')
+"""Spans are recorded once tracer provider is installed (see configure_tracing), until then they cost almost nothing"""
+
+_argument_attributes: Dict[str, Tuple[str, Callable[[Any], Any]]] = {
+    'loid': ('blob.oid', int),
+    'offset': ('blob.offset', int),
+    'length': ('blob.length', int),
+    'data': ('chunk.size', len)
+}
+"""Span attributes taken from arguments of traced methods: argument name -> (attribute, conversion)"""
+
+
+def traced(cls: C) -> C:
+    """
+    Class decorator - every public coroutine method and async context manager of the class
+    runs in its own span, named after class and method. Context manager span lasts until its block ends.
+    Blob oid, offset, length and size of written chunk are taken from arguments as span attributes.
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_'):
+            continue
+        if iscoroutinefunction(method):
+            setattr(cls, name, _traced_coroutine(method, f'{cls.__name__}.{name}'))
+        elif isasyncgenfunction(getattr(method, '__wrapped__', None)):
+            # method decorated with asynccontextmanager
+            setattr(cls, name, _traced_context_manager(method, f'{cls.__name__}.{name}'))
+    return cls
+
+
+def _span_attributes(method: Callable[..., Any]) -> Callable[[Span, Tuple[Any, ...], Dict[str, Any]], None]:
+    method_signature: Signature = signature(method)
+    attributes: List[Tuple[str, str, Callable[[Any], Any]]] = [
+        (argument, *_argument_attributes[argument])
+        for argument in method_signature.parameters if argument in _argument_attributes
+    ]
+
+    def set_attributes(span: Span, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> None:
+        # arguments are bound only for spans that are recorded
+        if not attributes or not span.is_recording():
+            return
+
+        bound: BoundArguments = method_signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments: Dict[str, Any] = bound.arguments
+        for argument, attribute, convert in attributes:
+            if arguments.get(argument) is not None:
+                span.set_attribute(attribute, convert(arguments[argument]))
+
+    return set_attributes
+
+
+def _traced_coroutine(method: Callable[..., Awaitable[Any]], span_name: str) -> Callable[..., Awaitable[Any]]:
+    set_attributes = _span_attributes(method)
+
+    @wraps(method)
+    async def traced_method(*args: Any, **kwargs: Any) -> Any:
+        with tracer.start_as_current_span(span_name) as span:
+            set_attributes(span, args, kwargs)
+            return await method(*args, **kwargs)
+
+    return traced_method
+
+
+def _traced_context_manager(method: Callable[..., Any], span_name: str) -> Callable[..., Any]:
+    set_attributes = _span_attributes(method)
+
+    @wraps(method)
+    @asynccontextmanager
+    async def traced_method(*args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        with tracer.start_as_current_span(span_name) as span:
+            set_attributes(span, args, kwargs)
+            async with method(*args, **kwargs) as value:
+                yield value
+
+    return traced_method
+
+
+class TracingMiddleware:
+    """
+    | Runs every request in a server span, named after method and path template of its route.
+    | Request continues trace of the caller when it sends W3C 'traceparent' header.
+    """
+
+    def __init__(self, app: ASGIApp, api: FastAPI) -> None:
+        self._app: ASGIApp = app
+        self._route_paths: RoutePaths = RoutePaths(api)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self._app(scope, receive, send)
+            return
+
+        headers: Dict[str, str] = {
+            key.decode('latin-1'): value.decode('latin-1') for key, value in scope['headers']
+        }
+        status: int = 500
+
+        async def status_send(message: Message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        with tracer.start_as_current_span(
+                scope['method'], context=propagate.extract(headers), kind=SpanKind.SERVER,
+                attributes={SpanAttributes.HTTP_METHOD: scope['method'], SpanAttributes.HTTP_TARGET: scope['path']}
+        ) as span:
+            try:
+                await self._app(scope, receive, status_send)
+            finally:
+                route: Optional[str] = self._route_paths.get(scope)
+                if route is not None:
+                    span.update_name(f"{scope['method']} {route}")
+                    span.set_attribute(SpanAttributes.HTTP_ROUTE, route)
+                span.set_attribute(SpanAttributes.HTTP_STATUS_CODE, status)
+                if status >= 500:
+                    span.set_status(Status(StatusCode.ERROR))
+
+
+def create_tracer_provider(settings: Settings) -> TracerProvider:
+    """
+    Creates tracer provider that samples tracing_sample_ratio of new traces
+    (traces started by callers keep their decision) and appends finished spans
+    to tracing_file_path, one JSON object per line - no collector is needed.
+    :rtype: TracerProvider
+    """
+    provider: TracerProvider = TracerProvider(
+        sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_ratio)),
+        resource=Resource.create({SERVICE_NAME: settings.api_title})
+    )
+    provider.add_span_processor(BatchSpanProcessor(FileSpanExporter(settings.tracing_file_path)))
+    return provider
+
+
+class FileSpanExporter(ConsoleSpanExporter):
+    """
+    Appends finished spans to file, one JSON object per line.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(
+            out=open(path, 'a', encoding='utf-8'),
+            formatter=lambda span: span.to_json(indent=None) + os.linesep
+        )
+
+    def shutdown(self) -> None:
+        # provider shuts exporters down when process exits
+        self.out.close()
+
+
+def configure_tracing(settings: Settings) -> None:
+    """
+    Installs tracer provider of this process (see create_tracer_provider).
+    Provider can be installed only once, provider installed earlier (e.g. by tests) is kept.
+    """
+    if not isinstance(trace.get_tracer_provider(), TracerProvider):
+        trace.set_tracer_provider(create_tracer_provider(settings))
+
+
+def register_tracing(app: FastAPI) -> None:
+    """
+    Registers tracing middleware.
+    :param app: FastAPI application instance
+    """
+    app.add_middleware(TracingMiddleware, api=app)
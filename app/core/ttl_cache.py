@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Generic, TypeVar, Optional, Tuple, Hashable
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class TTLCache(Generic[K, V]):
+    """
+    | Bounded in-process cache.
+    | Every entry expires after its time to live,
+    | least recently used entries are evicted when cache is full.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float) -> None:
+        self._max_size: int = max_size
+        self._ttl_seconds: float = ttl_seconds
+        self._entries: 'OrderedDict[K, Tuple[float, V]]' = OrderedDict()
+        self._lock: Lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_size > 0 and self._ttl_seconds > 0
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry: Optional[Tuple[float, V]] = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at <= monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Stores value under key.
+        :param ttl_seconds: time to live of this entry, it can only shorten default one
+        """
+        ttl: float = self._ttl_seconds if ttl_seconds is None else min(ttl_seconds, self._ttl_seconds)
+
+        if not self.enabled or ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -4,7 +4,9 @@ from pydantic import ValidationError
 
 from .error_handlers import basic_error_handler, validation_error_handler, postgres_error_handler, http_error_handler
 from .error_types import UserSignUpError, UserSignInError, UserInfoNotFoundError, LocationNotFoundError, \
-    ChunkTooBigError, FileDoesNotExistsError
+    ChunkTooBigError, FileDoesNotExistsError, RangeNotSatisfiableError, ChunkChecksumMismatchError, \
+    UploadOffsetConflictError, AuthServiceUnavailableError, UploadInProgressError, UploadLengthExceededError, \
+    FileModifiedError, DirectoryDoesNotExistError, InvalidDownloadUrlError
 
 
 def register_error_handlers(app: FastAPI) -> None:
@@ -15,9 +17,18 @@ def register_error_handlers(app: FastAPI) -> None:
     app.add_exception_handler(UserSignUpError, basic_error_handler)
     app.add_exception_handler(UserSignInError, basic_error_handler)
     app.add_exception_handler(UserInfoNotFoundError, basic_error_handler)
+    app.add_exception_handler(AuthServiceUnavailableError, basic_error_handler)
     app.add_exception_handler(LocationNotFoundError, basic_error_handler)
     app.add_exception_handler(ChunkTooBigError, basic_error_handler)
+    app.add_exception_handler(ChunkChecksumMismatchError, basic_error_handler)
+    app.add_exception_handler(UploadOffsetConflictError, basic_error_handler)
+    app.add_exception_handler(UploadInProgressError, basic_error_handler)
+    app.add_exception_handler(UploadLengthExceededError, basic_error_handler)
     app.add_exception_handler(FileDoesNotExistsError, basic_error_handler)
+    app.add_exception_handler(DirectoryDoesNotExistError, basic_error_handler)
+    app.add_exception_handler(RangeNotSatisfiableError, basic_error_handler)
+    app.add_exception_handler(FileModifiedError, basic_error_handler)
+    app.add_exception_handler(InvalidDownloadUrlError, basic_error_handler)
 
     app.add_exception_handler(UndefinedObjectError, postgres_error_handler)
 
@@ -14,7 +14,8 @@ async def basic_error_handler(
     return JSONResponse(
         status_code=exception.error_code,
         content=exception.error_message,
-        media_type=exception.mimetype
+        media_type=exception.mimetype,
+        headers=exception.headers
     )
 
 
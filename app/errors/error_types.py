@@ -1,5 +1,5 @@
 from abc import ABC
-from typing import Union, Dict, Any
+from typing import Union, Dict, Any, Optional
 
 from ..core.settings import Settings
 
@@ -16,11 +16,12 @@ def _parse_error_message(error_message: Union[str, Dict[str, Any]]) -> str:
 class BasicError(ABC, Exception):
     def __init__(
             self, error_code: int, error_message: Union[str, Dict[str, Any]],
-            mimetype: str = 'application/json'
+            mimetype: str = 'application/json', headers: Optional[Dict[str, str]] = None
     ):
         self.error_code: int = error_code
         self.error_message: Union[str, Dict[str, Any]] = error_message
         self.mimetype: str = mimetype
+        self.headers: Optional[Dict[str, str]] = headers
 
     def __repr__(self) -> str:
         _repr = dict(
@@ -53,6 +54,13 @@ class UserInfoNotFoundError(BasicError):
         )
 
 
+class AuthServiceUnavailableError(BasicError):
+    def __init__(self) -> None:
+        super(AuthServiceUnavailableError, self).__init__(
+            error_code=503, error_message='Identity provider is unavailable, try again later.'
+        )
+
+
 class ChunkTooBigError(BasicError):
     def __init__(self) -> None:
         super(ChunkTooBigError, self).__init__(
@@ -61,6 +69,40 @@ class ChunkTooBigError(BasicError):
         )
 
 
+class ChunkChecksumMismatchError(BasicError):
+    def __init__(self) -> None:
+        super(ChunkChecksumMismatchError, self).__init__(
+            error_code=460,
+            error_message="Chunk checksum doesn't match Upload-Checksum header. "
+                          "Chunk wasn't written, send it again."
+        )
+
+
+class UploadLengthExceededError(BasicError):
+    def __init__(self, upload_length: int) -> None:
+        super(UploadLengthExceededError, self).__init__(
+            error_code=413,
+            error_message=f'Chunk exceeds declared Upload-Length: {upload_length} bytes.'
+        )
+
+
+class UploadOffsetConflictError(BasicError):
+    def __init__(self, upload_offset: int) -> None:
+        super(UploadOffsetConflictError, self).__init__(
+            error_code=409,
+            error_message=f"Upload-Offset doesn't match current offset of the upload: {upload_offset}.",
+            headers={'upload-offset': str(upload_offset)}
+        )
+
+
+class UploadInProgressError(BasicError):
+    def __init__(self) -> None:
+        super(UploadInProgressError, self).__init__(
+            error_code=409,
+            error_message='Upload is being written or concatenated by other request, try again later.'
+        )
+
+
 class LocationNotFoundError(BasicError):
     def __init__(self) -> None:
         super(LocationNotFoundError, self).__init__(
@@ -76,3 +118,37 @@ class FileDoesNotExistsError(BasicError):
             error_message=f"File doesn't exists. "
                           f"Make sure file_path you supplied is correct."
         )
+
+
+class DirectoryDoesNotExistError(BasicError):
+    def __init__(self) -> None:
+        super(DirectoryDoesNotExistError, self).__init__(
+            error_code=404,
+            error_message="Directory doesn't exist. Directories exist as long as they contain files."
+        )
+
+
+class RangeNotSatisfiableError(BasicError):
+    def __init__(self, file_size: int) -> None:
+        super(RangeNotSatisfiableError, self).__init__(
+            error_code=416,
+            error_message=f'Requested range is not satisfiable. File size is {file_size} bytes.',
+            headers={'content-range': f'bytes */{file_size}'}
+        )
+
+
+class InvalidDownloadUrlError(BasicError):
+    def __init__(self) -> None:
+        super(InvalidDownloadUrlError, self).__init__(
+            error_code=403,
+            error_message='Download URL is invalid or expired. Request new signed URL.'
+        )
+
+
+class FileModifiedError(BasicError):
+    def __init__(self) -> None:
+        super(FileModifiedError, self).__init__(
+            error_code=412,
+            error_message='File was modified since its signatures were fetched. '
+                          'Fetch signatures of the current version and send delta again.'
+        )
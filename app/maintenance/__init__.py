@@ -0,0 +1,2 @@
+from .blob_deletion_worker import BlobDeletionWorker
+from .blob_reaper import BlobReaper
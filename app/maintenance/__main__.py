@@ -0,0 +1,109 @@
+"""
+| Administrative tasks, run with: python -m app.maintenance <command>
+| Commands:
+    * reap-blobs - removes blobs referenced neither by files nor by live uploads (like vacuumlo)
+    * drain-deletions - removes blobs queued for removal when files were deleted or updated
+"""
+import argparse
+import asyncio
+from typing import Optional
+
+from aredis import StrictRedis
+from databases import Database
+
+from app.core.settings import Settings
+from app.maintenance.blob_deletion_worker import BlobDeletionWorker
+from app.maintenance.blob_reaper import BlobReaper
+from app.repositories.blob_deletion_queue import BlobDeletionQueue
+from app.repositories.blob_storage import get_blob_storage
+from app.repositories.upload_sessions_repository import UploadSessionsRepository
+from app.schemas.maintenance import BlobReapReport
+
+
+async def reap_blobs(arguments: argparse.Namespace) -> None:
+    settings: Settings = Settings.get().copy(update={
+        key: value for key, value in {
+            'blob_reaper_batch_size': arguments.batch_size,
+            'blob_reaper_batch_pause_seconds': arguments.batch_pause
+        }.items() if value is not None
+    })
+
+    db: Database = Database(settings.postgres_dsn)
+    await db.connect()
+
+    try:
+        reaper: BlobReaper = BlobReaper(
+            get_blob_storage(db, settings),
+            UploadSessionsRepository(StrictRedis.from_url(settings.redis_dsn), settings), settings
+        )
+        report: Optional[BlobReapReport] = await reaper.run_once(arguments.grace_seconds, arguments.dry_run)
+    finally:
+        await db.disconnect()
+
+    if report is None:
+        print('Other blob reaper is running, nothing was removed.')
+        return
+
+    if arguments.dry_run:
+        print(f'Would remove {report.removed_blobs} orphaned blobs, {report.reclaimed_bytes} bytes.')
+    else:
+        print(
+            f'Removed {report.removed_blobs} orphaned blobs, reclaimed {report.reclaimed_bytes} bytes.\n'
+            f"Run 'VACUUM pg_largeobject' to return freed space to the operating system."
+        )
+
+
+async def drain_deletions(arguments: argparse.Namespace) -> None:
+    settings: Settings = Settings.get().copy(update={
+        key: value for key, value in {
+            'blob_deletion_rate': arguments.rate
+        }.items() if value is not None
+    })
+
+    db: Database = Database(settings.postgres_dsn)
+    await db.connect()
+
+    try:
+        worker: BlobDeletionWorker = BlobDeletionWorker(
+            get_blob_storage(db, settings), BlobDeletionQueue(db), settings
+        )
+        removed: int = await worker.drain()
+    finally:
+        await db.disconnect()
+
+    print(
+        f'Removed {removed} queued blobs.\n'
+        f"Run 'VACUUM pg_largeobject' to return freed space to the operating system."
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='python -m app.maintenance')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    reap_blobs_parser = commands.add_parser(
+        'reap-blobs', help='remove blobs referenced neither by files nor by live uploads'
+    )
+    reap_blobs_parser.add_argument(
+        '--dry-run', action='store_true', help='only report what would be removed'
+    )
+    reap_blobs_parser.add_argument(
+        '--grace-seconds', type=float, default=10,
+        help='blob must stay orphaned this long to be removed (protects uploads being created)'
+    )
+    reap_blobs_parser.add_argument('--batch-size', type=int, help='overrides BLOB_REAPER_BATCH_SIZE')
+    reap_blobs_parser.add_argument('--batch-pause', type=float, help='overrides BLOB_REAPER_BATCH_PAUSE_SECONDS')
+    reap_blobs_parser.set_defaults(handler=reap_blobs)
+
+    drain_deletions_parser = commands.add_parser(
+        'drain-deletions', help='remove blobs queued for removal, until queue is empty'
+    )
+    drain_deletions_parser.add_argument('--rate', type=float, help='overrides BLOB_DELETION_RATE')
+    drain_deletions_parser.set_defaults(handler=drain_deletions)
+
+    arguments: argparse.Namespace = parser.parse_args()
+    asyncio.run(arguments.handler(arguments))
+
+
+if __name__ == '__main__':
+    main()
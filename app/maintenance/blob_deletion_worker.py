@@ -0,0 +1,80 @@
+import asyncio
+from time import monotonic
+from typing import Optional
+
+from loguru import logger
+
+from app.core.settings import Settings
+from app.repositories.blob_deletion_queue import BlobDeletionQueue
+from app.repositories.blob_storage import BlobStorage
+
+
+class BlobDeletionWorker:
+    """
+    | Removes blobs queued in BlobDeletionQueue, one blob per transaction.
+    | Several blobs are removed at once (blob_deletion_concurrency),
+    | at most blob_deletion_rate per second, so removal can be throttled when storage is busy.
+    | Workers of all processes share the queue, every blob is taken by only one of them.
+    | Blob is removed only if no file references it in the meantime.
+    """
+
+    def __init__(
+            self, blob_repository: BlobStorage, blob_deletion_queue: BlobDeletionQueue, settings: Settings
+    ) -> None:
+        self._blob_repository: BlobStorage = blob_repository
+        self._blob_deletion_queue: BlobDeletionQueue = blob_deletion_queue
+        self._concurrency: int = settings.blob_deletion_concurrency
+        self._rate: float = settings.blob_deletion_rate
+        self._poll_seconds: float = settings.blob_deletion_poll_seconds
+        self._next_slot: float = 0
+
+    async def remove_next(self) -> Optional[int]:
+        """
+        Removes blob queued for the longest time. Blob stays queued if its removal fails.
+        :return: oid of the blob, None if queue is empty
+        :rtype: Optional[int]
+        """
+        async with self._blob_deletion_queue.claim() as loid:
+            if loid is not None:
+                await self._blob_repository.remove_unreferenced_blobs([loid])
+            return loid
+
+    async def drain(self) -> int:
+        """
+        Removes queued blobs, one at a time, until queue is empty.
+        :return: number of blobs taken from the queue
+        :rtype: int
+        """
+        removed: int = 0
+
+        while True:
+            await self._throttle()
+            if await self.remove_next() is None:
+                return removed
+            removed += 1
+
+    async def run_forever(self) -> None:
+        """
+        Removes queued blobs as they arrive, until cancelled.
+        """
+        await asyncio.gather(*[self._consume() for _ in range(self._concurrency)])
+
+    async def _consume(self) -> None:
+        while True:
+            try:
+                await self._throttle()
+                if await self.remove_next() is None:
+                    await asyncio.sleep(self._poll_seconds)
+            except Exception as error:
+                logger.exception(f'Removal of queued blob failed: {error!r}')
+                await asyncio.sleep(self._poll_seconds)
+
+    async def _throttle(self) -> None:
+        # removals of all consumers are spaced evenly, 1 / rate seconds apart
+        if self._rate <= 0:
+            return
+
+        now: float = monotonic()
+        slot: float = max(self._next_slot, now)
+        self._next_slot = slot + 1 / self._rate
+        await asyncio.sleep(slot - now)
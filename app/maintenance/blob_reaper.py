@@ -0,0 +1,124 @@
+import asyncio
+from typing import Set, List, Dict, Optional
+
+from loguru import logger
+
+from app.core.settings import Settings
+from app.repositories.blob_storage import BlobStorage
+from app.repositories.upload_sessions_repository import UploadSessionsRepository
+from app.schemas.maintenance import BlobReapReport
+
+
+class BlobReaper:
+    """
+    | Removes orphaned blobs - blobs referenced neither by files table
+    | nor by live upload session (e.g. blobs of abandoned or expired uploads).
+    | Blob is removed only if it was found orphaned twice, some time apart,
+    | so uploads that are just being created are never touched.
+    | Database is scanned and cleaned in batches with pauses in between.
+    | Every run holds postgres advisory lock, so only one reaper
+    | (of all workers and command line runs) works at a time.
+    """
+
+    advisory_lock_key: int = 0x626c6f62
+    """Identifier of advisory lock held while reaper runs"""
+
+    def __init__(
+            self, blob_repository: BlobStorage,
+            upload_sessions_repository: UploadSessionsRepository, settings: Settings
+    ) -> None:
+        self._blob_repository: BlobStorage = blob_repository
+        self._upload_sessions_repository: UploadSessionsRepository = upload_sessions_repository
+        self._batch_size: int = settings.blob_reaper_batch_size
+        self._batch_pause_seconds: float = settings.blob_reaper_batch_pause_seconds
+
+    async def find_orphans(self) -> Set[int]:
+        """
+        Returns oids of all blobs that currently don't belong to any file or live upload.
+        :rtype: Set[int]
+        """
+        orphans: Set[int] = set()
+        after_loid: int = 0
+
+        while True:
+            loids: List[int] = await self._blob_repository.fetch_unreferenced_blobs(
+                after_loid, self._batch_size
+            )
+            orphans.update(loids)
+
+            if len(loids) < self._batch_size:
+                break
+
+            after_loid = loids[-1]
+            await asyncio.sleep(self._batch_pause_seconds)
+
+        # live sessions are read after the scan, so uploads created during it are excluded too
+        return orphans - await self._upload_sessions_repository.fetch_live_blobs()
+
+    async def reap(self, loids: Set[int], dry_run: bool = False) -> BlobReapReport:
+        """
+        Removes selected orphaned blobs.
+        :param loids: oids returned by find_orphans
+        :param dry_run: only report what would be removed
+        :return: number of removed blobs and their total size
+        :rtype: BlobReapReport
+        """
+        report: BlobReapReport = BlobReapReport()
+        sorted_loids: List[int] = sorted(loids)
+
+        for start in range(0, len(sorted_loids), self._batch_size):
+            batch: List[int] = sorted_loids[start:start + self._batch_size]
+            sizes: Dict[int, int] = await self._blob_repository.get_sizes(batch)
+
+            removed: List[int] = list(sizes) if dry_run else \
+                await self._blob_repository.remove_unreferenced_blobs(batch)
+
+            report += BlobReapReport(
+                removed_blobs=len(removed),
+                reclaimed_bytes=sum(sizes.get(loid, 0) for loid in removed)
+            )
+
+            if start + self._batch_size < len(sorted_loids):
+                await asyncio.sleep(self._batch_pause_seconds)
+
+        return report
+
+    async def run_once(self, grace_seconds: float, dry_run: bool = False) -> Optional[BlobReapReport]:
+        """
+        Finds orphaned blobs, waits grace_seconds, and removes those that are still orphaned.
+        :return: report, None if other reaper is already running
+        :rtype: Optional[BlobReapReport]
+        """
+        async with self._blob_repository.advisory_lock(self.advisory_lock_key) as acquired:
+            if not acquired:
+                return None
+
+            suspects: Set[int] = await self.find_orphans()
+            await asyncio.sleep(grace_seconds)
+            return await self.reap(suspects & await self.find_orphans(), dry_run)
+
+    async def run_forever(self, interval_seconds: float) -> None:
+        """
+        Removes orphaned blobs every interval_seconds, until cancelled.
+        Blobs found orphaned in previous run are removed if they are still orphaned.
+        """
+        suspects: Set[int] = set()
+
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                async with self._blob_repository.advisory_lock(self.advisory_lock_key) as acquired:
+                    if not acquired:
+                        continue
+
+                    orphans: Set[int] = await self.find_orphans()
+                    report: BlobReapReport = await self.reap(orphans & suspects)
+                    suspects = orphans - suspects
+
+                if report.removed_blobs:
+                    logger.info(
+                        f'Blob reaper removed {report.removed_blobs} orphaned blobs, '
+                        f'reclaimed {report.reclaimed_bytes} bytes.'
+                    )
+            except Exception as error:
+                logger.exception(f'Blob reaper run failed: {error!r}')
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from typing import List, AsyncIterator, Optional
+
+from databases import Database
+from fastapi import Depends
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import Insert, Select, select
+
+from app.core import get_db
+from app.core.database_schema import blob_deletions_table
+from app.repositories.queries.blob_queries import claim_queued_blob
+
+
+class BlobDeletionQueue:
+    """
+    | Provides interface that enables communication with 'blob_deletions' table -
+      durable queue of blobs that no file references anymore.
+    | Blobs are queued in the transaction that releases them, so none is lost,
+      and removed later by BlobDeletionWorker, so request doesn't wait for removal of big blob.
+    """
+
+    def __init__(self, db: Database) -> None:
+        self._db = db
+
+    async def enqueue(self, loids: List[int]) -> None:
+        """
+        Queues blobs for removal, blobs already queued keep their place.
+        """
+        if not loids:
+            return
+
+        query: Insert = insert(blob_deletions_table) \
+            .values([{'oid': loid} for loid in loids]) \
+            .on_conflict_do_nothing()
+        await self._db.execute(query)
+
+    @asynccontextmanager
+    async def claim(self) -> AsyncIterator[Optional[int]]:
+        """
+        Takes blob queued for the longest time that no one else is removing,
+        and holds it until the block ends, in a transaction.
+        Blob leaves the queue when the block succeeds, it stays queued if the block raises.
+        :return: oid of the blob, None if queue is empty (or all queued blobs are being removed)
+        :rtype: AsyncIterator[Optional[int]]
+        """
+        async with self._db.transaction():
+            loid: Optional[int] = await self._db.fetch_val(claim_queued_blob)
+            yield loid
+
+    async def fetch_length(self) -> int:
+        query: Select = select([func.count()]).select_from(blob_deletions_table)
+        length: int = await self._db.fetch_val(query)
+        return length
+
+    @classmethod
+    def create(
+            cls, db_pool: Database = Depends(get_db)
+    ) -> BlobDeletionQueue:
+        """
+        Creates new instance of self.
+        :param db_pool: database connection pool
+        :return: instance of BlobDeletionQueue
+        :rtype: BlobDeletionQueue
+        """
+        return BlobDeletionQueue(db_pool)
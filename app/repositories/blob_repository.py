@@ -1,22 +1,78 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, Dict, List, Mapping, Any, Tuple
+
 from databases import Database
+from databases.core import Connection
 from fastapi import Depends
 
 from app.core import get_db
+from app.core.metrics import instrumented
+from app.core.tracing import traced
+from app.repositories.blob_storage import BlobStorage, BlobReader, BlobWriter
 from app.repositories.queries.blob_queries import create_empty_blob, write_data_to_blob, \
-    read_data_from_blob, delete_blob, get_size_of_blob, get_size_of_blob_function
+    read_data_from_blob, delete_blob, get_size_of_blob, get_sizes_of_blobs, get_unreferenced_blobs, \
+    delete_unreferenced_blobs, concatenate_blobs, open_blob_for_reading, \
+    open_blob_for_writing, seek_blob, read_from_open_blob, write_to_open_blob, close_blob
+
+
+@traced
+class LargeObjectReader(BlobReader):
+    """
+    Reads blob opened by BlobRepository.open_reader sequentially,
+    using the same connection and descriptor for every read.
+    """
+
+    def __init__(self, connection: Connection, descriptor: int) -> None:
+        self._connection: Connection = connection
+        self._descriptor: int = descriptor
+
+    async def seek(self, offset: int) -> None:
+        await self._connection.fetch_val(seek_blob, {'descriptor': self._descriptor, 'offset': offset})
+
+    async def read(self, length: int) -> bytes:
+        """
+        Reads at most length bytes from current position, empty bytes at the end of blob.
+        :rtype: bytes
+        """
+        data: bytes = await self._connection.fetch_val(
+            read_from_open_blob, {'descriptor': self._descriptor, 'length': length}
+        )
+        return data
+
+
+@traced
+class LargeObjectWriter(BlobWriter):
+    """
+    Writes to blob opened by BlobRepository.open_writer sequentially,
+    using the same connection and descriptor for every write.
+    """
 
+    def __init__(self, connection: Connection, descriptor: int) -> None:
+        self._connection: Connection = connection
+        self._descriptor: int = descriptor
 
-class BlobRepository:
+    async def seek(self, offset: int) -> None:
+        await self._connection.fetch_val(seek_blob, {'descriptor': self._descriptor, 'offset': offset})
+
+    async def write(self, data: bytes) -> None:
+        """
+        Writes data at current position and moves past it.
+        """
+        await self._connection.fetch_val(
+            write_to_open_blob, {'descriptor': self._descriptor, 'data': data}
+        )
+
+
+@traced
+@instrumented
+class BlobRepository(BlobStorage):
     """
     Provides interface that enables communication with
     postgres large objects(BLOBs).
     """
 
-    def __init__(self, db_pool: Database) -> None:
-        self._db = db_pool
-
     async def create_blob(self) -> int:
         oid: int = await self._db.execute(create_empty_blob)
         return oid
@@ -46,6 +102,60 @@ class BlobRepository:
         )
         return blob_chunk
 
+    @asynccontextmanager
+    async def open_reader(self, loid: int, offset: int = 0) -> AsyncIterator[BlobReader]:
+        """
+        Opens blob for sequential reading, starting at offset.
+        Reader holds one connection and one large object descriptor until the block ends,
+        descriptor is valid only inside transaction, so block runs in one.
+        :rtype: AsyncIterator[BlobReader]
+        """
+        async with self._open(loid, offset, open_blob_for_reading) as (connection, descriptor):
+            yield LargeObjectReader(connection, descriptor)
+
+    @asynccontextmanager
+    async def open_writer(self, loid: int, offset: int = 0) -> AsyncIterator[BlobWriter]:
+        """
+        Opens blob for sequential writing, starting at offset.
+        Writer holds one connection and one large object descriptor until the block ends,
+        data written in the block is committed (or rolled back) together.
+        :rtype: AsyncIterator[BlobWriter]
+        """
+        async with self._open(loid, offset, open_blob_for_writing) as (connection, descriptor):
+            yield LargeObjectWriter(connection, descriptor)
+
+    @asynccontextmanager
+    async def _open(self, loid: int, offset: int, open_query: str) -> AsyncIterator[Tuple[Connection, int]]:
+        async with self._db.connection() as connection:
+            async with connection.transaction():
+                descriptor: int = await connection.fetch_val(open_query, {'loid': loid})
+                if offset:
+                    await connection.fetch_val(seek_blob, {'descriptor': descriptor, 'offset': offset})
+
+                yield connection, descriptor
+
+                await connection.fetch_val(close_blob, {'descriptor': descriptor})
+
+    async def concatenate_blobs(self, loid: int, parts: List[int], slice_size: int) -> int:
+        """
+        Appends parts to blob, in order, and removes them.
+        Data is copied inside database, slice_size bytes at a time.
+        :param loid: blob that parts are appended to
+        :param parts: blobs to append
+        :param slice_size: number of bytes copied at once
+        :return: size of the blob after concatenation
+        :rtype: int
+        """
+        blob_size: int = await self._db.execute(
+            concatenate_blobs,
+            {
+                'loid': loid,
+                'parts': parts,
+                'slice_size': slice_size
+            }
+        )
+        return blob_size
+
     async def remove_blob(self, loid: int) -> bool:
         await self._db.execute(
             delete_blob,
@@ -56,15 +166,57 @@ class BlobRepository:
         return True
 
     async def get_last_byte(self, loid: int) -> int:
-        async with self._db.transaction():
-            await self._db.execute(get_size_of_blob_function)
-            file_size: int = await self._db.execute(
-                get_size_of_blob,
-                {
-                    'loid': loid
-                }
-            )
-            return file_size
+        file_size: int = await self._db.execute(
+            get_size_of_blob,
+            {
+                'loid': loid
+            }
+        )
+        return file_size
+
+    async def get_sizes(self, loids: Iterable[int]) -> Dict[int, int]:
+        """
+        Fetches sizes of many blobs in one round trip.
+        Blobs that don't exist are left out of the result.
+        :return: mapping of blob oid to its size in bytes
+        """
+        mappings: List[Mapping[str, Any]] = await self._db.fetch_all(
+            get_sizes_of_blobs,
+            {
+                'loids': list(loids)
+            }
+        )
+        return {mapping['loid']: mapping['size'] for mapping in mappings}
+
+    async def fetch_unreferenced_blobs(self, after_loid: int, limit: int) -> List[int]:
+        """
+        Returns oids of blobs that don't belong to any file, in ascending order.
+        :param after_loid: only blobs with greater oid are returned (keyset pagination)
+        :param limit: maximal number of returned oids
+        :rtype: List[int]
+        """
+        mappings: List[Mapping[str, Any]] = await self._db.fetch_all(
+            get_unreferenced_blobs,
+            {
+                'after_loid': after_loid,
+                'limit': limit
+            }
+        )
+        return [mapping['loid'] for mapping in mappings]
+
+    async def remove_unreferenced_blobs(self, loids: Iterable[int]) -> List[int]:
+        """
+        Removes selected blobs unless some file references them in the meantime.
+        :return: oids of removed blobs
+        :rtype: List[int]
+        """
+        mappings: List[Mapping[str, Any]] = await self._db.fetch_all(
+            delete_unreferenced_blobs,
+            {
+                'loids': list(loids)
+            }
+        )
+        return [mapping['loid'] for mapping in mappings]
 
     @classmethod
     def create(
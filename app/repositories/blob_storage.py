@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, AsyncContextManager, Iterable, Dict, List, Optional, NamedTuple
+
+from databases import Database
+from fastapi import Depends
+
+from app.core import get_db, Settings
+from app.repositories.queries.blob_queries import try_advisory_lock, release_advisory_lock
+from app.schemas.enums import BlobStorageType, BlobCompression
+
+
+class StoredEncoding(NamedTuple):
+    """Content coding of stored data of a blob, see BlobStorage.fetch_encoding"""
+    encoding: BlobCompression
+    header: bytes = b''
+    """Sent before stored data"""
+    trailer: bytes = b''
+    """Sent after stored data"""
+
+
+class BlobReader(ABC):
+    """
+    Reads blob opened by BlobStorage.open_reader sequentially.
+    """
+
+    @abstractmethod
+    async def seek(self, offset: int) -> None:
+        ...
+
+    @abstractmethod
+    async def read(self, length: int) -> bytes:
+        """
+        Reads at most length bytes from current position, empty bytes at the end of blob.
+        :rtype: bytes
+        """
+
+
+class BlobWriter(ABC):
+    """
+    Writes to blob opened by BlobStorage.open_writer sequentially.
+    """
+
+    @abstractmethod
+    async def seek(self, offset: int) -> None:
+        ...
+
+    @abstractmethod
+    async def write(self, data: bytes) -> None:
+        """
+        Writes data at current position and moves past it.
+        """
+
+
+class BlobStorage(ABC):
+    """
+    | Interface of blob storage backends.
+    | Blob is identified by an oid (unsigned 32 bit integer), which is stored in files table.
+    | Backend is selected with 'blob_storage' setting, see get_blob_storage.
+    """
+
+    def __init__(self, db_pool: Database) -> None:
+        self._db = db_pool
+
+    @abstractmethod
+    async def create_blob(self) -> int:
+        """
+        Creates empty blob.
+        :return: oid of the blob
+        :rtype: int
+        """
+
+    @abstractmethod
+    async def write_to_blob(self, loid: int, offset: int, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    async def read_from_blob(self, loid: int, offset: int, length: int) -> bytes:
+        ...
+
+    @abstractmethod
+    def open_reader(self, loid: int, offset: int = 0) -> AsyncContextManager[BlobReader]:
+        """
+        Opens blob for sequential reading, starting at offset.
+        :rtype: AsyncContextManager[BlobReader]
+        """
+
+    @abstractmethod
+    def open_writer(self, loid: int, offset: int = 0) -> AsyncContextManager[BlobWriter]:
+        """
+        Opens blob for sequential writing, starting at offset.
+        Data written in the block is discarded if the block raises.
+        :rtype: AsyncContextManager[BlobWriter]
+        """
+
+    async def iterate_blob(
+            self, loid: int, offset: int, length: int, chunk_size: int
+    ) -> AsyncIterator[bytes]:
+        """
+        Yields consecutive slices of blob, at most chunk_size bytes each,
+        starting at offset and ending after length bytes (or at the end of blob).
+        Blob is opened once and read sequentially.
+        """
+        async with self.open_reader(loid, offset) as reader:
+            while length > 0:
+                chunk: bytes = await reader.read(min(chunk_size, length))
+                if not chunk:
+                    break
+
+                yield chunk
+                length -= len(chunk)
+
+    def local_path(self, loid: int) -> Optional[str]:
+        """
+        Returns path of the file holding stored data of the blob, if backend keeps blobs in local files.
+        Such blobs can be sent by the server straight from disk.
+        :rtype: Optional[str]
+        """
+        return None
+
+    @property
+    def stored(self) -> BlobStorage:
+        """
+        Storage that reads and writes stored data of blobs as it is.
+        It's other than self when this storage encodes blobs (see fetch_encoding).
+        :rtype: BlobStorage
+        """
+        return self
+
+    async def fetch_encoding(self, loid: int) -> Optional[StoredEncoding]:
+        """
+        Returns encoding of stored data of the blob, as a whole.
+        Stored data (between header and trailer of the encoding) can be sent
+        to clients that accept this content coding without decoding it.
+        :return: encoding, None if blob can't be sent encoded (e.g. parts of it are encoded differently)
+        :rtype: Optional[StoredEncoding]
+        """
+        return StoredEncoding(BlobCompression.IDENTITY)
+
+    @abstractmethod
+    async def concatenate_blobs(self, loid: int, parts: List[int], slice_size: int) -> int:
+        """
+        Appends parts to blob, in order, and removes them.
+        :param loid: blob that parts are appended to
+        :param parts: blobs to append
+        :param slice_size: number of bytes copied at once
+        :return: size of the blob after concatenation
+        :rtype: int
+        """
+
+    @abstractmethod
+    async def remove_blob(self, loid: int) -> bool:
+        ...
+
+    @abstractmethod
+    async def get_last_byte(self, loid: int) -> int:
+        """
+        Returns size of the blob.
+        :rtype: int
+        """
+
+    @abstractmethod
+    async def get_sizes(self, loids: Iterable[int]) -> Dict[int, int]:
+        """
+        Fetches sizes of many blobs at once.
+        Blobs that don't exist are left out of the result.
+        :return: mapping of blob oid to its size in bytes
+        """
+
+    @abstractmethod
+    async def fetch_unreferenced_blobs(self, after_loid: int, limit: int) -> List[int]:
+        """
+        Returns oids of blobs that don't belong to any file, in ascending order.
+        :param after_loid: only blobs with greater oid are returned (keyset pagination)
+        :param limit: maximal number of returned oids
+        :rtype: List[int]
+        """
+
+    @abstractmethod
+    async def remove_unreferenced_blobs(self, loids: Iterable[int]) -> List[int]:
+        """
+        Removes selected blobs unless some file references them in the meantime.
+        :return: oids of removed blobs
+        :rtype: List[int]
+        """
+
+    @asynccontextmanager
+    async def advisory_lock(self, key: int) -> AsyncIterator[bool]:
+        """
+        Tries to take postgres advisory lock and holds it until the block ends.
+        Queries issued by this repository inside the block use the locking connection,
+        lock is released by postgres when that connection is lost.
+        :param key: lock identifier shared by all processes
+        :return: whether lock was acquired, block runs either way
+        :rtype: AsyncIterator[bool]
+        """
+        async with self._db.connection() as connection:
+            acquired: bool = await connection.fetch_val(try_advisory_lock, {'key': key})
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    await connection.fetch_val(release_advisory_lock, {'key': key})
+
+
+def get_blob_storage(
+        db_pool: Database = Depends(get_db), settings: Settings = Depends(Settings.get)
+) -> BlobStorage:
+    """
+    Creates blob storage backend selected in settings, compressing blobs as settings say.
+    :param db_pool: database connection pool
+    :param settings: app settings
+    :return: instance of BlobStorage
+    :rtype: BlobStorage
+    """
+    # backends import this module
+    from app.repositories.blob_repository import BlobRepository
+    from app.repositories.compressed_blob_storage import CompressedBlobStorage
+    from app.repositories.file_system_blob_repository import FileSystemBlobRepository
+
+    storage: BlobStorage = FileSystemBlobRepository.create(db_pool, settings) \
+        if settings.blob_storage == BlobStorageType.FILESYSTEM else BlobRepository.create(db_pool)
+
+    # blobs compressed earlier are decompressed even if compression is disabled now
+    return CompressedBlobStorage.create(db_pool, storage, settings)
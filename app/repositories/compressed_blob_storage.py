@@ -0,0 +1,511 @@
+from __future__ import annotations
+
+import struct
+import zlib
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, Iterable, Dict, List, Mapping, Any, Optional, NamedTuple, Callable, Awaitable, \
+    Tuple
+
+from databases import Database
+from starlette.concurrency import run_in_threadpool
+
+from app.core import Settings
+from app.core.metrics import instrumented
+from app.core.tracing import traced
+from app.repositories.blob_storage import BlobStorage, BlobReader, BlobWriter, StoredEncoding
+from app.repositories.queries.blob_queries import get_last_blob_frame, get_blob_frames, \
+    get_blob_frame_compressions, insert_blob_frame, move_blob_frames, set_last_blob_frame_crc, delete_blob_frames
+from app.schemas.enums import BlobCompression
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+_deflate_window_bits: int = -zlib.MAX_WBITS
+_gzip_level: int = 6
+_zstd_level: int = 3
+
+_gzip_header: bytes = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+"""gzip member header: deflate, no flags, no modification time, unknown OS"""
+_deflate_final_block: bytes = b'\x03\x00'
+"""Empty final deflate block, ends deflate stream made of frames"""
+_gzip_trailer: struct.Struct = struct.Struct('<II')
+"""CRC-32 and size (modulo 2^32) of uncompressed data"""
+
+_crc32_polynomial: int = 0xedb88320
+
+
+def _compress(compression: BlobCompression, data: bytes) -> bytes:
+    if compression == BlobCompression.GZIP:
+        # raw deflate ending with full flush - byte aligned and independent of previous frames,
+        # so frames can be decompressed separately or sent one after another as a single deflate stream
+        compressor: Any = zlib.compressobj(_gzip_level, zlib.DEFLATED, _deflate_window_bits)
+        return compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH)
+    if compression == BlobCompression.ZSTD:
+        return zstandard.ZstdCompressor(level=_zstd_level).compress(data)
+    return data
+
+
+def _decompress(compression: BlobCompression, data: bytes) -> bytes:
+    if compression == BlobCompression.GZIP:
+        decompressor: Any = zlib.decompressobj(_deflate_window_bits)
+        return decompressor.decompress(data) + decompressor.flush()
+    if compression == BlobCompression.ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Blob is compressed with zstd, 'zstandard' package is required to read it.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def _gf2_matrix_times(matrix: List[int], vector: int) -> int:
+    result: int = 0
+    row: int = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[row]
+        vector >>= 1
+        row += 1
+    return result
+
+
+def _gf2_matrix_square(matrix: List[int]) -> List[int]:
+    return [_gf2_matrix_times(matrix, row) for row in matrix]
+
+
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    """
+    Combines CRC-32 of two consecutive pieces of data into CRC-32 of both, as zlib's crc32_combine does
+    (zlib module doesn't expose it) - CRC of the first piece is advanced over length2 zero bytes
+    by repeatedly squared operator matrices, so it takes O(log length2) steps.
+    :param crc1: CRC-32 of the first piece
+    :param crc2: CRC-32 of the second piece
+    :param length2: length of the second piece in bytes
+    :return: CRC-32 of the first piece followed by the second
+    :rtype: int
+    """
+    if length2 <= 0:
+        return crc1
+
+    # operator for one zero bit, then two and four zero bits
+    odd: List[int] = [_crc32_polynomial] + [1 << bit for bit in range(31)]
+    even: List[int] = _gf2_matrix_square(odd)
+    odd = _gf2_matrix_square(even)
+
+    # apply operators for consecutive powers of two zero bytes, selected by bits of length2
+    while True:
+        even = _gf2_matrix_square(odd)
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(even, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+
+        odd = _gf2_matrix_square(even)
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(odd, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+
+    return crc1 ^ crc2
+
+
+def _compress_frame(compression: BlobCompression, content: bytes, crc: Optional[int]) -> Tuple[bytes, Optional[int]]:
+    return _compress(compression, content), None if crc is None else zlib.crc32(content, crc)
+
+
+class _Frame(NamedTuple):
+    logical_offset: int
+    logical_size: int
+    stored_offset: int
+    stored_size: int
+    compression: BlobCompression
+
+
+@traced
+class FrameReader(BlobReader):
+    """
+    Reads compressed blob opened by CompressedBlobStorage.open_reader sequentially.
+    Only frames that overlap the read range are read and decompressed,
+    the last decompressed frame is kept, so reads smaller than a frame decompress it once.
+    """
+
+    def __init__(
+            self, reader: BlobReader, fetch_frames: Callable[[int, int], Awaitable[List[_Frame]]], offset: int
+    ) -> None:
+        self._reader: BlobReader = reader
+        self._fetch_frames: Callable[[int, int], Awaitable[List[_Frame]]] = fetch_frames
+        self._position: int = offset
+        self._stored_position: int = 0
+        self._frame: Optional[_Frame] = None
+        self._frame_content: bytes = b''
+
+    async def seek(self, offset: int) -> None:
+        self._position = offset
+
+    async def read(self, length: int) -> bytes:
+        if length <= 0:
+            return b''
+
+        end: int = self._position + length
+        data: bytearray = bytearray()
+
+        for frame in await self._fetch_frames(self._position, end):
+            frame_end: int = frame.logical_offset + frame.logical_size
+            if frame_end <= self._position:
+                continue
+            if frame.logical_offset > self._position:
+                break
+
+            start_in_frame: int = self._position - frame.logical_offset
+            end_in_frame: int = min(end, frame_end) - frame.logical_offset
+
+            if frame.compression == BlobCompression.IDENTITY:
+                # data stored as it is can be read partially
+                piece: bytes = await self._read_stored(
+                    frame.stored_offset + start_in_frame, end_in_frame - start_in_frame
+                )
+            else:
+                piece = (await self._decompress_frame(frame))[start_in_frame:end_in_frame]
+
+            data += piece
+            self._position += len(piece)
+
+        return bytes(data)
+
+    async def _decompress_frame(self, frame: _Frame) -> bytes:
+        if frame != self._frame:
+            stored_data: bytes = await self._read_stored(frame.stored_offset, frame.stored_size)
+            self._frame_content = await run_in_threadpool(_decompress, frame.compression, stored_data)
+            self._frame = frame
+        return self._frame_content
+
+    async def _read_stored(self, offset: int, length: int) -> bytes:
+        if offset != self._stored_position:
+            await self._reader.seek(offset)
+
+        data: bytearray = bytearray()
+        while len(data) < length:
+            piece: bytes = await self._reader.read(length - len(data))
+            if not piece:
+                break
+            data += piece
+
+        self._stored_position = offset + len(data)
+        return bytes(data)
+
+
+@traced
+class FrameWriter(BlobWriter):
+    """
+    Appends to compressed blob opened by CompressedBlobStorage.open_writer.
+    Data is buffered until whole frame is collected, each frame is compressed in threadpool
+    and written as soon as it's complete. Remaining data becomes the last (shorter) frame when writer is flushed.
+    CRC-32 of blob content is carried on, so every frame knows CRC of the blob up to its end (None if unknown).
+    """
+
+    def __init__(
+            self, writer: BlobWriter, loid: int, compression: BlobCompression, frame_size: int,
+            logical_offset: int, stored_offset: int, content_crc: Optional[int]
+    ) -> None:
+        self._writer: BlobWriter = writer
+        self._loid: int = loid
+        self._compression: BlobCompression = compression
+        self._frame_size: int = frame_size
+        self._logical_offset: int = logical_offset
+        self._stored_offset: int = stored_offset
+        self._content_crc: Optional[int] = content_crc
+        self._buffer: bytearray = bytearray()
+        self.frames: List[Dict[str, Any]] = []
+        """Index entries of written frames"""
+
+    async def seek(self, offset: int) -> None:
+        if offset != self._logical_offset + len(self._buffer):
+            raise ValueError('Compressed blob can only be appended to.')
+
+    async def write(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) >= self._frame_size:
+            await self._write_frame(bytes(self._buffer[:self._frame_size]))
+            del self._buffer[:self._frame_size]
+
+    async def flush(self) -> None:
+        if self._buffer:
+            await self._write_frame(bytes(self._buffer))
+            self._buffer.clear()
+
+    async def _write_frame(self, content: bytes) -> None:
+        stored_data, self._content_crc = await run_in_threadpool(
+            _compress_frame, self._compression, content, self._content_crc
+        )
+        await self._writer.write(stored_data)
+
+        self.frames.append({
+            'loid': self._loid,
+            'logical_offset': self._logical_offset,
+            'logical_size': len(content),
+            'stored_offset': self._stored_offset,
+            'stored_size': len(stored_data),
+            'compression': self._compression.value,
+            'content_crc': self._content_crc
+        })
+        self._logical_offset += len(content)
+        self._stored_offset += len(stored_data)
+
+
+@traced
+@instrumented
+class CompressedBlobStorage(BlobStorage):
+    """
+    | Compresses blobs kept by other storage backend.
+    | Blob is split into frames of blob_compression_frame_size bytes, which are compressed separately
+      and indexed in blob_frames table, so reading at random offset decompresses only frames it touches.
+    | Blobs are only appended to - each write ends with a (possibly shorter) frame of its own.
+    | Blob that has no frames is stored as it is, whether compression is enabled decides
+      when data is written to empty blob.
+    | Frames compressed with zstd are complete zstd frames, so stored data is a valid zstd stream.
+      gzip frames are raw deflate ending with full flush - together they make a single deflate stream,
+      which becomes a gzip stream with header and trailer (CRC-32 of the blob is kept in the index).
+      Stored data of a blob compressed with one algorithm can be sent to clients without decompressing it.
+    | Sizes are logical (uncompressed), except get_sizes, which reports space taken in storage.
+    """
+
+    def __init__(
+            self, db_pool: Database, storage: BlobStorage, compression: BlobCompression, frame_size: int
+    ) -> None:
+        super().__init__(db_pool)
+        self._storage: BlobStorage = storage
+        self._compression: BlobCompression = compression
+        self._frame_size: int = frame_size
+
+    @property
+    def stored(self) -> BlobStorage:
+        return self._storage
+
+    async def create_blob(self) -> int:
+        loid: int = await self._storage.create_blob()
+        return loid
+
+    async def write_to_blob(self, loid: int, offset: int, data: bytes) -> None:
+        last_frame: Optional[Mapping[str, Any]] = await self._fetch_last_frame(loid)
+
+        if self._is_stored_as_is(last_frame, offset):
+            await self._storage.write_to_blob(loid, offset, data)
+            return
+
+        async with self._open_frame_writer(loid, offset, last_frame) as writer:
+            await writer.write(data)
+
+    async def read_from_blob(self, loid: int, offset: int, length: int) -> bytes:
+        if await self._fetch_last_frame(loid) is None:
+            data: bytes = await self._storage.read_from_blob(loid, offset, length)
+            return data
+
+        async with self._open_frame_reader(loid, offset) as reader:
+            data = await reader.read(length)
+        return data
+
+    @asynccontextmanager
+    async def open_reader(self, loid: int, offset: int = 0) -> AsyncIterator[BlobReader]:
+        if await self._fetch_last_frame(loid) is None:
+            async with self._storage.open_reader(loid, offset) as reader:
+                yield reader
+            return
+
+        async with self._open_frame_reader(loid, offset) as frame_reader:
+            yield frame_reader
+
+    @asynccontextmanager
+    async def _open_frame_reader(self, loid: int, offset: int) -> AsyncIterator[FrameReader]:
+        async with self._storage.open_reader(loid) as reader:
+            yield FrameReader(reader, partial(self._fetch_frames, loid), offset)
+
+    @asynccontextmanager
+    async def open_writer(self, loid: int, offset: int = 0) -> AsyncIterator[BlobWriter]:
+        """
+        Opens blob for appending, starting at offset - its current (logical) size.
+        Frames are indexed together with the last write, when the block ends.
+        :raises ValueError: offset isn't the end of compressed blob
+        :rtype: AsyncIterator[BlobWriter]
+        """
+        last_frame: Optional[Mapping[str, Any]] = await self._fetch_last_frame(loid)
+
+        if self._is_stored_as_is(last_frame, offset):
+            async with self._storage.open_writer(loid, offset) as writer:
+                yield writer
+            return
+
+        async with self._open_frame_writer(loid, offset, last_frame) as frame_writer:
+            yield frame_writer
+
+    def _is_stored_as_is(self, last_frame: Optional[Mapping[str, Any]], offset: int) -> bool:
+        # data written to empty blob decides whether it's compressed
+        return last_frame is None and (self._compression == BlobCompression.IDENTITY or offset > 0)
+
+    @asynccontextmanager
+    async def _open_frame_writer(
+            self, loid: int, offset: int, last_frame: Optional[Mapping[str, Any]]
+    ) -> AsyncIterator[FrameWriter]:
+        logical_size: int = last_frame['logical_size'] if last_frame else 0
+        stored_size: int = last_frame['stored_size'] if last_frame else 0
+        content_crc: Optional[int] = last_frame['content_crc'] if last_frame else 0
+
+        if offset != logical_size:
+            raise ValueError('Compressed blob can only be appended to.')
+
+        async with self._storage.open_writer(loid, stored_size) as writer:
+            frame_writer: FrameWriter = FrameWriter(
+                writer, loid, self._compression, self._frame_size, logical_size, stored_size, content_crc
+            )
+            yield frame_writer
+
+            await frame_writer.flush()
+            if frame_writer.frames:
+                await self._db.execute_many(insert_blob_frame, frame_writer.frames)
+
+    async def concatenate_blobs(self, loid: int, parts: List[int], slice_size: int) -> int:
+        """
+        Appends parts to blob, in order, and removes them.
+        Stored data is concatenated by the backend, frames of parts are moved to the blob.
+        Blob (or part) stored as it is becomes a single frame that isn't compressed.
+        CRC-32 of the result is combined from CRCs of parts, it's unknown if CRC of any part is.
+        :return: logical size of the blob after concatenation
+        :rtype: int
+        """
+        blobs: List[int] = [loid] + parts
+        last_frames: Dict[int, Optional[Mapping[str, Any]]] = {
+            blob: await self._fetch_last_frame(blob) for blob in blobs
+        }
+
+        if all(last_frame is None for last_frame in last_frames.values()):
+            blob_size: int = await self._storage.concatenate_blobs(loid, parts, slice_size)
+            return blob_size
+
+        stored_sizes: Dict[int, int] = await self._storage.get_sizes(blobs)
+        logical_base: int = 0
+        stored_base: int = 0
+        content_crc: Optional[int] = 0
+
+        async with self._db.transaction():
+            for blob in blobs:
+                last_frame: Optional[Mapping[str, Any]] = last_frames[blob]
+                stored_size: int = stored_sizes.get(blob, 0)
+
+                if last_frame is None and stored_size:
+                    await self._db.execute(insert_blob_frame, {
+                        'loid': loid, 'logical_offset': logical_base, 'logical_size': stored_size,
+                        'stored_offset': stored_base, 'stored_size': stored_size,
+                        'compression': BlobCompression.IDENTITY.value, 'content_crc': None
+                    })
+                elif last_frame is not None and blob != loid:
+                    await self._db.execute(move_blob_frames, {
+                        'loid': loid, 'part': blob, 'logical_base': logical_base, 'stored_base': stored_base
+                    })
+
+                if last_frame is None and stored_size:
+                    content_crc = None
+                elif last_frame is not None:
+                    content_crc = None if content_crc is None or last_frame['content_crc'] is None \
+                        else crc32_combine(content_crc, last_frame['content_crc'], last_frame['logical_size'])
+
+                logical_base += last_frame['logical_size'] if last_frame else stored_size
+                stored_base += stored_size
+
+            await self._db.execute(set_last_blob_frame_crc, {'loid': loid, 'content_crc': content_crc})
+            await self._storage.concatenate_blobs(loid, parts, slice_size)
+
+        return logical_base
+
+    async def remove_blob(self, loid: int) -> bool:
+        removed: bool = await self._storage.remove_blob(loid)
+        await self._db.execute(delete_blob_frames, {'loids': [loid]})
+        return removed
+
+    async def get_last_byte(self, loid: int) -> int:
+        last_frame: Optional[Mapping[str, Any]] = await self._fetch_last_frame(loid)
+
+        if last_frame is None:
+            blob_size: int = await self._storage.get_last_byte(loid)
+            return blob_size
+
+        return last_frame['logical_size']
+
+    async def get_sizes(self, loids: Iterable[int]) -> Dict[int, int]:
+        """
+        Fetches sizes of stored data of many blobs at once - space they take in storage.
+        Blobs that don't exist are left out of the result.
+        :return: mapping of blob oid to its stored size in bytes
+        """
+        sizes: Dict[int, int] = await self._storage.get_sizes(loids)
+        return sizes
+
+    async def fetch_unreferenced_blobs(self, after_loid: int, limit: int) -> List[int]:
+        loids: List[int] = await self._storage.fetch_unreferenced_blobs(after_loid, limit)
+        return loids
+
+    async def remove_unreferenced_blobs(self, loids: Iterable[int]) -> List[int]:
+        removed: List[int] = await self._storage.remove_unreferenced_blobs(loids)
+        if removed:
+            await self._db.execute(delete_blob_frames, {'loids': removed})
+        return removed
+
+    def local_path(self, loid: int) -> Optional[str]:
+        return self._storage.local_path(loid)
+
+    async def fetch_encoding(self, loid: int) -> Optional[StoredEncoding]:
+        mappings: List[Mapping[str, Any]] = await self._db.fetch_all(get_blob_frame_compressions, {'loid': loid})
+
+        if not mappings:
+            return StoredEncoding(BlobCompression.IDENTITY)
+        if len(mappings) > 1:
+            return None
+
+        compression: BlobCompression = BlobCompression(mappings[0]['compression'])
+        if compression != BlobCompression.GZIP:
+            return StoredEncoding(compression)
+
+        last_frame: Optional[Mapping[str, Any]] = await self._fetch_last_frame(loid)
+        if last_frame is None or last_frame['content_crc'] is None:
+            return None
+        return StoredEncoding(
+            compression,
+            header=_gzip_header,
+            trailer=_deflate_final_block + _gzip_trailer.pack(
+                last_frame['content_crc'], last_frame['logical_size'] & 0xffffffff
+            )
+        )
+
+    async def _fetch_last_frame(self, loid: int) -> Optional[Mapping[str, Any]]:
+        last_frame: Optional[Mapping[str, Any]] = await self._db.fetch_one(get_last_blob_frame, {'loid': loid})
+        return last_frame
+
+    async def _fetch_frames(self, loid: int, start: int, end: int) -> List[_Frame]:
+        mappings: List[Mapping[str, Any]] = await self._db.fetch_all(
+            get_blob_frames,
+            {
+                'loid': loid,
+                'start': start,
+                'end': end
+            }
+        )
+        return [_Frame(
+            logical_offset=mapping['logical_offset'],
+            logical_size=mapping['logical_size'],
+            stored_offset=mapping['stored_offset'],
+            stored_size=mapping['stored_size'],
+            compression=BlobCompression(mapping['compression'])
+        ) for mapping in mappings]
+
+    @classmethod
+    def create(cls, db_pool: Database, storage: BlobStorage, settings: Settings) -> CompressedBlobStorage:
+        """
+        Creates new instance of self.
+        :param db_pool: database connection pool
+        :param storage: backend that keeps stored data of blobs
+        :param settings: app settings, new blobs are compressed as blob_compression says
+        :return: instance of CompressedBlobStorage
+        :rtype: CompressedBlobStorage
+        """
+        return CompressedBlobStorage(db_pool, storage, settings.blob_compression, settings.blob_compression_frame_size)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional, Mapping, Any, List
+
+from databases import Database
+from fastapi import Depends
+from sqlalchemy import func
+from sqlalchemy.sql import Select, select
+
+from app.core import get_db
+from app.core.database_schema import directories_table, files_table
+from app.errors import DirectoryDoesNotExistError
+from app.repositories.files_repository import FilesRepository
+from app.schemas.files import DirectoryRead, DirectoryListing, FileRead
+from app.schemas.users import UserInfo
+
+
+class DirectoriesRepository:
+    """
+    Provides interface that enables communication with 'directories' table.
+    Directories are implicit - every prefix of file path ending before '/' is one,
+    they are maintained by trigger on 'files' table, together with recursive file count and size.
+    """
+
+    def __init__(self, db: Database) -> None:
+        self._db = db
+
+    async def fetch_directory(self, user_info: UserInfo, path: str) -> DirectoryRead:
+        """
+        Returns number and size of files in the directory and its subdirectories.
+        :param path: directory path, without trailing '/'
+        :raises DirectoryDoesNotExistError: user has no files in the directory
+        :rtype: DirectoryRead
+        """
+        query: Select = directories_table.select() \
+            .where(directories_table.c.owner_id == user_info.id) \
+            .where(directories_table.c.path == path)
+
+        result: Optional[Mapping[str, Any]] = await self._db.fetch_one(query)
+
+        if not result:
+            raise DirectoryDoesNotExistError()
+
+        return DirectoryRead.parse_obj(result)
+
+    async def fetch_children(self, user_info: UserInfo, path: Optional[str]) -> DirectoryListing:
+        """
+        Returns immediate subdirectories of the directory and files placed directly in it, ordered by path.
+        :param path: directory path, without trailing '/', top level directories are listed if None
+        :rtype: DirectoryListing
+        """
+        directories_query: Select = directories_table.select() \
+            .where(directories_table.c.owner_id == user_info.id) \
+            .where(directories_table.c.parent_path == path if path is not None
+                   else directories_table.c.parent_path.is_(None)) \
+            .order_by(directories_table.c.path)
+        directories: List[Mapping[str, Any]] = await self._db.fetch_all(directories_query)
+
+        files: List[Mapping[str, Any]] = []
+        if path is not None:
+            # matches expression of 'files_by_directory' index
+            files_query: Select = select([
+                files_table.c.file_path, files_table.c.file_size_bytes, files_table.c.file_checksum
+            ]) \
+                .where(files_table.c.owner_id == user_info.id) \
+                .where(func.file_directory(files_table.c.file_path) == path) \
+                .order_by(files_table.c.file_path)
+            files = await self._db.fetch_all(files_query)
+
+        return DirectoryListing(
+            directories=[DirectoryRead.parse_obj(mapping) for mapping in directories],
+            files=[FileRead(
+                file_path=Path(mapping['file_path']),
+                file_size_mb=(mapping['file_size_bytes'] / FilesRepository.bytes_in_mb),
+                checksum=mapping['file_checksum']
+            ) for mapping in files]
+        )
+
+    @classmethod
+    def create(
+            cls, db_pool: Database = Depends(get_db)
+    ) -> DirectoriesRepository:
+        """
+        Creates new instance of self.
+        :param db_pool: database connection pool
+        :return: instance of DirectoriesRepository
+        :rtype: DirectoriesRepository
+        """
+        return DirectoriesRepository(db_pool)
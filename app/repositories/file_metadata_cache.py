@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import json
+from typing import Optional, Tuple, List
+
+from aredis import StrictRedis
+from fastapi import Depends, Request
+
+from app.core import get_redis, Settings
+from app.core.ttl_cache import TTLCache
+from app.schemas.files import FileDb
+
+
+class FileMetadataCache:
+    """
+    | Caches files read on download paths, keyed by owner and path,
+      so chunked download doesn't query database for every chunk.
+    | Entries are kept in worker memory (LRU with TTL) or in redis, shared by all workers.
+    | Cache is invalidated when file is created, deleted or its blob is replaced.
+      Worker memory can't be invalidated by other workers, their changes are seen when entry expires.
+    """
+
+    key_prefix: str = 'file_metadata:'
+    redis_delete_batch_size: int = 1000
+    """Number of keys removed from redis by a single command"""
+
+    def __init__(
+            self, memory: TTLCache[Tuple[str, str], FileDb], redis: Optional[StrictRedis], ttl_seconds: int
+    ) -> None:
+        self._memory: TTLCache[Tuple[str, str], FileDb] = memory
+        self._redis: Optional[StrictRedis] = redis
+        self._ttl_seconds: int = ttl_seconds
+
+    async def get(self, owner_id: str, file_path: str) -> Optional[FileDb]:
+        if self._ttl_seconds <= 0:
+            return None
+
+        if self._redis is None:
+            return self._memory.get((owner_id, file_path))
+
+        value: Optional[bytes] = await self._redis.get(self._redis_key(owner_id, file_path))
+        return FileDb.parse_raw(value) if value is not None else None
+
+    async def set(self, file_db: FileDb) -> None:
+        if self._ttl_seconds <= 0:
+            return
+
+        if self._redis is None:
+            self._memory.set((file_db.owner_id, str(file_db.file_path)), file_db)
+            return
+
+        await self._redis.set(
+            self._redis_key(file_db.owner_id, str(file_db.file_path)), file_db.json(), ex=self._ttl_seconds
+        )
+
+    async def invalidate(self, owner_id: str, file_path: str) -> None:
+        if self._redis is None:
+            self._memory.invalidate((owner_id, file_path))
+            return
+
+        await self._redis.delete(self._redis_key(owner_id, file_path))
+
+    async def invalidate_many(self, owner_id: str, file_paths: List[str]) -> None:
+        if self._redis is None:
+            for file_path in file_paths:
+                self._memory.invalidate((owner_id, file_path))
+            return
+
+        keys: List[str] = [self._redis_key(owner_id, file_path) for file_path in file_paths]
+        for start in range(0, len(keys), self.redis_delete_batch_size):
+            await self._redis.delete(*keys[start:start + self.redis_delete_batch_size])
+
+    def _redis_key(self, owner_id: str, file_path: str) -> str:
+        # owner and path are encoded together, so no separator can make two keys equal
+        return self.key_prefix + json.dumps([owner_id, file_path])
+
+    @classmethod
+    def create(
+            cls, request: Request, redis: StrictRedis = Depends(get_redis), settings: Settings = Depends(Settings.get)
+    ) -> FileMetadataCache:
+        """
+        Creates new instance of self.
+        :param request: current request, worker memory cache is kept in app state
+        :param redis: redis connection, used if file_metadata_cache_redis is set
+        :param settings: app settings
+        :return: instance of FileMetadataCache
+        :rtype: FileMetadataCache
+        """
+        return FileMetadataCache(
+            request.app.state.file_metadata_cache,
+            redis if settings.file_metadata_cache_redis else None,
+            settings.file_metadata_cache_ttl_seconds
+        )
@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import os
+from contextlib import asynccontextmanager
+from secrets import randbelow
+from typing import AsyncIterator, Iterable, Dict, List, Mapping, Any, Set
+
+from databases import Database
+from fastapi import Depends
+from starlette.concurrency import run_in_threadpool
+
+from app.core import get_db, Settings
+from app.core.metrics import instrumented
+from app.core.tracing import traced
+from app.repositories.blob_storage import BlobStorage, BlobReader, BlobWriter
+from app.repositories.queries.blob_queries import get_referenced_blobs
+
+_max_oid: int = 2 ** 32 - 1
+_blob_name_length: int = 8
+
+
+def _blob_name(loid: int) -> str:
+    """
+    Returns name of the file holding the blob - oid as 8 hex digits,
+    so names sort the same way oids do.
+    """
+    return f'{loid:08x}'
+
+
+def _is_blob_name(name: str) -> bool:
+    return len(name) == _blob_name_length and all(char in '0123456789abcdef' for char in name)
+
+
+def _pwrite(descriptor: int, data: bytes, offset: int) -> None:
+    view: memoryview = memoryview(data)
+    while view:
+        written: int = os.pwrite(descriptor, view, offset)
+        view = view[written:]
+        offset += written
+
+
+@traced
+class FileBlobReader(BlobReader):
+    """
+    Reads blob opened by FileSystemBlobRepository.open_reader sequentially,
+    using the same file descriptor for every read.
+    """
+
+    def __init__(self, descriptor: int, offset: int) -> None:
+        self._descriptor: int = descriptor
+        self._position: int = offset
+
+    async def seek(self, offset: int) -> None:
+        self._position = offset
+
+    async def read(self, length: int) -> bytes:
+        data: bytes = await run_in_threadpool(os.pread, self._descriptor, length, self._position)
+        self._position += len(data)
+        return data
+
+
+@traced
+class FileBlobWriter(BlobWriter):
+    """
+    Writes to blob opened by FileSystemBlobRepository.open_writer sequentially,
+    using the same file descriptor for every write.
+    """
+
+    def __init__(self, descriptor: int, offset: int) -> None:
+        self._descriptor: int = descriptor
+        self._position: int = offset
+
+    async def seek(self, offset: int) -> None:
+        self._position = offset
+
+    async def write(self, data: bytes) -> None:
+        await run_in_threadpool(_pwrite, self._descriptor, data, self._position)
+        self._position += len(data)
+
+
+@traced
+@instrumented
+class FileSystemBlobRepository(BlobStorage):
+    """
+    | Stores blobs as files in a local (or mounted) directory.
+    | Blob with oid 0x1a2b3c4d is kept in <root>/1a/2b/1a2b3c4d, so no directory grows too big.
+    | Chunks are written in place with pwrite and synced before the write is acknowledged.
+    | Blocking file operations run in threadpool.
+    | Unlike large objects, blob writes are not part of database transactions:
+    | blobs left by failed requests are removed by blob reaper.
+    """
+
+    def __init__(self, db_pool: Database, root_path: str) -> None:
+        super().__init__(db_pool)
+        self._root_path: str = os.path.abspath(root_path)
+
+    def local_path(self, loid: int) -> str:
+        name: str = _blob_name(loid)
+        return os.path.join(self._root_path, name[:2], name[2:4], name)
+
+    async def create_blob(self) -> int:
+        loid: int = await run_in_threadpool(self._create_blob)
+        return loid
+
+    def _create_blob(self) -> int:
+        while True:
+            loid: int = randbelow(_max_oid) + 1
+            path: str = self.local_path(loid)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+            except FileExistsError:
+                continue
+            return loid
+
+    async def write_to_blob(self, loid: int, offset: int, data: bytes) -> None:
+        await run_in_threadpool(self._write_to_blob, loid, offset, data)
+
+    def _write_to_blob(self, loid: int, offset: int, data: bytes) -> None:
+        descriptor: int = os.open(self.local_path(loid), os.O_WRONLY)
+        try:
+            _pwrite(descriptor, data, offset)
+            os.fdatasync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    async def read_from_blob(self, loid: int, offset: int, length: int) -> bytes:
+        async with self.open_reader(loid, offset) as reader:
+            data: bytes = await reader.read(length)
+        return data
+
+    @asynccontextmanager
+    async def open_reader(self, loid: int, offset: int = 0) -> AsyncIterator[FileBlobReader]:
+        descriptor: int = await run_in_threadpool(os.open, self.local_path(loid), os.O_RDONLY)
+        try:
+            yield FileBlobReader(descriptor, offset)
+        finally:
+            os.close(descriptor)
+
+    @asynccontextmanager
+    async def open_writer(self, loid: int, offset: int = 0) -> AsyncIterator[FileBlobWriter]:
+        """
+        Opens blob for sequential writing, starting at offset.
+        If the block raises, blob is truncated back to its previous size,
+        so appended data is discarded (overwritten bytes are not restored).
+        Data is synced to disk when the block ends.
+        :rtype: AsyncIterator[FileBlobWriter]
+        """
+        descriptor: int = await run_in_threadpool(os.open, self.local_path(loid), os.O_WRONLY)
+        try:
+            blob_size: int = os.fstat(descriptor).st_size
+            try:
+                yield FileBlobWriter(descriptor, offset)
+            except BaseException:
+                await run_in_threadpool(os.ftruncate, descriptor, blob_size)
+                raise
+            await run_in_threadpool(os.fdatasync, descriptor)
+        finally:
+            os.close(descriptor)
+
+    async def concatenate_blobs(self, loid: int, parts: List[int], slice_size: int) -> int:
+        """
+        Appends parts to blob, in order, and removes them.
+        Data is copied by the kernel (sendfile), slice_size bytes at a time.
+        :param loid: blob that parts are appended to
+        :param parts: blobs to append
+        :param slice_size: number of bytes copied at once
+        :return: size of the blob after concatenation
+        :rtype: int
+        """
+        blob_size: int = await run_in_threadpool(self._concatenate_blobs, loid, parts, slice_size)
+        return blob_size
+
+    def _concatenate_blobs(self, loid: int, parts: List[int], slice_size: int) -> int:
+        target: int = os.open(self.local_path(loid), os.O_WRONLY)
+        try:
+            os.lseek(target, 0, os.SEEK_END)
+            for part in parts:
+                source: int = os.open(self.local_path(part), os.O_RDONLY)
+                try:
+                    part_size: int = os.fstat(source).st_size
+                    copied: int = 0
+                    while copied < part_size:
+                        copied += os.sendfile(target, source, copied, min(slice_size, part_size - copied))
+                finally:
+                    os.close(source)
+
+            os.fdatasync(target)
+            blob_size: int = os.lseek(target, 0, os.SEEK_CUR)
+        finally:
+            os.close(target)
+
+        for part in parts:
+            os.unlink(self.local_path(part))
+
+        return blob_size
+
+    async def remove_blob(self, loid: int) -> bool:
+        try:
+            await run_in_threadpool(os.unlink, self.local_path(loid))
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def get_last_byte(self, loid: int) -> int:
+        stat_result: os.stat_result = await run_in_threadpool(os.stat, self.local_path(loid))
+        return stat_result.st_size
+
+    async def get_sizes(self, loids: Iterable[int]) -> Dict[int, int]:
+        sizes: Dict[int, int] = await run_in_threadpool(self._get_sizes, list(loids))
+        return sizes
+
+    def _get_sizes(self, loids: List[int]) -> Dict[int, int]:
+        sizes: Dict[int, int] = {}
+        for loid in loids:
+            try:
+                sizes[loid] = os.stat(self.local_path(loid)).st_size
+            except FileNotFoundError:
+                continue
+        return sizes
+
+    async def fetch_unreferenced_blobs(self, after_loid: int, limit: int) -> List[int]:
+        """
+        Returns oids of blobs that don't belong to any file, in ascending order.
+        Directory tree is listed in oid order, batch after batch,
+        until limit unreferenced blobs are found or all blobs are checked.
+        :param after_loid: only blobs with greater oid are returned (keyset pagination)
+        :param limit: maximal number of returned oids
+        :rtype: List[int]
+        """
+        unreferenced: List[int] = []
+
+        while len(unreferenced) < limit:
+            loids: List[int] = await run_in_threadpool(self._list_blobs, after_loid, limit)
+            referenced: Set[int] = await self._fetch_referenced_blobs(loids) if loids else set()
+            unreferenced.extend(loid for loid in loids if loid not in referenced)
+
+            if len(loids) < limit:
+                break
+            after_loid = loids[-1]
+
+        return unreferenced[:limit]
+
+    def _list_blobs(self, after_loid: int, limit: int) -> List[int]:
+        after_name: str = _blob_name(after_loid)
+        loids: List[int] = []
+
+        for first_level in self._list_directory(self._root_path):
+            if first_level < after_name[:2]:
+                continue
+
+            first_level_path: str = os.path.join(self._root_path, first_level)
+            for second_level in self._list_directory(first_level_path):
+                if first_level + second_level < after_name[:4]:
+                    continue
+
+                for name in self._list_directory(os.path.join(first_level_path, second_level)):
+                    if not _is_blob_name(name) or name <= after_name:
+                        continue
+
+                    loids.append(int(name, 16))
+                    if len(loids) == limit:
+                        return loids
+
+        return loids
+
+    @staticmethod
+    def _list_directory(path: str) -> List[str]:
+        try:
+            return sorted(os.listdir(path))
+        except FileNotFoundError:
+            return []
+
+    async def remove_unreferenced_blobs(self, loids: Iterable[int]) -> List[int]:
+        """
+        Removes selected blobs unless some file references them in the meantime.
+        :return: oids of removed blobs
+        :rtype: List[int]
+        """
+        loids = list(loids)
+        referenced: Set[int] = await self._fetch_referenced_blobs(loids)
+
+        removed: List[int] = []
+        for loid in loids:
+            if loid not in referenced and await self.remove_blob(loid):
+                removed.append(loid)
+        return removed
+
+    async def _fetch_referenced_blobs(self, loids: List[int]) -> Set[int]:
+        mappings: List[Mapping[str, Any]] = await self._db.fetch_all(
+            get_referenced_blobs,
+            {
+                'loids': loids
+            }
+        )
+        return {mapping['loid'] for mapping in mappings}
+
+    @classmethod
+    def create(
+            cls, db_pool: Database = Depends(get_db), settings: Settings = Depends(Settings.get)
+    ) -> FileSystemBlobRepository:
+        """
+        Creates new instance of self.
+        :param db_pool: database connection pool
+        :param settings: app settings, blobs are kept in blob_storage_path
+        :return: instance of FileSystemBlobRepository
+        :rtype: FileSystemBlobRepository
+        """
+        return FileSystemBlobRepository(db_pool, settings.blob_storage_path)
@@ -1,34 +1,66 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Optional, Mapping, Any, List, Dict
+from typing import Optional, Mapping, Any, List, Dict, AsyncIterator, NamedTuple
 
 from databases import Database
 from fastapi import Depends
-from sqlalchemy.sql import Insert, Select, Delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import Insert, Select, Delete, Update, select
 
-from app.core import get_db
-from app.core.database_schema import files_table
-from app.errors import FileDoesNotExistsError
+from app.core import get_db, Settings
+from app.core.database_schema import files_table, blobs_table
+from app.core.metrics import instrumented
+from app.core.tracing import traced
+from app.errors import FileDoesNotExistsError, FileModifiedError
+from app.repositories.blob_deletion_queue import BlobDeletionQueue
+from app.repositories.file_metadata_cache import FileMetadataCache
+from app.repositories.queries.file_queries import delete_user_files, delete_released_blobs
 from app.schemas.files import FileRead, FileDb
 from app.schemas.users import UserInfo
 
 
+class DeletedFiles(NamedTuple):
+    """Result of FilesRepository.delete_files"""
+    files: List[FileDb]
+    """Deleted files, ordered by path"""
+    unreferenced_blobs: List[int]
+    """Blobs no longer referenced by any file, caller should remove them - none if they were queued for removal"""
+
+
+@traced
+@instrumented
 class FilesRepository:
     """
     Provides interface that enables communication with
-    'files' table.
+    'files' table and 'blobs' table, which counts files referencing each blob.
+    Blobs with known content hash are shared by all files with the same content.
+    Files read on download paths can be served from metadata cache,
+    which is invalidated whenever file is created, deleted or its blob is replaced.
+    Blobs no longer referenced are queued for removal, if deletion queue is given,
+    otherwise caller removes them.
     """
 
     bytes_in_mb = 1000000
 
-    def __init__(self, db: Database) -> None:
+    def __init__(
+            self, db: Database, metadata_cache: Optional[FileMetadataCache] = None,
+            blob_deletion_queue: Optional[BlobDeletionQueue] = None
+    ) -> None:
         self._db = db
+        self._metadata_cache = metadata_cache
+        self._blob_deletion_queue = blob_deletion_queue
 
-    async def fetch_all_user_files(self, user_info: UserInfo) -> List[FileRead]:
-        query: Select = files_table.select(files_table.c.owner_id == user_info.id)
-
-        mappings: List[Mapping[str, Any]] = await self._db.fetch_all(query)
+    async def fetch_all_user_files(
+            self, user_info: UserInfo, after: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[FileRead]:
+        """
+        Returns files of the user ordered by path, page after page (keyset pagination).
+        :param after: only files with greater path are returned - path of the last file of previous page
+        :param limit: maximal number of returned files, all remaining files if None
+        :rtype: List[FileRead]
+        """
+        mappings: List[Mapping[str, Any]] = await self._db.fetch_all(self._user_files_query(user_info, after, limit))
 
         return [FileRead(
             file_path=Path(mapping['file_path']),
@@ -36,21 +68,235 @@ class FilesRepository:
             checksum=mapping['file_checksum']
         ) for mapping in mappings]
 
-    async def delete_file(self, loid: int) -> None:
-        query: Delete = files_table.delete(files_table.c.oid == loid)
-        await self._db.execute(query)
+    async def iterate_user_files(
+            self, user_info: UserInfo, after: Optional[str] = None, limit: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields files of the user ordered by path, as fields of FileRead ready to be encoded as JSON.
+        Rows are read from server side cursor, so they are never held in memory all at once,
+        and no model is built for them.
+        :param after: only files with greater path are returned - path of the last file of previous page
+        :param limit: maximal number of returned files, all remaining files if None
+        :rtype: AsyncIterator[Dict[str, Any]]
+        """
+        async for mapping in self._db.iterate(self._user_files_query(user_info, after, limit)):
+            yield {
+                'file_path': mapping['file_path'],
+                'file_size_mb': mapping['file_size_bytes'] / self.bytes_in_mb,
+                'checksum': mapping['file_checksum']
+            }
+
+    @staticmethod
+    def _user_files_query(user_info: UserInfo, after: Optional[str], limit: Optional[int]) -> Select:
+        # (owner_id, file_path) unique index serves both filtering and ordering
+        query: Select = select([files_table.c.file_path, files_table.c.file_size_bytes, files_table.c.file_checksum]) \
+            .where(files_table.c.owner_id == user_info.id) \
+            .order_by(files_table.c.file_path)
+
+        if after is not None:
+            query = query.where(files_table.c.file_path > after)
+        if limit is not None:
+            query = query.limit(limit)
+
+        return query
+
+    async def delete_file(self, file_db: FileDb) -> bool:
+        """
+        Deletes file and releases its reference to the blob.
+        :return: whether blob is no longer referenced and should be removed by caller
+        :rtype: bool
+        """
+        async with self._db.transaction():
+            delete_file: Delete = files_table.delete(files_table.c.id == file_db.id)
+            await self._db.execute(delete_file)
+
+            blob_released: bool = bool(await self._queue_blobs(
+                [file_db.oid] if await self._release_blob(file_db.oid) else []
+            ))
+
+        await self._invalidate_cached(file_db.owner_id, str(file_db.file_path))
+        return blob_released
+
+    async def delete_files(
+            self, user_info: UserInfo, file_paths: List[str], directory: Optional[str] = None
+    ) -> DeletedFiles:
+        """
+        Deletes many files of the user at once and releases their references to blobs.
+        Files are deleted, and blobs released, by a single statement.
+        :param file_paths: paths of files to delete, paths the user has no file with are skipped
+        :param directory: all files in this directory and its subdirectories are deleted too
+        :rtype: DeletedFiles
+        """
+        directory_pattern: Optional[str] = None
+        if directory is not None:
+            escaped: str = directory.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            directory_pattern = f'{escaped}/%'
+
+        async with self._db.transaction():
+            mappings: List[Mapping[str, Any]] = await self._db.fetch_all(delete_user_files, {
+                'owner_id': user_info.id,
+                'file_paths': file_paths,
+                'directory_pattern': directory_pattern
+            })
+
+            # blob that isn't shared (no reference count) belonged only to deleted file
+            unreferenced_blobs: List[int] = sorted({
+                mapping['oid'] for mapping in mappings
+                if mapping['reference_count'] is None or mapping['reference_count'] <= 0
+            })
+            if unreferenced_blobs:
+                await self._db.execute(delete_released_blobs, {'loids': unreferenced_blobs})
+            unreferenced_blobs = await self._queue_blobs(unreferenced_blobs)
+
+        files: List[FileDb] = [FileDb.parse_obj(mapping) for mapping in mappings]
+        if self._metadata_cache is not None:
+            await self._metadata_cache.invalidate_many(user_info.id, [str(file.file_path) for file in files])
+
+        return DeletedFiles(files, unreferenced_blobs)
+
+    async def replace_blob(
+            self, file_db: FileDb, loid: int, file_size: int,
+            checksum: str, content_hash: Optional[str] = None
+    ) -> bool:
+        """
+        Points file to new blob holding its next version and releases its reference to the old one.
+        File is replaced only if it still points to the blob it had when file_db was fetched.
+        :param loid: blob holding new version of the file
+        :param content_hash: strong hash of the new content, other files with it will share the blob
+        :return: whether old blob is no longer referenced and should be removed by caller
+        :raises FileModifiedError: file was modified or deleted in the meantime
+        :rtype: bool
+        """
+        async with self._db.transaction():
+            replace_blob: Update = files_table.update() \
+                .where(files_table.c.id == file_db.id) \
+                .where(files_table.c.oid == file_db.oid) \
+                .values(oid=loid, file_size_bytes=file_size, file_checksum=checksum or None) \
+                .returning(files_table.c.id)
+            if await self._db.fetch_val(replace_blob) is None:
+                raise FileModifiedError()
+
+            register_blob: Insert = insert(blobs_table).values(
+                oid=loid, content_hash=content_hash, size_bytes=file_size, reference_count=1
+            ).on_conflict_do_nothing()
+            await self._db.execute(register_blob)
+
+            blob_released: bool = bool(await self._queue_blobs(
+                [file_db.oid] if await self._release_blob(file_db.oid) else []
+            ))
 
-    async def fetch_db_file(self, file_path: str) -> FileDb:
-        query: Select = files_table.select(files_table.c.file_path == file_path)
+        await self._invalidate_cached(file_db.owner_id, str(file_db.file_path))
+        return blob_released
+
+    async def _queue_blobs(self, loids: List[int]) -> List[int]:
+        # queued in the transaction that released blobs, returns blobs that are left to the caller
+        if self._blob_deletion_queue is None:
+            return loids
+
+        await self._blob_deletion_queue.enqueue(loids)
+        return []
+
+    async def _release_blob(self, loid: int) -> bool:
+        release_blob: Update = blobs_table.update() \
+            .where(blobs_table.c.oid == loid) \
+            .values(reference_count=blobs_table.c.reference_count - 1) \
+            .returning(blobs_table.c.reference_count)
+        reference_count: Optional[int] = await self._db.fetch_val(release_blob)
+
+        if reference_count is None:
+            # blob isn't shared, it belonged only to this file
+            return True
+        if reference_count > 0:
+            return False
+
+        delete_blob: Delete = blobs_table.delete(blobs_table.c.oid == loid)
+        await self._db.execute(delete_blob)
+        return True
+
+    async def fetch_db_file(self, file_path: str, user_info: UserInfo, cached: bool = False) -> FileDb:
+        """
+        Returns file of the user, found with (owner_id, file_path) unique index.
+        :param cached: file may be served from metadata cache, it can be stale by up to cache TTL
+                       if it was changed through another worker - only for reads, never before file is modified
+        :raises FileDoesNotExistsError: user has no file with this path
+        :rtype: FileDb
+        """
+        use_cache: bool = cached and self._metadata_cache is not None
+
+        if use_cache:
+            cached_file: Optional[FileDb] = await self._metadata_cache.get(user_info.id, file_path)
+            if cached_file is not None:
+                return cached_file
+
+        query: Select = files_table.select() \
+            .where(files_table.c.owner_id == user_info.id) \
+            .where(files_table.c.file_path == file_path)
 
         result: Optional[Mapping[str, Any]] = await self._db.fetch_one(query)
 
         if not result:
             raise FileDoesNotExistsError()
 
-        return FileDb.parse_obj(result)
+        file_db: FileDb = FileDb.parse_obj(result)
+
+        if use_cache:
+            await self._metadata_cache.set(file_db)
+
+        return file_db
 
     async def create_file(
+            self, loid: int, file_path: str, file_size: int,
+            checksum: str, user_info: UserInfo, content_hash: Optional[str] = None
+    ) -> FileRead:
+        """
+        Creates file stored in new blob.
+        :param content_hash: strong hash of the content, other files with it will share the blob
+        :rtype: FileRead
+        """
+        async with self._db.transaction():
+            # blob with the same content stored in the meantime keeps being the shared one
+            register_blob: Insert = insert(blobs_table).values(
+                oid=loid, content_hash=content_hash, size_bytes=file_size, reference_count=1
+            ).on_conflict_do_nothing()
+            await self._db.execute(register_blob)
+
+            file_read: FileRead = await self._insert_file(loid, file_path, file_size, checksum, user_info)
+
+        await self._invalidate_cached(user_info.id, file_path)
+        return file_read
+
+    async def create_file_from_content(
+            self, content_hash: str, file_path: str, checksum: str,
+            user_info: UserInfo, file_size: Optional[int] = None
+    ) -> Optional[FileRead]:
+        """
+        Creates file that shares already stored blob with the same content.
+        :param content_hash: strong hash of the content
+        :param file_size: expected size of the content, if known
+        :return: created file, None if content isn't stored
+        :rtype: Optional[FileRead]
+        """
+        async with self._db.transaction():
+            acquire_blob: Update = blobs_table.update() \
+                .where(blobs_table.c.content_hash == content_hash) \
+                .values(reference_count=blobs_table.c.reference_count + 1) \
+                .returning(blobs_table.c.oid, blobs_table.c.size_bytes)
+            if file_size is not None:
+                acquire_blob = acquire_blob.where(blobs_table.c.size_bytes == file_size)
+
+            blob: Optional[Mapping[str, Any]] = await self._db.fetch_one(acquire_blob)
+
+            if blob is None:
+                return None
+
+            file_read: FileRead = await self._insert_file(
+                blob['oid'], file_path, blob['size_bytes'], checksum, user_info
+            )
+
+        await self._invalidate_cached(user_info.id, file_path)
+        return file_read
+
+    async def _insert_file(
             self, loid: int, file_path: str, file_size: int,
             checksum: str, user_info: UserInfo
     ) -> FileRead:
@@ -74,14 +320,25 @@ class FilesRepository:
             checksum=checksum if checksum else None
         )
 
+    async def _invalidate_cached(self, owner_id: str, file_path: str) -> None:
+        # called after transaction commits, so file can't be cached again in its old state by later reads
+        if self._metadata_cache is not None:
+            await self._metadata_cache.invalidate(owner_id, file_path)
+
     @classmethod
     def create(
-            cls, db_pool: Database = Depends(get_db)
+            cls, db_pool: Database = Depends(get_db),
+            metadata_cache: FileMetadataCache = Depends(FileMetadataCache.create),
+            settings: Settings = Depends(Settings.get)
     ) -> FilesRepository:
         """
         Creates new instance of self.
         :param db_pool: database connection pool
+        :param metadata_cache: cache of files read on download paths
+        :param settings: app settings, unreferenced blobs are queued if blob_deletion_queue is set
         :return: instance of FilesRepository
         :rtype: FilesRepository
         """
-        return FilesRepository(db_pool)
+        return FilesRepository(
+            db_pool, metadata_cache, BlobDeletionQueue(db_pool) if settings.blob_deletion_queue else None
+        )
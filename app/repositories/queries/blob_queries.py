@@ -4,28 +4,36 @@ write_data_to_blob = "SELECT lo_put(CAST(:loid AS OID), :offset, :data)"
 
 read_data_from_blob = "SELECT lo_get(CAST(:loid AS OID), :offset, :length)"
 
+# "x'40000'" = INV_READ, "x'60000'" = INV_READ | INV_WRITE
+open_blob_for_reading = "SELECT lo_open(CAST(:loid AS OID), x'40000' :: INT)"
+
+open_blob_for_writing = "SELECT lo_open(CAST(:loid AS OID), x'60000' :: INT)"
+
+# "0" = SEEK_SET
+seek_blob = "SELECT lo_lseek64(:descriptor, :offset, 0)"
+
+read_from_open_blob = "SELECT loread(:descriptor, :length)"
+
+write_to_open_blob = "SELECT lowrite(:descriptor, :data)"
+
+close_blob = "SELECT lo_close(:descriptor)"
+
 delete_blob = "SELECT lo_unlink(CAST(:loid AS OID))"
 
-get_size_of_blob_function = """
-CREATE OR REPLACE FUNCTION pg_temp.get_lo_size(loid INTEGER)
+create_get_lo_size_function = """
+CREATE OR REPLACE FUNCTION get_lo_size(loid OID)
 RETURNS BIGINT AS $lo_size$
 DECLARE
     file_descriptor INTEGER;
     file_size BIGINT;
 BEGIN
-    -- Open large object for reading.
-    -- Parameter "x'40000'" is equivalent to postgres large object mode "INV_READ"
-    -- which is necessary for method to work
-    file_descriptor := lo_open(CAST(loid AS OID), x'40000' :: INT);
+    -- Open large object for reading ("x'40000'" = INV_READ)
+    file_descriptor := lo_open(loid, x'40000' :: INT);
 
-    -- Seek to the end
-    -- "Seek" command = "2"
+    -- Seek to the end ("2" = SEEK_END) and read position of the last byte
     PERFORM lo_lseek64(file_descriptor, 0, 2);
-
-    -- Fetch current file position - location of the last byte
     file_size := lo_tell64(file_descriptor);
 
-    -- Close open file.
     PERFORM lo_close(file_descriptor);
 
     RETURN file_size;
@@ -34,4 +42,130 @@ $lo_size$
 LANGUAGE plpgsql;
 """
 
-get_size_of_blob = "SELECT pg_temp.get_lo_size(:loid);"
+get_size_of_blob = "SELECT get_lo_size(CAST(:loid AS OID))"
+
+get_sizes_of_blobs = """
+SELECT metadata.oid AS loid, get_lo_size(metadata.oid) AS size
+FROM pg_largeobject_metadata AS metadata
+WHERE metadata.oid = ANY(CAST(:loids AS OID[]))
+"""
+
+get_unreferenced_blobs = """
+SELECT metadata.oid AS loid
+FROM pg_largeobject_metadata AS metadata
+WHERE metadata.oid > CAST(:after_loid AS OID)
+    AND NOT EXISTS(SELECT 1 FROM files WHERE files.oid = metadata.oid)
+ORDER BY metadata.oid
+LIMIT :limit
+"""
+
+get_referenced_blobs = """
+SELECT oid AS loid
+FROM files
+WHERE oid = ANY(CAST(:loids AS OID[]))
+"""
+
+delete_unreferenced_blobs = """
+SELECT metadata.oid AS loid, lo_unlink(metadata.oid)
+FROM pg_largeobject_metadata AS metadata
+WHERE metadata.oid = ANY(CAST(:loids AS OID[]))
+    AND NOT EXISTS(SELECT 1 FROM files WHERE files.oid = metadata.oid)
+"""
+
+create_lo_concat_function = """
+CREATE OR REPLACE FUNCTION lo_concat(target OID, parts OID[], slice_size INTEGER)
+RETURNS BIGINT AS $lo_concat$
+DECLARE
+    target_descriptor INTEGER;
+    part_descriptor INTEGER;
+    part OID;
+    slice BYTEA;
+    target_size BIGINT;
+BEGIN
+    -- Open target for reading and writing ("x'60000'" = INV_READ | INV_WRITE), move to its end
+    target_descriptor := lo_open(target, x'60000' :: INT);
+    PERFORM lo_lseek64(target_descriptor, 0, 2);
+
+    FOREACH part IN ARRAY parts LOOP
+        -- Append part slice by slice ("x'40000'" = INV_READ), then remove it
+        part_descriptor := lo_open(part, x'40000' :: INT);
+        LOOP
+            slice := loread(part_descriptor, slice_size);
+            EXIT WHEN length(slice) = 0;
+            PERFORM lowrite(target_descriptor, slice);
+        END LOOP;
+        PERFORM lo_close(part_descriptor);
+        PERFORM lo_unlink(part);
+    END LOOP;
+
+    target_size := lo_tell64(target_descriptor);
+    PERFORM lo_close(target_descriptor);
+
+    RETURN target_size;
+END;
+$lo_concat$
+LANGUAGE plpgsql;
+"""
+
+concatenate_blobs = "SELECT lo_concat(CAST(:loid AS OID), CAST(:parts AS OID[]), :slice_size)"
+
+try_advisory_lock = "SELECT pg_try_advisory_lock(:key)"
+
+release_advisory_lock = "SELECT pg_advisory_unlock(:key)"
+
+get_last_blob_frame = """
+SELECT logical_offset + logical_size AS logical_size, stored_offset + stored_size AS stored_size, content_crc
+FROM blob_frames
+WHERE oid = CAST(:loid AS OID)
+ORDER BY logical_offset DESC
+LIMIT 1
+"""
+
+get_blob_frames = """
+SELECT logical_offset, logical_size, stored_offset, stored_size, compression
+FROM blob_frames
+WHERE oid = CAST(:loid AS OID)
+    AND logical_offset < :end
+    AND logical_offset >= COALESCE((
+        SELECT MAX(logical_offset) FROM blob_frames
+        WHERE oid = CAST(:loid AS OID) AND logical_offset <= :start
+    ), 0)
+ORDER BY logical_offset
+"""
+
+get_blob_frame_compressions = "SELECT DISTINCT compression FROM blob_frames WHERE oid = CAST(:loid AS OID)"
+
+insert_blob_frame = """
+INSERT INTO blob_frames (oid, logical_offset, logical_size, stored_offset, stored_size, compression, content_crc)
+VALUES (CAST(:loid AS OID), :logical_offset, :logical_size, :stored_offset, :stored_size, :compression, :content_crc)
+"""
+
+move_blob_frames = """
+UPDATE blob_frames
+SET oid = CAST(:loid AS OID),
+    logical_offset = logical_offset + :logical_base,
+    stored_offset = stored_offset + :stored_base,
+    content_crc = NULL
+WHERE oid = CAST(:part AS OID)
+"""
+
+set_last_blob_frame_crc = """
+UPDATE blob_frames
+SET content_crc = :content_crc
+WHERE oid = CAST(:loid AS OID)
+    AND logical_offset = (SELECT MAX(logical_offset) FROM blob_frames WHERE oid = CAST(:loid AS OID))
+"""
+
+delete_blob_frames = "DELETE FROM blob_frames WHERE oid = ANY(CAST(:loids AS OID[]))"
+
+# Queued blob is taken by a single worker, others skip it instead of waiting for its removal
+claim_queued_blob = """
+DELETE FROM blob_deletions
+WHERE oid = (
+    SELECT oid FROM blob_deletions
+    ORDER BY queued_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING oid
+"""
@@ -0,0 +1,68 @@
+create_file_directory_function = """
+CREATE OR REPLACE FUNCTION file_directory(file_path TEXT)
+RETURNS TEXT AS $file_directory$
+    -- Everything before the last '/', 'a/b/c.txt' -> 'a/b'
+    SELECT regexp_replace(file_path, '/[^/]*$', '');
+$file_directory$
+LANGUAGE sql IMMUTABLE;
+"""
+
+create_update_directories_function = """
+CREATE OR REPLACE FUNCTION update_directories(owner TEXT, file_path TEXT, count_delta BIGINT, size_delta BIGINT)
+RETURNS VOID AS $update_directories$
+DECLARE
+    path_parts TEXT[] := string_to_array(file_path, '/');
+    directory TEXT := NULL;
+    parent TEXT;
+BEGIN
+    -- Every ancestor directory of the file, from the top one down, so concurrent updates lock rows in the same order
+    FOR depth IN 1 .. coalesce(array_length(path_parts, 1), 0) - 1 LOOP
+        parent := directory;
+        directory := array_to_string(path_parts[1:depth], '/');
+
+        INSERT INTO directories (owner_id, path, parent_path, file_count, total_size_bytes)
+        VALUES (owner, directory, parent, count_delta, size_delta)
+        ON CONFLICT (owner_id, path) DO UPDATE
+        SET file_count = directories.file_count + count_delta,
+            total_size_bytes = directories.total_size_bytes + size_delta;
+
+        -- Directories exist as long as they contain files
+        IF count_delta < 0 THEN
+            DELETE FROM directories d WHERE d.owner_id = owner AND d.path = directory AND d.file_count <= 0;
+        END IF;
+    END LOOP;
+END;
+$update_directories$
+LANGUAGE plpgsql;
+"""
+
+create_files_update_directories_function = """
+CREATE OR REPLACE FUNCTION files_update_directories()
+RETURNS TRIGGER AS $files_update_directories$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND OLD.owner_id = NEW.owner_id AND OLD.file_path = NEW.file_path
+        AND OLD.file_size_bytes = NEW.file_size_bytes THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM update_directories(OLD.owner_id, OLD.file_path, -1, -OLD.file_size_bytes);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM update_directories(NEW.owner_id, NEW.file_path, 1, NEW.file_size_bytes);
+    END IF;
+
+    RETURN NULL;
+END;
+$files_update_directories$
+LANGUAGE plpgsql;
+"""
+
+create_files_update_directories_trigger = """
+CREATE TRIGGER files_update_directories
+AFTER INSERT OR DELETE OR UPDATE OF owner_id, file_path, file_size_bytes ON files
+FOR EACH ROW EXECUTE PROCEDURE files_update_directories();
+"""
+
+fill_directories = "SELECT update_directories(owner_id, file_path, 1, file_size_bytes) FROM files"
@@ -0,0 +1,26 @@
+# Files are deleted and their blobs released in one statement,
+# every blob is released once, by the number of deleted files that referenced it
+delete_user_files = r"""
+WITH deleted_files AS (
+    DELETE FROM files
+    WHERE owner_id = :owner_id
+        AND (file_path = ANY(CAST(:file_paths AS TEXT[])) OR file_path LIKE :directory_pattern ESCAPE '\')
+    RETURNING id, oid, owner_id, file_path, file_size_bytes, file_checksum
+), released_blobs AS (
+    UPDATE blobs
+    SET reference_count = blobs.reference_count - deleted_blobs.file_count
+    FROM (SELECT oid, COUNT(*) AS file_count FROM deleted_files GROUP BY oid) AS deleted_blobs
+    WHERE blobs.oid = deleted_blobs.oid
+    RETURNING blobs.oid, blobs.reference_count
+)
+SELECT deleted_files.*, released_blobs.reference_count
+FROM deleted_files
+LEFT JOIN released_blobs ON released_blobs.oid = deleted_files.oid
+ORDER BY deleted_files.file_path
+"""
+
+delete_released_blobs = """
+DELETE FROM blobs
+WHERE oid = ANY(CAST(:loids AS OID[]))
+    AND reference_count <= 0
+"""
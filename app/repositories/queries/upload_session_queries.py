@@ -0,0 +1,94 @@
+claim_upload_offset = """
+-- KEYS[1] - upload location
+-- KEYS[2] - claim of the upload offset
+-- ARGV[1] - offset at which chunk is going to be written
+-- ARGV[2] - token identifying the claiming request
+-- ARGV[3] - claim timeout in milliseconds
+-- Returns claimed offset, -1 if upload doesn't exist
+-- or -2 if offset was already advanced or is claimed by other request.
+local current_offset = redis.call('HGET', KEYS[1], 'upload_offset')
+
+if not current_offset then
+    return -1
+end
+
+if current_offset ~= ARGV[1] then
+    return -2
+end
+
+if not redis.call('SET', KEYS[2], ARGV[2], 'NX', 'PX', ARGV[3]) then
+    return -2
+end
+
+return tonumber(current_offset)
+"""
+
+advance_upload_offset = """
+-- KEYS[1] - upload location
+-- KEYS[2] - sorted set of blobs that belong to live uploads
+-- KEYS[3] - claim of the upload offset
+-- ARGV[1] - offset at which chunk was written
+-- ARGV[2] - offset after the chunk
+-- ARGV[3] - time to live of the upload session in seconds
+-- ARGV[4] - unix time at which upload session expires
+-- ARGV[5] - token of the claim taken before the chunk was written
+-- Returns new offset, -1 if upload doesn't exist
+-- or -2 if offset was already advanced or claim was lost.
+local current_offset = redis.call('HGET', KEYS[1], 'upload_offset')
+
+if not current_offset then
+    return -1
+end
+
+if current_offset ~= ARGV[1] or redis.call('GET', KEYS[3]) ~= ARGV[5] then
+    return -2
+end
+
+redis.call('HSET', KEYS[1], 'upload_offset', ARGV[2])
+redis.call('DEL', KEYS[3])
+
+-- every written chunk keeps upload alive
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[4], redis.call('HGET', KEYS[1], 'loid'))
+
+return tonumber(ARGV[2])
+"""
+
+claim_uploads = """
+-- KEYS - upload locations followed by claims of their offsets, in the same order
+-- ARGV[1] - token identifying the claiming request
+-- ARGV[2] - claim timeout in milliseconds
+-- Claims all uploads or none of them. Returns number of claimed uploads,
+-- -1 if some upload doesn't exist or -2 if some upload is already claimed.
+local count = #KEYS / 2
+
+for index = 1, count do
+    if redis.call('EXISTS', KEYS[index]) == 0 then
+        return -1
+    end
+    if redis.call('EXISTS', KEYS[count + index]) == 1 then
+        return -2
+    end
+end
+
+for index = 1, count do
+    redis.call('SET', KEYS[count + index], ARGV[1], 'PX', ARGV[2])
+end
+
+return count
+"""
+
+release_upload_claim = """
+-- KEYS - claims of upload offsets
+-- ARGV[1] - token of the claim
+-- Removes claims that still belong to the request.
+local released = 0
+
+for _, claim_key in ipairs(KEYS) do
+    if redis.call('GET', claim_key) == ARGV[1] then
+        released = released + redis.call('DEL', claim_key)
+    end
+end
+
+return released
+"""
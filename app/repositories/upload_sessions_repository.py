@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from secrets import token_hex
+from time import time
+from typing import Dict, Set, List
+
+from aredis import StrictRedis
+from fastapi import Depends
+
+from app.core import get_redis, Settings
+from app.errors import LocationNotFoundError, UploadOffsetConflictError, UploadInProgressError
+from app.repositories.queries.upload_session_queries import advance_upload_offset, claim_upload_offset, \
+    release_upload_claim, claim_uploads
+from app.schemas.files import UploadCacheData
+
+
+class UploadSessionsRepository:
+    """
+    Provides interface that enables communication with
+    upload sessions stored in redis.
+    Every session is kept as redis hash under its upload location.
+    | Sessions expire when no chunk is written for upload_session_ttl_seconds.
+    | Blobs of live sessions are tracked in a sorted set scored by expiration time,
+    | so blobs of abandoned uploads can be found and removed.
+    | Offset is claimed before chunk is written and advanced after,
+    | so only one request at a time writes to the upload.
+    """
+
+    upload_not_found: int = -1
+    offset_already_advanced: int = -2
+    upload_already_claimed: int = -2
+
+    live_blobs_key: str = 'upload_sessions:live_blobs'
+    """Sorted set of blob oids that belong to live uploads"""
+
+    def __init__(self, redis: StrictRedis, settings: Settings) -> None:
+        self._redis = redis
+        self._session_ttl_seconds: int = settings.upload_session_ttl_seconds
+        self._claim_timeout_milliseconds: int = settings.upload_claim_timeout_seconds * 1000
+
+    async def create_session(self, location: str, cache_data: UploadCacheData) -> None:
+        pipeline = await self._redis.pipeline()
+        await pipeline.hmset(location, cache_data.to_redis_hash())
+        await pipeline.expire(location, self._session_ttl_seconds)
+        await pipeline.zadd(self.live_blobs_key, time() + self._session_ttl_seconds, cache_data.loid)
+        await pipeline.execute()
+
+    async def fetch_session(self, location: str) -> UploadCacheData:
+        redis_hash: Dict[bytes, bytes] = await self._redis.hgetall(location)
+
+        if not redis_hash:
+            raise LocationNotFoundError()
+
+        return UploadCacheData.from_redis_hash(redis_hash)
+
+    async def claim_offset(self, location: str, upload_offset: int) -> str:
+        """
+        Atomically reserves upload_offset for a single chunk write.
+        Claim is held until offset is advanced, released, or claim times out.
+        :raises LocationNotFoundError: upload doesn't exist
+        :raises UploadOffsetConflictError: offset was already moved or claimed by other request
+        :return: token identifying the claim
+        :rtype: str
+        """
+        claim: str = token_hex(16)
+        result: int = await self._redis.register_script(claim_upload_offset).execute(
+            keys=[location, self._claim_key(location)],
+            args=[upload_offset, claim, self._claim_timeout_milliseconds]
+        )
+
+        await self._raise_on_conflict(location, result)
+
+        return claim
+
+    async def advance_offset(
+            self, location: str, upload_offset: int, new_offset: int, claim: str
+    ) -> int:
+        """
+        Atomically moves offset of the upload from upload_offset to new_offset,
+        releases the claim and extends lifetime of the session.
+        :param claim: token returned by claim_offset
+        :raises LocationNotFoundError: upload doesn't exist
+        :raises UploadOffsetConflictError: offset was already moved or claim timed out
+        :return: new offset
+        :rtype: int
+        """
+        result: int = await self._redis.register_script(advance_upload_offset).execute(
+            keys=[location, self.live_blobs_key, self._claim_key(location)],
+            args=[
+                upload_offset, new_offset, self._session_ttl_seconds,
+                time() + self._session_ttl_seconds, claim
+            ]
+        )
+
+        await self._raise_on_conflict(location, result)
+
+        return result
+
+    async def claim_uploads(self, locations: List[str]) -> str:
+        """
+        Atomically claims whole uploads, so no chunk can be written to them
+        and no other request can claim them until they are deleted or released.
+        :raises LocationNotFoundError: some upload doesn't exist
+        :raises UploadInProgressError: some upload is already claimed
+        :return: token identifying the claim
+        :rtype: str
+        """
+        claim: str = token_hex(16)
+        result: int = await self._redis.register_script(claim_uploads).execute(
+            keys=locations + [self._claim_key(location) for location in locations],
+            args=[claim, self._claim_timeout_milliseconds]
+        )
+
+        if result == self.upload_not_found:
+            raise LocationNotFoundError()
+        if result == self.upload_already_claimed:
+            raise UploadInProgressError()
+
+        return claim
+
+    async def release_claim(self, claim: str, *locations: str) -> None:
+        """
+        Releases claim taken by a request that failed, so uploads can be continued.
+        """
+        await self._redis.register_script(release_upload_claim).execute(
+            keys=[self._claim_key(location) for location in locations], args=[claim]
+        )
+
+    async def _raise_on_conflict(self, location: str, result: int) -> None:
+        if result == self.upload_not_found:
+            raise LocationNotFoundError()
+        if result == self.offset_already_advanced:
+            raise UploadOffsetConflictError(
+                (await self.fetch_session(location)).upload_offset
+            )
+
+    @staticmethod
+    def _claim_key(location: str) -> str:
+        return f'{location}:claim'
+
+    async def delete_session(self, location: str, loid: int) -> None:
+        pipeline = await self._redis.pipeline()
+        await pipeline.delete(location, self._claim_key(location))
+        await pipeline.zrem(self.live_blobs_key, loid)
+        await pipeline.execute()
+
+    async def fetch_live_blobs(self) -> Set[int]:
+        """
+        Returns oids of blobs that belong to uploads which haven't expired yet.
+        Entries of expired uploads are removed on the way.
+        :rtype: Set[int]
+        """
+        now: float = time()
+        await self._redis.zremrangebyscore(self.live_blobs_key, '-inf', now)
+        members: List[bytes] = await self._redis.zrangebyscore(self.live_blobs_key, now, '+inf')
+        return {int(member) for member in members}
+
+    @classmethod
+    def create(
+            cls, redis: StrictRedis = Depends(get_redis), settings: Settings = Depends(Settings.get)
+    ) -> UploadSessionsRepository:
+        """
+        Creates new instance of self.
+        :param redis: redis connection
+        :param settings: application settings
+        :return: instance of UploadSessionsRepository
+        :rtype: UploadSessionsRepository
+        """
+        return UploadSessionsRepository(redis, settings)
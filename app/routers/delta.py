@@ -0,0 +1,191 @@
+"""
+Delta updates of stored files, rsync style.
+
+Client fetches signatures of fixed size blocks of the current version of the file:
+weak rolling checksum (Adler-32, as calculated by zlib.adler32) and strong hash (128 bit BLAKE2b).
+It rolls the weak checksum over its new version to find blocks the server already has,
+and sends delta - instructions to assemble the new version:
+    b'C' <offset> <length> - copy length bytes of the current version, starting at offset
+    b'L' <length> <data>   - literal data that server doesn't have
+Numbers are unsigned 64 bit big-endian integers.
+"""
+import hashlib
+import struct
+import zlib
+from typing import AsyncIterator, Union, List, NamedTuple, Tuple, Any
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from ..errors import ChunkTooBigError, FileModifiedError
+from ..repositories.blob_storage import BlobStorage
+from ..schemas.enums import ChecksumAlgorithm
+from ..schemas.files import BlockSignature
+
+min_block_size: int = 64
+max_block_size: int = 16 * 1024 * 1024
+
+_copy_instruction: bytes = b'C'
+_literal_instruction: bytes = b'L'
+_number: struct.Struct = struct.Struct('>Q')
+_strong_hash_size: int = 16
+
+
+class DeltaCopy(NamedTuple):
+    """Copy instruction: length bytes of the current version, starting at offset"""
+    offset: int
+    length: int
+
+
+DeltaInstruction = Union[DeltaCopy, bytes]
+"""Copy instruction or piece of literal data"""
+
+
+def _block_signatures(data: bytes, block_size: int) -> List[BlockSignature]:
+    view: memoryview = memoryview(data)
+    # there can be millions of blocks - signatures are built without validation
+    return [BlockSignature.construct(
+        weak=zlib.adler32(view[start:start + block_size]),
+        strong=hashlib.blake2b(view[start:start + block_size], digest_size=_strong_hash_size).hexdigest()
+    ) for start in range(0, len(view), block_size)]
+
+
+async def calculate_signatures(
+        blob_repository: BlobStorage, loid: int, file_size: int, block_size: int, slice_size: int
+) -> List[BlockSignature]:
+    """
+    Calculates signatures of consecutive blocks of the blob, last block can be shorter.
+    Blob is read sequentially, many blocks at once, and hashed in threadpool.
+    :param slice_size: number of bytes read at once, rounded down to whole blocks
+    :rtype: List[BlockSignature]
+    """
+    slice_size = max(slice_size - slice_size % block_size, block_size)
+    signatures: List[BlockSignature] = []
+    pending: bytes = b''
+
+    async for data in blob_repository.iterate_blob(loid, 0, file_size, slice_size):
+        data = pending + data
+        whole_blocks: int = len(data) - len(data) % block_size
+        signatures += await run_in_threadpool(_block_signatures, data[:whole_blocks], block_size)
+        pending = data[whole_blocks:]
+
+    if pending:
+        signatures += await run_in_threadpool(_block_signatures, pending, block_size)
+
+    return signatures
+
+
+class _DeltaStream:
+    """
+    Reads exact number of bytes from request body, which arrives in arbitrary pieces.
+    """
+
+    def __init__(self, stream: AsyncIterator[bytes]) -> None:
+        self._stream: AsyncIterator[bytes] = stream.__aiter__()
+        self._buffer: bytearray = bytearray()
+
+    async def _fill(self) -> bool:
+        try:
+            self._buffer += await self._stream.__anext__()
+        except StopAsyncIteration:
+            return False
+        return True
+
+    async def at_end(self) -> bool:
+        while not self._buffer:
+            if not await self._fill():
+                return True
+        return False
+
+    async def read(self, length: int) -> bytes:
+        while len(self._buffer) < length:
+            if not await self._fill():
+                raise HTTPException(status_code=400, detail='Delta is truncated.')
+
+        data: bytes = bytes(self._buffer[:length])
+        del self._buffer[:length]
+        return data
+
+
+async def parse_delta(
+        stream: AsyncIterator[bytes], max_literal_size: int, piece_size: int
+) -> AsyncIterator[DeltaInstruction]:
+    """
+    Yields instructions of delta sent as request body, as it arrives.
+    Literal data is yielded in pieces of at most piece_size bytes, so it's never held in memory whole.
+    :param max_literal_size: maximal number of literal bytes in the whole delta
+    :raises HTTPException: delta is malformed
+    :raises ChunkTooBigError: delta carries more than max_literal_size literal bytes
+    :rtype: AsyncIterator[DeltaInstruction]
+    """
+    delta_stream: _DeltaStream = _DeltaStream(stream)
+    literal_size: int = 0
+
+    while not await delta_stream.at_end():
+        instruction: bytes = await delta_stream.read(1)
+
+        if instruction == _copy_instruction:
+            offset, = _number.unpack(await delta_stream.read(_number.size))
+            length, = _number.unpack(await delta_stream.read(_number.size))
+            yield DeltaCopy(offset, length)
+
+        elif instruction == _literal_instruction:
+            remaining, = _number.unpack(await delta_stream.read(_number.size))
+            literal_size += remaining
+            if literal_size > max_literal_size:
+                raise ChunkTooBigError()
+
+            while remaining:
+                piece: bytes = await delta_stream.read(min(piece_size, remaining))
+                yield piece
+                remaining -= len(piece)
+
+        else:
+            raise HTTPException(status_code=400, detail=f'Unknown delta instruction: {instruction!r}.')
+
+
+async def apply_delta(
+        blob_repository: BlobStorage, base_loid: int, base_size: int, loid: int,
+        instructions: AsyncIterator[DeltaInstruction], checksum_algorithm: ChecksumAlgorithm, slice_size: int
+) -> Tuple[int, str]:
+    """
+    Assembles new version of the file in empty blob, from current version and delta.
+    Current version is read sequentially, data is copied slice_size bytes at a time.
+    :param base_loid: blob holding current version of the file
+    :param base_size: size of current version
+    :param loid: empty blob for new version
+    :return: size and hex encoded checksum of new version
+    :raises HTTPException: copy instruction exceeds current version
+    :raises FileModifiedError: current version can't be read whole anymore
+    :rtype: Tuple[int, str]
+    """
+    file_hash: Any = hashlib.new(checksum_algorithm.value)
+    file_size: int = 0
+
+    async with blob_repository.open_reader(base_loid) as reader, blob_repository.open_writer(loid) as writer:
+        async for instruction in instructions:
+            if not isinstance(instruction, DeltaCopy):
+                await writer.write(instruction)
+                await run_in_threadpool(file_hash.update, instruction)
+                file_size += len(instruction)
+                continue
+
+            if instruction.offset + instruction.length > base_size:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f'Copy instruction exceeds current version of the file ({base_size} bytes).'
+                )
+
+            await reader.seek(instruction.offset)
+            remaining: int = instruction.length
+            while remaining:
+                data: bytes = await reader.read(min(slice_size, remaining))
+                if not data:
+                    # current version was removed by concurrent update
+                    raise FileModifiedError()
+                await writer.write(data)
+                await run_in_threadpool(file_hash.update, data)
+                file_size += len(data)
+                remaining -= len(data)
+
+    return file_size, file_hash.hexdigest()
@@ -1,17 +1,32 @@
+from datetime import datetime, timezone
 from secrets import token_urlsafe
-from typing import Optional, List, Union
-
-from aredis import StrictRedis
-from fastapi import APIRouter, Depends, Query, HTTPException, File
-from fastapi.responses import JSONResponse, Response
-
-from .utils import calculate_hash
+from time import time
+from typing import Optional, List, Union, Dict, AsyncIterator
+
+from databases import Database
+from fastapi import APIRouter, Depends, Query, HTTPException, File, Header, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from opentelemetry import trace
+from starlette.datastructures import URL
+
+from .delta import calculate_signatures, parse_delta, apply_delta, DeltaInstruction, min_block_size, max_block_size
+from .signed_urls import sign_download, verify_download
+from .streaming import blob_stream_response, encode_json_stream, listing_media_types
+from .utils import upload_hashes, is_chunk_checksum_valid, combine_checksums, calculate_checksum, read_chunk, \
+    stream_chunk, iterate_chunk, content_length, content_hash, ChunkHash
 from ..auth_client import logged_user
-from ..core import get_redis, Settings
-from ..errors import LocationNotFoundError, ChunkTooBigError
-from ..repositories.blob_repository import BlobRepository
-from ..repositories.files_repository import FilesRepository
-from ..schemas.files import UploadCreationHeaders, UploadCacheData, UploadFileHeaders, FileRead, FileDb
+from ..core import Settings, get_db, metrics
+from ..errors import ChunkTooBigError, ChunkChecksumMismatchError, UploadOffsetConflictError, \
+    UploadLengthExceededError, FileModifiedError
+from ..repositories.blob_storage import BlobStorage, get_blob_storage
+from ..repositories.directories_repository import DirectoriesRepository
+from ..repositories.files_repository import FilesRepository, DeletedFiles
+from ..repositories.upload_sessions_repository import UploadSessionsRepository
+from ..schemas.enums import UploadConcat, ChecksumAlgorithm, ListingFormat
+from ..schemas.files import UploadCreationHeaders, UploadCacheData, UploadFileHeaders, FileRead, FileDb, \
+    ConcatenationHeaders, FileSignatures, DirectoryRead, DirectoryListing, SignedDownloadUrl, BatchDelete, \
+    FileDeleteResult
 from ..schemas.users import UserInfo
 
 router: APIRouter = APIRouter()
@@ -22,22 +37,75 @@ router: APIRouter = APIRouter()
     response_model=List[FileRead],
     status_code=200,
     responses={
-        200: {'description': 'All files that belong to user returned successfully.'},
-        204: {'description': 'User has no files.'}
+        200: {'description': 'Files that belong to user, ordered by path, returned successfully. '
+                             "Full page links to the next one with 'Link' header."},
+        204: {'description': 'User has no (more) files.'}
     }
 )
 async def fetch_user_files(
+        request: Request,
+        response: Response,
+        after: Optional[str] = Query(
+            None, description='Only files with greater path are returned - path of the last file of previous page.'
+        ),
+        limit: Optional[int] = Query(None, ge=1, description='Maximal number of returned files (page size).'),
+        stream: Optional[ListingFormat] = Query(
+            None, description="Files are streamed as they are read from database: 'json' array "
+                              "or 'ndjson' (one file per line). Streamed listing is never 204."
+        ),
         files_repository: FilesRepository = Depends(FilesRepository.create),
+        settings: Settings = Depends(Settings.get),
         user_info: UserInfo = Depends(logged_user)
 ) -> Union[List[FileRead], Response]:
-    files: List[FileRead] = await files_repository.fetch_all_user_files(user_info)
+    if stream is not None:
+        return StreamingResponse(
+            encode_json_stream(
+                files_repository.iterate_user_files(user_info, after, limit), stream, settings.stream_chunk_size
+            ),
+            media_type=listing_media_types[stream]
+        )
+
+    files: List[FileRead] = await files_repository.fetch_all_user_files(user_info, after, limit)
 
     if not files:
         return Response(status_code=204)
 
+    if limit is not None and len(files) == limit:
+        response.headers['link'] = f'<{request.url.include_query_params(after=str(files[-1].file_path))}>; rel="next"'
+
     return files
 
 
+@router.get(
+    '/directory',
+    response_model=DirectoryRead,
+    status_code=200
+)
+async def fetch_directory(
+        path: str = Query(..., description="Directory path, e.g. 'photos/2020'."),
+        directories_repository: DirectoriesRepository = Depends(DirectoriesRepository.create),
+        user_info: UserInfo = Depends(logged_user)
+) -> DirectoryRead:
+    directory: DirectoryRead = await directories_repository.fetch_directory(user_info, path.rstrip('/'))
+    return directory
+
+
+@router.get(
+    '/directory/children',
+    response_model=DirectoryListing,
+    status_code=200
+)
+async def fetch_directory_children(
+        path: Optional[str] = Query(None, description='Directory path, top level directories are listed if missing.'),
+        directories_repository: DirectoriesRepository = Depends(DirectoriesRepository.create),
+        user_info: UserInfo = Depends(logged_user)
+) -> DirectoryListing:
+    listing: DirectoryListing = await directories_repository.fetch_children(
+        user_info, path.rstrip('/') if path is not None else None
+    )
+    return listing
+
+
 @router.get(
     '',
     status_code=200
@@ -46,14 +114,11 @@ async def download_file(
         file_path: str = Query(..., description='File path of the file to download.'),
         upload_offset: int = Query(..., description='File offset to get appropriate chunk.'),
         files_repository: FilesRepository = Depends(FilesRepository.create),
-        blob_repository: BlobRepository = Depends(BlobRepository.create),
+        blob_repository: BlobStorage = Depends(get_blob_storage),
         settings: Settings = Depends(Settings.get),
         user_info: UserInfo = Depends(logged_user)
 ) -> bytes:
-    file_db: FileDb = await files_repository.fetch_db_file(file_path)
-
-    if file_db.owner_id != user_info.id:
-        raise HTTPException(status_code=403, detail='No privileges to access file.')
+    file_db: FileDb = await files_repository.fetch_db_file(file_path, user_info, cached=True)
 
     chunk: bytes = await blob_repository.read_from_blob(
         file_db.oid, upload_offset, settings.max_chunk_size
@@ -62,31 +127,197 @@ async def download_file(
     return chunk
 
 
+@router.get(
+    '/stream',
+    status_code=200,
+    response_class=StreamingResponse,
+    responses={
+        200: {'description': 'Whole file streamed successfully.'},
+        206: {'description': 'Requested range(s) of the file streamed successfully.'},
+        416: {'description': 'None of requested ranges is satisfiable.'}
+    }
+)
+async def stream_file(
+        file_path: str = Query(..., description='File path of the file to download.'),
+        range_header: Optional[str] = Header(
+            None, alias='range', description='Byte range(s) to download, e.g. "bytes=0-499".'
+        ),
+        accept_encoding: Optional[str] = Header(
+            None, description='Compressed file is sent without decompression, if its compression is accepted.'
+        ),
+        files_repository: FilesRepository = Depends(FilesRepository.create),
+        blob_repository: BlobStorage = Depends(get_blob_storage),
+        settings: Settings = Depends(Settings.get),
+        user_info: UserInfo = Depends(logged_user)
+) -> Response:
+    file_db: FileDb = await files_repository.fetch_db_file(file_path, user_info, cached=True)
+
+    return await blob_stream_response(
+        blob_repository, file_db.oid, file_db.file_size_bytes,
+        range_header, settings.stream_chunk_size, accept_encoding
+    )
+
+
+@router.get(
+    '/signed-url',
+    response_model=SignedDownloadUrl,
+    status_code=200,
+    responses={
+        200: {'description': 'Download URL that needs no access token was signed successfully.'},
+        501: {'description': 'Signed download URLs are not enabled.'}
+    }
+)
+async def sign_download_url(
+        request: Request,
+        file_path: str = Query(..., description='File path of the file to download.'),
+        files_repository: FilesRepository = Depends(FilesRepository.create),
+        settings: Settings = Depends(Settings.get),
+        user_info: UserInfo = Depends(logged_user)
+) -> SignedDownloadUrl:
+    file_db: FileDb = await files_repository.fetch_db_file(file_path, user_info, cached=True)
+
+    params: Dict[str, Union[int, str]] = sign_download(file_db, settings)
+
+    return SignedDownloadUrl(
+        url=str(URL(request.url_for('download_signed_file')).include_query_params(**params)),
+        expires_at=datetime.fromtimestamp(params['expires'], timezone.utc)
+    )
+
+
+@router.get(
+    '/signed',
+    status_code=200,
+    response_class=StreamingResponse,
+    responses={
+        200: {'description': 'Whole file streamed successfully.'},
+        206: {'description': 'Requested range(s) of the file streamed successfully.'},
+        403: {'description': 'Download URL is invalid or expired.'},
+        416: {'description': 'None of requested ranges is satisfiable.'}
+    }
+)
+async def download_signed_file(
+        oid: int = Query(...),
+        size: int = Query(..., ge=0),
+        owner: str = Query(...),
+        expires: int = Query(..., description='Unix time after which URL is no longer valid.'),
+        signature: str = Query(...),
+        range_header: Optional[str] = Header(
+            None, alias='range', description='Byte range(s) to download, e.g. "bytes=0-499".'
+        ),
+        accept_encoding: Optional[str] = Header(
+            None, description='Compressed file is sent without decompression, if its compression is accepted.'
+        ),
+        blob_repository: BlobStorage = Depends(get_blob_storage),
+        settings: Settings = Depends(Settings.get)
+) -> Response:
+    # no access token, no 'files' query - everything needed is in the signed URL
+    verify_download(oid, size, owner, expires, signature, settings)
+
+    response: Response = await blob_stream_response(
+        blob_repository, oid, size, range_header, settings.stream_chunk_size, accept_encoding
+    )
+    # URL points to one version of the file, caches may keep it as long as URL is valid
+    response.headers['cache-control'] = f'private, max-age={max(expires - int(time()), 0)}'
+    return response
+
+
 @router.post(
     '',
-    status_code=201
+    status_code=201,
+    responses={
+        201: {'description': 'Upload created. If it was sent whole (Upload-Length reached) or its content '
+                             'is already stored (File-Checksum), file is stored right away and returned.'},
+        460: {'description': "File sent whole doesn't match File-Checksum."}
+    }
 )
 async def create_new_upload(
+        request: Request,
         headers: UploadCreationHeaders = Depends(UploadCreationHeaders.as_header),
-        redis: StrictRedis = Depends(get_redis),
+        upload_sessions_repository: UploadSessionsRepository = Depends(UploadSessionsRepository.create),
         user_info: UserInfo = Depends(logged_user),
-        blob_repository: BlobRepository = Depends(BlobRepository.create),
+        blob_repository: BlobStorage = Depends(get_blob_storage),
+        files_repository: FilesRepository = Depends(FilesRepository.create),
+        db: Database = Depends(get_db),
         settings: Settings = Depends(Settings.get)
 ) -> JSONResponse:
-    loid: int = await blob_repository.create_blob()
+    """
+    Creates new upload. First chunk of the file (or the whole file) can be sent
+    in the body as 'application/offset+octet-stream'. When it reaches declared Upload-Length,
+    file is stored in a single transaction and no upload session is created.
+    When File-Checksum identifies already stored content, file is created
+    right away without reading the body.
+    """
+    if headers.file_checksum:
+        stored_file: Optional[FileRead] = await files_repository.create_file_from_content(
+            content_hash(headers.checksum_algorithm, headers.file_checksum), str(headers.file_path),
+            headers.file_checksum, user_info, headers.upload_length
+        )
+        if stored_file is not None:
+            return JSONResponse(
+                status_code=201,
+                content=jsonable_encoder(stored_file),
+                headers={'upload-offset': str(headers.upload_length)}
+            )
+
+    data: bytes = await read_chunk(request, settings.max_chunk_size)
+
+    if headers.upload_length is not None and len(data) > headers.upload_length:
+        raise UploadLengthExceededError(headers.upload_length)
+    if headers.upload_checksum and not await is_chunk_checksum_valid(data, headers.upload_checksum):
+        raise ChunkChecksumMismatchError()
+
+    if headers.upload_concat != UploadConcat.PARTIAL and headers.upload_length == len(data):
+        # whole file was sent - store it in one transaction, without upload session
+        file_checksum: str = await calculate_checksum(headers.checksum_algorithm, data)
+        file_content_hash: Optional[str] = content_hash(headers.checksum_algorithm, file_checksum)
+
+        if headers.file_checksum and headers.file_checksum != file_checksum:
+            raise HTTPException(status_code=460, detail="Checksums don't match.")
+
+        file_read: Optional[FileRead] = await files_repository.create_file_from_content(
+            file_content_hash, str(headers.file_path), file_checksum, user_info, len(data)
+        ) if file_content_hash else None
+
+        if file_read is None:
+            async with db.transaction():
+                loid: int = await blob_repository.create_blob()
+                if data:
+                    await blob_repository.write_to_blob(loid, 0, data)
+                file_read = await files_repository.create_file(
+                    loid, str(headers.file_path), len(data), file_checksum, user_info, file_content_hash
+                )
+
+        return JSONResponse(
+            status_code=201,
+            content=jsonable_encoder(file_read),
+            headers={'upload-offset': str(len(data))}
+        )
+
+    # blob left by failed write is removed by blob reaper
+    loid = await blob_repository.create_blob()
+    if data:
+        await blob_repository.write_to_blob(loid, 0, data)
+
     location: str = token_urlsafe(settings.location_url_bytes)
 
     upload_cache_data = UploadCacheData(
         owner_id=user_info.id,
         loid=loid,
-        file_path=str(headers.file_path)
+        file_path=str(headers.file_path) if headers.file_path else '',
+        checksum_algorithm=headers.checksum_algorithm,
+        upload_offset=len(data),
+        is_partial=headers.upload_concat == UploadConcat.PARTIAL,
+        upload_length=headers.upload_length
     )
 
-    await redis.set(location, upload_cache_data.json())
+    await upload_sessions_repository.create_session(location, upload_cache_data)
+
+    if data:
+        await upload_hashes.update(location, headers.checksum_algorithm, 0, data)
 
     return JSONResponse(
         status_code=201,
-        headers={'location': location}
+        headers={'location': location, 'upload-offset': str(len(data))}
     )
 
 
@@ -95,30 +326,66 @@ async def create_new_upload(
     status_code=200
 )
 async def upload_file(
-        chunk: bytes = File(..., description='chunk of the file'),
+        request: Request,
+        chunk: Optional[bytes] = File(None, description="chunk of the file, when it's sent as multipart form"),
         location: str = Query(..., description='upload location'),
         headers: UploadFileHeaders = Depends(UploadFileHeaders.as_header),
-        redis: StrictRedis = Depends(get_redis),
-        blob_repository: BlobRepository = Depends(BlobRepository.create),
+        upload_sessions_repository: UploadSessionsRepository = Depends(UploadSessionsRepository.create),
+        blob_repository: BlobStorage = Depends(get_blob_storage),
         settings: Settings = Depends(Settings.get),
         user_info: UserInfo = Depends(logged_user)
 ) -> JSONResponse:
-    if not await redis.exists(location):
-        raise LocationNotFoundError()
-    if len(chunk) > settings.max_chunk_size:
+    """
+    Writes chunk at Upload-Offset. Chunk sent as raw 'application/offset+octet-stream' body
+    is written to the blob piece by piece as it arrives, so it's never held in memory whole.
+    """
+    cache_data: UploadCacheData = await upload_sessions_repository.fetch_session(location)
+    declared_size: int = len(chunk) if chunk is not None else content_length(request)
+
+    if declared_size > settings.max_chunk_size:
         raise ChunkTooBigError()
-
-    redis_data: bytes = await redis.get(location)
-    cache_data: UploadCacheData = UploadCacheData.parse_raw(redis_data)
-
     if user_info.id != cache_data.owner_id:
         raise HTTPException(status_code=403, detail='No privileges to access file.')
+    if headers.upload_offset != cache_data.upload_offset:
+        raise UploadOffsetConflictError(cache_data.upload_offset)
+    if cache_data.upload_length is not None and headers.upload_offset + declared_size > cache_data.upload_length:
+        raise UploadLengthExceededError(cache_data.upload_length)
 
-    await blob_repository.write_to_blob(
-        cache_data.loid, headers.upload_offset, chunk
+    pieces: AsyncIterator[bytes] = iterate_chunk(chunk) if chunk is not None else stream_chunk(
+        request, settings.max_chunk_size, settings.stream_chunk_size
+    )
+    chunk_hash: ChunkHash = ChunkHash(headers.upload_checksum)
+    chunk_size: int = 0
+
+    # concurrent requests with the same offset must not both write to the blob
+    claim: str = await upload_sessions_repository.claim_offset(location, headers.upload_offset)
+    try:
+        # chunk that isn't received whole or doesn't match its checksum is rolled back
+        async with blob_repository.open_writer(cache_data.loid, headers.upload_offset) as writer:
+            async for piece in pieces:
+                offset: int = headers.upload_offset + chunk_size
+                if cache_data.upload_length is not None and offset + len(piece) > cache_data.upload_length:
+                    raise UploadLengthExceededError(cache_data.upload_length)
+
+                await writer.write(piece)
+                await chunk_hash.update(piece)
+                await upload_hashes.update(location, cache_data.checksum_algorithm, offset, piece)
+                chunk_size += len(piece)
+
+            if not chunk_hash.is_valid():
+                raise ChunkChecksumMismatchError()
+    except BaseException:
+        upload_hashes.discard(location)
+        await upload_sessions_repository.release_claim(claim, location)
+        raise
+
+    upload_offset: int = await upload_sessions_repository.advance_offset(
+        location, headers.upload_offset, headers.upload_offset + chunk_size, claim
+    )
+    metrics.chunk_size.observe(chunk_size)
+    trace.get_current_span().set_attributes(
+        {'blob.oid': cache_data.loid, 'blob.offset': headers.upload_offset, 'chunk.size': chunk_size}
     )
-
-    upload_offset: int = (headers.upload_offset + len(chunk))
 
     return JSONResponse(
         status_code=200,
@@ -134,40 +401,263 @@ async def upload_file(
 async def confirm_upload(
         location: str = Query(..., description='upload location'),
         checksum: Optional[str] = Query(None, description='checksum of the file - for optional validation'),
-        redis: StrictRedis = Depends(get_redis),
-        blob_repository: BlobRepository = Depends(BlobRepository.create),
+        upload_sessions_repository: UploadSessionsRepository = Depends(UploadSessionsRepository.create),
+        blob_repository: BlobStorage = Depends(get_blob_storage),
         files_repository: FilesRepository = Depends(FilesRepository.create),
         settings: Settings = Depends(Settings.get),
         user_info: UserInfo = Depends(logged_user)
 ) -> FileRead:
-    if not await redis.exists(location):
-        raise LocationNotFoundError()
-
-    redis_data: bytes = await redis.get(location)
-    cache_data: UploadCacheData = UploadCacheData.parse_raw(redis_data)
+    cache_data: UploadCacheData = await upload_sessions_repository.fetch_session(location)
 
     if user_info.id != cache_data.owner_id:
         raise HTTPException(status_code=403, detail='No privileges to access file.')
+    if cache_data.is_partial:
+        raise HTTPException(status_code=400, detail='Partial upload must be concatenated, not confirmed.')
+
+    file_size: int = await blob_repository.get_last_byte(cache_data.loid)
+
+    if cache_data.upload_length is not None and file_size != cache_data.upload_length:
+        upload_hashes.discard(location)
+        await upload_sessions_repository.delete_session(location, cache_data.loid)
+        await blob_repository.remove_blob(cache_data.loid)
+        raise HTTPException(
+            status_code=400,
+            detail=f'Upload is incomplete: {file_size} of {cache_data.upload_length} bytes received. '
+                   f'File deleted.'
+        )
 
     blob_checksum: str = ''
     if checksum:
-        blob_checksum = await calculate_hash(cache_data.loid, blob_repository, settings)
+        blob_checksum = await upload_hashes.hexdigest(
+            location, cache_data.checksum_algorithm, cache_data.loid,
+            file_size, blob_repository, settings
+        )
         if checksum != blob_checksum:
-            await redis.delete(location)
+            await upload_sessions_repository.delete_session(location, cache_data.loid)
+            await blob_repository.remove_blob(cache_data.loid)
             raise HTTPException(status_code=460, detail="Checksums don't match. File deleted.")
+    else:
+        upload_hashes.discard(location)
 
-    file_size: int = await blob_repository.get_last_byte(cache_data.loid)
+    file_content_hash: Optional[str] = content_hash(cache_data.checksum_algorithm, blob_checksum)
+
+    # the same content is already stored - file shares that blob, uploaded one is removed
+    stored_file: Optional[FileRead] = await files_repository.create_file_from_content(
+        file_content_hash, cache_data.file_path, blob_checksum, user_info, file_size
+    ) if file_content_hash else None
+
+    if stored_file is not None:
+        await upload_sessions_repository.delete_session(location, cache_data.loid)
+        await blob_repository.remove_blob(cache_data.loid)
+        return stored_file
 
     file_read: FileRead = await files_repository.create_file(
         cache_data.loid, cache_data.file_path, file_size,
-        blob_checksum, user_info
+        blob_checksum, user_info, file_content_hash
     )
 
-    await redis.delete(location)
+    await upload_sessions_repository.delete_session(location, cache_data.loid)
 
     return file_read
 
 
+@router.post(
+    '/concatenate',
+    response_model=FileRead,
+    status_code=201,
+    responses={
+        201: {'description': 'Partial uploads concatenated into new file.'},
+        409: {'description': 'Partial upload is being written or concatenated by other request.'},
+        410: {'description': 'Data of partial upload no longer exists.'},
+        460: {'description': "Checksum of concatenated file doesn't match, partial uploads were kept."}
+    }
+)
+async def concatenate_uploads(
+        checksum: Optional[str] = Query(None, description='checksum of the whole file - for optional validation'),
+        headers: ConcatenationHeaders = Depends(ConcatenationHeaders.as_header),
+        upload_sessions_repository: UploadSessionsRepository = Depends(UploadSessionsRepository.create),
+        blob_repository: BlobStorage = Depends(get_blob_storage),
+        files_repository: FilesRepository = Depends(FilesRepository.create),
+        db: Database = Depends(get_db),
+        settings: Settings = Depends(Settings.get),
+        user_info: UserInfo = Depends(logged_user)
+) -> FileRead:
+    """
+    Creates file from partial uploads, which can be uploaded in parallel.
+    Parts are concatenated inside database. Checksum of the file is combined
+    from checksums of the parts: digest of their concatenated digests, suffixed with number of parts.
+    """
+    parts: List[UploadCacheData] = [
+        await upload_sessions_repository.fetch_session(location) for location in headers.locations
+    ]
+
+    if any(part.owner_id != user_info.id for part in parts):
+        raise HTTPException(status_code=403, detail='No privileges to access file.')
+    if not all(part.is_partial for part in parts):
+        raise HTTPException(status_code=400, detail='Only partial uploads can be concatenated.')
+
+    checksum_algorithm = parts[0].checksum_algorithm
+    if any(part.checksum_algorithm != checksum_algorithm for part in parts):
+        raise HTTPException(status_code=400, detail='All parts must use the same checksum algorithm.')
+
+    # parts are claimed, so no chunk can be written to them and no other request can concatenate them
+    claim: str = await upload_sessions_repository.claim_uploads(headers.locations)
+    try:
+        part_sizes: Dict[int, int] = await blob_repository.get_sizes(part.loid for part in parts)
+        if any(part.loid not in part_sizes for part in parts):
+            raise HTTPException(status_code=410, detail='Data of partial upload no longer exists.')
+
+        file_checksum: str = ''
+        if checksum:
+            file_checksum = combine_checksums(checksum_algorithm, [
+                await upload_hashes.hexdigest(
+                    location, checksum_algorithm, part.loid, part_sizes[part.loid], blob_repository, settings
+                ) for location, part in zip(headers.locations, parts)
+            ])
+            if checksum != file_checksum:
+                raise HTTPException(status_code=460, detail="Checksums don't match. Partial uploads were kept.")
+
+        # first part becomes the file, the rest is appended to it
+        async with db.transaction():
+            file_size: int = await blob_repository.concatenate_blobs(
+                parts[0].loid, [part.loid for part in parts[1:]], settings.stream_chunk_size
+            )
+            file_read: FileRead = await files_repository.create_file(
+                parts[0].loid, str(headers.file_path), file_size, file_checksum, user_info
+            )
+    except BaseException:
+        await upload_sessions_repository.release_claim(claim, *headers.locations)
+        raise
+
+    for location, part in zip(headers.locations, parts):
+        upload_hashes.discard(location)
+        await upload_sessions_repository.delete_session(location, part.loid)
+
+    return file_read
+
+
+@router.get(
+    '/signatures',
+    response_model=FileSignatures,
+    status_code=200,
+    responses={
+        200: {'description': 'Signatures of blocks of the current version returned, '
+                             'ETag header identifies the version.'}
+    }
+)
+async def fetch_file_signatures(
+        file_path: str = Query(..., description='File path of the file to update.'),
+        block_size: Optional[int] = Query(
+            None, ge=min_block_size, le=max_block_size,
+            description='Size of a single block in bytes, last block can be shorter.'
+        ),
+        files_repository: FilesRepository = Depends(FilesRepository.create),
+        blob_repository: BlobStorage = Depends(get_blob_storage),
+        settings: Settings = Depends(Settings.get),
+        user_info: UserInfo = Depends(logged_user)
+) -> JSONResponse:
+    """
+    Returns signatures of consecutive blocks of the current version of the file:
+    Adler-32 checksum (weak, rolling) and 128 bit BLAKE2b digest (strong) of each block.
+    Client finds blocks it shares with its new version and sends only the difference as delta.
+    """
+    file_db: FileDb = await files_repository.fetch_db_file(file_path, user_info)
+
+    block_size = block_size or settings.delta_block_size
+    signatures: FileSignatures = FileSignatures.construct(
+        version=str(file_db.oid),
+        file_size=file_db.file_size_bytes,
+        block_size=block_size,
+        blocks=await calculate_signatures(
+            blob_repository, file_db.oid, file_db.file_size_bytes, block_size, settings.stream_chunk_size
+        )
+    )
+
+    return JSONResponse(
+        status_code=200,
+        content=signatures.dict(),
+        headers={'etag': f'"{signatures.version}"'}
+    )
+
+
+@router.put(
+    '/delta',
+    response_model=FileRead,
+    status_code=200,
+    responses={
+        200: {'description': 'Delta applied, new version of the file stored in place of the old one.'},
+        412: {'description': 'File was modified since its signatures were fetched.'},
+        460: {'description': "New version doesn't match File-Checksum, file wasn't modified."}
+    }
+)
+async def update_file_with_delta(
+        request: Request,
+        file_path: str = Query(..., description='File path of the file to update.'),
+        if_match: str = Header(
+            ..., description='ETag of the version that delta was calculated against.'
+        ),
+        upload_checksum_algorithm: ChecksumAlgorithm = Header(
+            ChecksumAlgorithm.MD5,
+            description='Algorithm used to calculate checksum of the new version.',
+            convert_underscores=True
+        ),
+        file_checksum: Optional[str] = Header(
+            None,
+            description='Hex encoded checksum of the new version - for optional validation.',
+            convert_underscores=True
+        ),
+        files_repository: FilesRepository = Depends(FilesRepository.create),
+        blob_repository: BlobStorage = Depends(get_blob_storage),
+        db: Database = Depends(get_db),
+        settings: Settings = Depends(Settings.get),
+        user_info: UserInfo = Depends(logged_user)
+) -> JSONResponse:
+    """
+    Updates file with delta sent as raw request body - sequence of instructions:
+    copy a range of the current version (b'C' <offset> <length>)
+    or write literal data (b'L' <length> <data>), numbers are 64 bit big-endian integers.
+    New version is assembled in new blob, which replaces the old one in a single transaction.
+    Delta can carry at most max_chunk_size bytes of literal data.
+    """
+    file_db: FileDb = await files_repository.fetch_db_file(file_path, user_info)
+
+    if if_match.strip().strip('"') != str(file_db.oid):
+        raise FileModifiedError()
+
+    instructions: AsyncIterator[DeltaInstruction] = parse_delta(
+        request.stream(), settings.max_chunk_size, settings.stream_chunk_size
+    )
+
+    # blob left by failed update is removed by blob reaper
+    async with db.transaction():
+        loid: int = await blob_repository.create_blob()
+        file_size, checksum = await apply_delta(
+            blob_repository, file_db.oid, file_db.file_size_bytes, loid,
+            instructions, upload_checksum_algorithm, settings.stream_chunk_size
+        )
+
+        if file_checksum and file_checksum.lower() != checksum:
+            raise HTTPException(status_code=460, detail="Checksums don't match. File wasn't modified.")
+
+        old_blob_unreferenced: bool = await files_repository.replace_blob(
+            file_db, loid, file_size, checksum, content_hash(upload_checksum_algorithm, checksum)
+        )
+
+    # old version can be shared by other files with the same content
+    if old_blob_unreferenced:
+        await blob_repository.remove_blob(file_db.oid)
+
+    return JSONResponse(
+        status_code=200,
+        content=jsonable_encoder(FileRead(
+            file_path=file_db.file_path,
+            file_size_mb=file_size / FilesRepository.bytes_in_mb,
+            checksum=checksum
+        )),
+        headers={'etag': f'"{loid}"'}
+    )
+
+
 @router.head(
     '',
     response_model=int,
@@ -175,24 +665,24 @@ async def confirm_upload(
 )
 async def fetch_upload_offset(
         location: str = Query(..., description='upload location'),
-        redis: StrictRedis = Depends(get_redis),
-        blob_repository: BlobRepository = Depends(BlobRepository.create),
+        upload_sessions_repository: UploadSessionsRepository = Depends(UploadSessionsRepository.create),
         user_info: UserInfo = Depends(logged_user)
 ) -> JSONResponse:
-    if not await redis.exists(location):
-        raise LocationNotFoundError()
-
-    redis_data: bytes = await redis.get(location)
-    cache_data: UploadCacheData = UploadCacheData.parse_raw(redis_data)
+    cache_data: UploadCacheData = await upload_sessions_repository.fetch_session(location)
 
     if user_info.id != cache_data.owner_id:
         raise HTTPException(status_code=403, detail='No privileges to access file.')
 
-    last_byte: int = await blob_repository.get_last_byte(cache_data.loid)
+    headers: Dict[str, str] = {
+        'upload-offset': str(cache_data.upload_offset),
+        'cache-control': 'no-store'
+    }
+    if cache_data.upload_length is not None:
+        headers['upload-length'] = str(cache_data.upload_length)
 
     return JSONResponse(
         status_code=200,
-        headers={'upload-offset': str(last_byte)}
+        headers=headers
     )
 
 
@@ -203,16 +693,14 @@ async def fetch_upload_offset(
 async def delete_file(
         file_path: str = Query(..., description='path of file to delete'),
         files_repository: FilesRepository = Depends(FilesRepository.create),
-        blob_repository: BlobRepository = Depends(BlobRepository.create),
+        blob_repository: BlobStorage = Depends(get_blob_storage),
         user_info: UserInfo = Depends(logged_user)
 ) -> JSONResponse:
-    db_file: FileDb = await files_repository.fetch_db_file(file_path)
+    db_file: FileDb = await files_repository.fetch_db_file(file_path, user_info)
 
-    if db_file.owner_id != user_info.id:
-        raise HTTPException(status_code=403, detail='No privileges to access file.')
-
-    await files_repository.delete_file(db_file.oid)
-    await blob_repository.remove_blob(db_file.oid)
+    # blob can be shared by other files with the same content
+    if await files_repository.delete_file(db_file):
+        await blob_repository.remove_blob(db_file.oid)
 
     return JSONResponse(
         status_code=200,
@@ -221,3 +709,38 @@ async def delete_file(
                        f"Object with path '{db_file.file_path}' was deleted."
         }
     )
+
+
+@router.post(
+    '/delete',
+    response_model=List[FileDeleteResult],
+    status_code=200,
+    responses={
+        200: {'description': 'Result of every requested path (200 - deleted, 404 - not found), '
+                             'followed by other deleted files of the directory, ordered by path.'}
+    }
+)
+async def delete_files(
+        batch: BatchDelete,
+        files_repository: FilesRepository = Depends(FilesRepository.create),
+        blob_repository: BlobStorage = Depends(get_blob_storage),
+        settings: Settings = Depends(Settings.get),
+        user_info: UserInfo = Depends(logged_user)
+) -> List[FileDeleteResult]:
+    deleted: DeletedFiles = await files_repository.delete_files(user_info, batch.file_paths, batch.directory)
+
+    # blobs are removed a batch at a time, every batch by a single statement
+    blobs: List[int] = deleted.unreferenced_blobs
+    for start in range(0, len(blobs), settings.blob_unlink_batch_size):
+        await blob_repository.remove_unreferenced_blobs(blobs[start:start + settings.blob_unlink_batch_size])
+
+    deleted_paths: Dict[str, None] = dict.fromkeys(str(file.file_path) for file in deleted.files)
+    requested_paths: Dict[str, None] = dict.fromkeys(batch.file_paths)
+
+    return [
+        FileDeleteResult(file_path=file_path, status_code=200 if file_path in deleted_paths else 404)
+        for file_path in requested_paths
+    ] + [
+        FileDeleteResult(file_path=file_path, status_code=200)
+        for file_path in deleted_paths if file_path not in requested_paths
+    ]
@@ -0,0 +1,65 @@
+"""
+Signed download URLs.
+
+URL carries everything needed to serve the file - oid and size of its blob, owner and expiry -
+together with HMAC-SHA256 signature of these values, made with 'download_url_secret'.
+Download verifies the signature locally, so it needs neither access token nor 'files' table query,
+and the URL can be handed to CDNs and batch jobs.
+URL keeps pointing to the blob the file had when it was signed - it stops working
+once the file is deleted or updated and its blob removed.
+"""
+import hashlib
+import hmac
+from base64 import urlsafe_b64encode
+from time import time
+from typing import Dict, Union
+
+from fastapi import HTTPException
+
+from ..core import Settings
+from ..errors import InvalidDownloadUrlError
+from ..schemas.files import FileDb
+
+
+def _secret(settings: Settings) -> bytes:
+    if not settings.download_url_secret:
+        raise HTTPException(status_code=501, detail='Signed download URLs are not enabled.')
+    return settings.download_url_secret.get_secret_value().encode('utf-8')
+
+
+def _signature(secret: bytes, oid: int, size: int, owner: str, expires: int) -> str:
+    # numbers can't contain separator, owner goes last, so no two sets of values are signed the same
+    message: bytes = f'{oid}\n{size}\n{expires}\n{owner}'.encode('utf-8')
+    return urlsafe_b64encode(hmac.new(secret, message, hashlib.sha256).digest()).rstrip(b'=').decode('ascii')
+
+
+def sign_download(file_db: FileDb, settings: Settings) -> Dict[str, Union[int, str]]:
+    """
+    Returns query parameters of signed download URL of the file,
+    valid for 'download_url_ttl_seconds'.
+    :raises HTTPException: 501 if 'download_url_secret' isn't set
+    :rtype: Dict[str, Union[int, str]]
+    """
+    expires: int = int(time()) + settings.download_url_ttl_seconds
+
+    return {
+        'oid': file_db.oid,
+        'size': file_db.file_size_bytes,
+        'owner': file_db.owner_id,
+        'expires': expires,
+        'signature': _signature(
+            _secret(settings), file_db.oid, file_db.file_size_bytes, file_db.owner_id, expires
+        )
+    }
+
+
+def verify_download(oid: int, size: int, owner: str, expires: int, signature: str, settings: Settings) -> None:
+    """
+    Checks that parameters of download URL were signed by this application and didn't expire yet.
+    :raises InvalidDownloadUrlError: signature doesn't match or URL expired
+    :raises HTTPException: 501 if 'download_url_secret' isn't set
+    """
+    expected: str = _signature(_secret(settings), oid, size, owner, expires)
+
+    if not hmac.compare_digest(expected.encode('ascii'), signature.encode('utf-8')) or expires <= time():
+        raise InvalidDownloadUrlError()
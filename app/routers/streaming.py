@@ -0,0 +1,256 @@
+import json
+from secrets import token_hex
+from typing import Optional, List, Tuple, AsyncIterator, Dict, Any
+
+from fastapi.responses import StreamingResponse, FileResponse, Response
+
+from ..errors import RangeNotSatisfiableError
+from ..repositories.blob_storage import BlobStorage, StoredEncoding
+from ..schemas.enums import BlobCompression, ListingFormat
+
+ByteRange = Tuple[int, int]
+"""Inclusive (first byte, last byte) positions"""
+
+_range_unit: str = 'bytes='
+_octet_stream: str = 'application/octet-stream'
+
+listing_media_types: Dict[ListingFormat, str] = {
+    ListingFormat.JSON: 'application/json',
+    ListingFormat.NDJSON: 'application/x-ndjson'
+}
+
+
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[List[ByteRange]]:
+    """
+    Parses 'Range' header into sorted list of non overlapping byte ranges.
+    Malformed header is ignored (as RFC 7233 demands) - whole file should be sent then.
+    :param range_header: value of 'Range' header
+    :param file_size: size of requested file
+    :return: list of byte ranges or None if whole file should be sent
+    :raises RangeNotSatisfiableError: none of requested ranges overlaps the file
+    """
+    if not range_header or not range_header.strip().lower().startswith(_range_unit):
+        return None
+
+    ranges: List[ByteRange] = []
+
+    for spec in range_header.strip()[len(_range_unit):].split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+
+        first, separator, last = (part.strip() for part in spec.partition('-'))
+
+        if not separator or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+
+        if not first:
+            # suffix range - last N bytes of the file
+            if not last:
+                return None
+            if int(last) > 0 and file_size > 0:
+                ranges.append((max(file_size - int(last), 0), file_size - 1))
+            continue
+
+        start: int = int(first)
+
+        if last and int(last) < start:
+            return None
+        if start < file_size:
+            end: int = int(last) if last else file_size - 1
+            ranges.append((start, min(end, file_size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiableError(file_size)
+
+    # coalesce overlapping and adjacent ranges
+    ranges.sort()
+    merged: List[ByteRange] = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def accepts_encoding(accept_encoding: Optional[str], coding: str) -> bool:
+    """
+    Checks whether 'Accept-Encoding' header allows content coding, by name or with '*'.
+    :param accept_encoding: value of 'Accept-Encoding' header
+    :param coding: content coding, e.g. 'gzip'
+    :rtype: bool
+    """
+    qualities: Dict[str, float] = {}
+
+    for item in (accept_encoding or '').split(','):
+        name, _, parameters = item.partition(';')
+        quality: float = 1.0
+
+        for parameter in parameters.split(';'):
+            key, _, value = (part.strip() for part in parameter.partition('='))
+            if key.lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        if name.strip():
+            qualities[name.strip().lower()] = quality
+
+    return qualities.get(coding, qualities.get('*', 0.0)) > 0
+
+
+async def _stored_data_response(
+        stored: BlobStorage, loid: int, file_size: int, stored_encoding: StoredEncoding,
+        headers: Dict[str, str], chunk_size: int
+) -> Response:
+    """
+    Creates response that sends whole stored data of the blob, without decoding it.
+    """
+    stored_size: int = file_size
+    if stored_encoding.encoding != BlobCompression.IDENTITY:
+        headers['content-encoding'] = stored_encoding.encoding.value
+        stored_size = await stored.get_last_byte(loid)
+
+    local_path: Optional[str] = stored.local_path(loid)
+    if local_path is not None and not stored_encoding.header and not stored_encoding.trailer:
+        file_response: FileResponse = FileResponse(local_path, headers=headers, media_type=_octet_stream)
+        file_response.chunk_size = chunk_size
+        return file_response
+
+    async def _body() -> AsyncIterator[bytes]:
+        if stored_encoding.header:
+            yield stored_encoding.header
+        async for chunk in stored.iterate_blob(loid, 0, stored_size, chunk_size):
+            yield chunk
+        if stored_encoding.trailer:
+            yield stored_encoding.trailer
+
+    headers['content-length'] = str(len(stored_encoding.header) + stored_size + len(stored_encoding.trailer))
+    return StreamingResponse(
+        _body(),
+        status_code=200,
+        headers=headers,
+        media_type=_octet_stream
+    )
+
+
+async def blob_stream_response(
+        blob_repository: BlobStorage, loid: int, file_size: int,
+        range_header: Optional[str], chunk_size: int, accept_encoding: Optional[str] = None
+) -> Response:
+    """
+    Creates response that streams whole blob or requested ranges of it.
+    Blob is read slice by slice, so it is never buffered in memory as a whole.
+    Whole blob is sent as it is stored when it isn't encoded, or client accepts its encoding
+    (compressed blob isn't decompressed then) - kept in a local file, it's sent straight from that file.
+    :param blob_repository: storage used to read the blob
+    :param loid: oid of the blob
+    :param file_size: size of the blob in bytes
+    :param range_header: value of 'Range' header
+    :param chunk_size: size of a single slice read from storage
+    :param accept_encoding: value of 'Accept-Encoding' header
+    :return: 200, 206 or 206 multipart/byteranges response
+    :rtype: Response
+    """
+    ranges: Optional[List[ByteRange]] = parse_range_header(range_header, file_size)
+    headers: Dict[str, str] = {'accept-ranges': 'bytes'}
+    stored_encoding: Optional[StoredEncoding] = await blob_repository.fetch_encoding(loid)
+
+    if stored_encoding is None or stored_encoding.encoding != BlobCompression.IDENTITY:
+        headers['vary'] = 'accept-encoding'
+
+    if ranges is None and stored_encoding is not None and (
+            stored_encoding.encoding == BlobCompression.IDENTITY
+            or accepts_encoding(accept_encoding, stored_encoding.encoding.value)
+    ):
+        return await _stored_data_response(
+            blob_repository.stored, loid, file_size, stored_encoding, headers, chunk_size
+        )
+
+    if ranges is None:
+        headers['content-length'] = str(file_size)
+        return StreamingResponse(
+            blob_repository.iterate_blob(loid, 0, file_size, chunk_size),
+            status_code=200,
+            headers=headers,
+            media_type=_octet_stream
+        )
+
+    if len(ranges) == 1:
+        first, last = ranges[0]
+        headers['content-length'] = str(last - first + 1)
+        headers['content-range'] = f'bytes {first}-{last}/{file_size}'
+        return StreamingResponse(
+            blob_repository.iterate_blob(loid, first, last - first + 1, chunk_size),
+            status_code=206,
+            headers=headers,
+            media_type=_octet_stream
+        )
+
+    boundary: str = token_hex(16)
+    part_headers: List[bytes] = [
+        f'\r\n--{boundary}\r\n'
+        f'content-type: {_octet_stream}\r\n'
+        f'content-range: bytes {first}-{last}/{file_size}\r\n\r\n'.encode('latin-1')
+        for first, last in ranges
+    ]
+    closing_boundary: bytes = f'\r\n--{boundary}--\r\n'.encode('latin-1')
+
+    headers['content-length'] = str(
+        sum(len(part_header) + last - first + 1
+            for part_header, (first, last) in zip(part_headers, ranges))
+        + len(closing_boundary)
+    )
+
+    async def _multipart_body() -> AsyncIterator[bytes]:
+        for part_header, (first, last) in zip(part_headers, ranges):
+            yield part_header
+            async for chunk in blob_repository.iterate_blob(
+                    loid, first, last - first + 1, chunk_size
+            ):
+                yield chunk
+        yield closing_boundary
+
+    return StreamingResponse(
+        _multipart_body(),
+        status_code=206,
+        headers=headers,
+        media_type=f'multipart/byteranges; boundary={boundary}'
+    )
+
+
+async def encode_json_stream(
+        items: AsyncIterator[Any], listing_format: ListingFormat, chunk_size: int
+) -> AsyncIterator[bytes]:
+    """
+    Encodes items as they arrive, as JSON array or newline delimited JSON.
+    Encoded items are collected into chunks of about chunk_size bytes, so each of them isn't sent separately.
+    :param items: items that json module can encode
+    :param listing_format: 'json' (array) or 'ndjson' (one item per line)
+    :param chunk_size: number of bytes collected before they are sent
+    :rtype: AsyncIterator[bytes]
+    """
+    is_array: bool = listing_format == ListingFormat.JSON
+    buffer: bytearray = bytearray()
+    is_first: bool = True
+
+    async for item in items:
+        if is_array:
+            buffer += b'[' if is_first else b','
+        buffer += json.dumps(item).encode('utf-8')
+        if not is_array:
+            buffer += b'\n'
+        is_first = False
+
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+
+    if is_array:
+        buffer += b'[]' if is_first else b']'
+    if buffer:
+        yield bytes(buffer)
@@ -27,7 +27,7 @@ async def sign_up(
     :type user: UserSignUp
     :returns: 201 - account created
     """
-    user_info: UserInfo = client.register_user(user, settings.standard_user_roles)
+    user_info: UserInfo = await client.register_user(user, settings.standard_user_roles)
 
     logger.info(f"Account: '{user_info.email}' created successfully.")
 
@@ -57,7 +57,7 @@ async def sign_in(
     :return: access token
     :rtype: Token
     """
-    token: Token = client.login_user(
+    token: Token = await client.login_user(
         email=auth_form.username,
         password=auth_form.password
     )
@@ -1,21 +1,217 @@
-from hashlib import md5
+import asyncio
+import hashlib
+import hmac
+from collections import OrderedDict
+from typing import Any, Optional, List, AsyncIterator
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 
 from app.core import Settings
-from app.repositories.blob_repository import BlobRepository
+from app.errors import ChunkTooBigError
+from app.repositories.blob_storage import BlobStorage
+from app.schemas.enums import ChecksumAlgorithm
+from app.schemas.files import UploadChecksum, content_hash_algorithms
+
+
+offset_octet_stream: str = 'application/offset+octet-stream'
+"""Content type of chunks sent as raw request body"""
+
+
+def content_hash(algorithm: ChecksumAlgorithm, checksum: str) -> Optional[str]:
+    """
+    Returns key that identifies file content in blobs table: '<algorithm>:<hex digest>'.
+    :return: key, None if checksum is unknown or algorithm is too weak to identify content
+    :rtype: Optional[str]
+    """
+    if not checksum or algorithm not in content_hash_algorithms:
+        return None
+    return f'{algorithm.value}:{checksum}'
+
+
+def content_length(request: Request) -> int:
+    return int(request.headers.get('content-length') or 0)
+
+
+async def stream_chunk(request: Request, max_chunk_size: int, buffer_size: int) -> AsyncIterator[bytes]:
+    """
+    Yields chunk sent as raw request body with 'Content-Type: application/offset+octet-stream'
+    in pieces of buffer_size bytes, as it arrives. Request without body gives empty chunk.
+    Chunk declared bigger than max_chunk_size is rejected before its body is read.
+    :raises ChunkTooBigError: chunk is bigger than max_chunk_size
+    :rtype: AsyncIterator[bytes]
+    """
+    if content_length(request) > max_chunk_size:
+        raise ChunkTooBigError()
+
+    content_type: str = request.headers.get('content-type', '').partition(';')[0].strip().lower()
+    if content_type != offset_octet_stream:
+        if content_length(request):
+            raise HTTPException(status_code=415, detail=f"Chunk must be sent as '{offset_octet_stream}'.")
+        return
+
+    received: int = 0
+    buffer: bytearray = bytearray()
+    async for data in request.stream():
+        received += len(data)
+        # body without Content-Length is checked while it's read
+        if received > max_chunk_size:
+            raise ChunkTooBigError()
+
+        buffer += data
+        if len(buffer) >= buffer_size:
+            yield bytes(buffer)
+            buffer.clear()
+
+    if buffer:
+        yield bytes(buffer)
+
+
+async def read_chunk(request: Request, max_chunk_size: int) -> bytes:
+    """
+    Reads whole chunk sent as raw request body, see stream_chunk.
+    :rtype: bytes
+    """
+    return b''.join([piece async for piece in stream_chunk(request, max_chunk_size, max_chunk_size)])
+
+
+async def iterate_chunk(chunk: bytes) -> AsyncIterator[bytes]:
+    """
+    Yields chunk that was already read, so it can be written like streamed one.
+    """
+    yield chunk
+
+
+def _digest(algorithm: ChecksumAlgorithm, data: bytes) -> bytes:
+    return hashlib.new(algorithm.value, data).digest()
+
+
+async def is_chunk_checksum_valid(chunk: bytes, checksum: UploadChecksum) -> bool:
+    """
+    Compares checksum of the chunk with the one declared by client.
+    Hashing is done in threadpool, so big chunks don't block the event loop.
+    """
+    digest: bytes = await run_in_threadpool(_digest, checksum.algorithm, chunk)
+    return hmac.compare_digest(digest, checksum.raw_digest)
+
+
+class ChunkHash:
+    """
+    Checksum of a chunk calculated piece by piece while it's written,
+    compared with the one declared by client once whole chunk is received.
+    """
+
+    def __init__(self, checksum: Optional[UploadChecksum]) -> None:
+        self._checksum: Optional[UploadChecksum] = checksum
+        self._hash: Any = hashlib.new(checksum.algorithm.value) if checksum else None
+
+    async def update(self, piece: bytes) -> None:
+        if self._hash is not None:
+            await run_in_threadpool(self._hash.update, piece)
+
+    def is_valid(self) -> bool:
+        if self._checksum is None:
+            return True
+        return hmac.compare_digest(self._hash.digest(), self._checksum.raw_digest)
+
+
+async def calculate_checksum(algorithm: ChecksumAlgorithm, data: bytes) -> str:
+    """
+    Returns hex encoded checksum of data, calculated in threadpool.
+    """
+    return (await run_in_threadpool(_digest, algorithm, data)).hex()
+
+
+def combine_checksums(algorithm: ChecksumAlgorithm, hexdigests: List[str]) -> str:
+    """
+    Returns checksum of a file concatenated from parts:
+    digest of concatenated raw digests of the parts, suffixed with number of parts.
+    """
+    digest: str = hashlib.new(
+        algorithm.value, b''.join(bytes.fromhex(hexdigest) for hexdigest in hexdigests)
+    ).hexdigest()
+    return f'{digest}-{len(hexdigests)}'
+
+
+class _UploadHash:
+    __slots__ = ('hash', 'offset', 'lock')
+
+    def __init__(self, algorithm: ChecksumAlgorithm) -> None:
+        self.hash: Any = hashlib.new(algorithm.value)
+        self.offset: int = 0
+        self.lock: asyncio.Lock = asyncio.Lock()
+
+
+class UploadHashes:
+    """
+    | Keeps incremental hashes of uploads handled by this process, keyed by upload location,
+    | so checksum of the whole file is ready when upload is confirmed.
+    | Hash objects can't be serialized, so they live next to UploadCacheData instead of inside it.
+    | Bytes which weren't hashed here (e.g. chunks handled by other worker)
+    | are read from the blob during confirmation.
+    | Confirmation is O(1) only when all chunks of an upload reach the same worker process.
+    | With several workers and no sticky routing, hash is resumed from the first chunk
+    | that reached other worker - sharing hash state between workers is out of scope,
+    | hashlib can't serialize it.
+    """
+
+    max_tracked_uploads: int = 10000
+
+    def __init__(self) -> None:
+        self._hashes: 'OrderedDict[str, _UploadHash]' = OrderedDict()
+
+    async def update(
+            self, location: str, algorithm: ChecksumAlgorithm, offset: int, chunk: bytes
+    ) -> None:
+        """
+        Feeds chunk written at offset into hash of the upload.
+        Chunk is ignored if it doesn't directly follow already hashed bytes.
+        """
+        upload_hash: Optional[_UploadHash] = self._hashes.get(location)
+
+        if upload_hash is None:
+            if offset != 0:
+                return
+            upload_hash = self._hashes[location] = _UploadHash(algorithm)
+            while len(self._hashes) > self.max_tracked_uploads:
+                self._hashes.popitem(last=False)
+
+        async with upload_hash.lock:
+            if offset < upload_hash.offset:
+                # already hashed bytes were overwritten
+                self.discard(location)
+                return
+            if offset > upload_hash.offset:
+                return
+
+            await run_in_threadpool(upload_hash.hash.update, chunk)
+            upload_hash.offset += len(chunk)
+
+    async def hexdigest(
+            self, location: str, algorithm: ChecksumAlgorithm, loid: int, file_size: int,
+            blob_repository: BlobStorage, settings: Settings
+    ) -> str:
+        """
+        Returns checksum of the whole upload and stops tracking it.
+        Only bytes that weren't hashed during upload are read from the blob.
+        """
+        upload_hash: Optional[_UploadHash] = self._hashes.pop(location, None)
+
+        if upload_hash is None or upload_hash.offset > file_size:
+            upload_hash = _UploadHash(algorithm)
 
+        async for chunk in blob_repository.iterate_blob(
+                loid, upload_hash.offset, file_size - upload_hash.offset,
+                settings.stream_chunk_size
+        ):
+            await run_in_threadpool(upload_hash.hash.update, chunk)
 
-async def calculate_hash(
-        loid: int, blob_repository: BlobRepository, settings: Settings
-) -> str:
-    md5_hash = md5()
-    block_size: int = settings.max_chunk_size
-    offset: int = 0
+        hexdigest: str = upload_hash.hash.hexdigest()
+        return hexdigest
 
-    chunk: bytes = await blob_repository.read_from_blob(loid, offset, block_size)
+    def discard(self, location: str) -> None:
+        self._hashes.pop(location, None)
 
-    while chunk:
-        md5_hash.update(chunk)
-        offset += len(chunk)
-        chunk = await blob_repository.read_from_blob(loid, offset, block_size)
 
-    return md5_hash.hexdigest()
+upload_hashes: UploadHashes = UploadHashes()
+"""Incremental hashes of uploads handled by this process"""
@@ -19,3 +19,57 @@ class TwoFactorDelivery(str, Enum):
 
 class GrantType(str, Enum):
     Password = 'PASSWORD'
+
+
+class ChecksumAlgorithm(str, Enum):
+    MD5 = 'md5'
+    """Default algorithm, kept for compatibility with existing checksums"""
+
+    SHA1 = 'sha1'
+    """Required by tus checksum extension"""
+
+    SHA256 = 'sha256'
+
+    BLAKE2B = 'blake2b'
+
+
+class TokenVerification(str, Enum):
+    REMOTE = 'remote'
+    """Every access token is exchanged for user info at identity provider"""
+
+    LOCAL = 'local'
+    """Access token signature is verified locally, user info is cached"""
+
+
+class UploadConcat(str, Enum):
+    PARTIAL = 'partial'
+    """Upload is a part of a file, it's concatenated with other parts instead of being confirmed"""
+    FINAL = 'final'
+    """Upload is created by concatenation of partial uploads"""
+
+
+class BlobStorageType(str, Enum):
+    POSTGRES = 'postgres'
+    """Blobs are stored as postgres large objects"""
+
+    FILESYSTEM = 'filesystem'
+    """Blobs are stored as files in local (or mounted) directory"""
+
+
+class BlobCompression(str, Enum):
+    IDENTITY = 'identity'
+    """Blobs are stored as they are"""
+
+    GZIP = 'gzip'
+    """Frames are compressed with zlib (deflate), blob is sent to clients as a single gzip stream"""
+
+    ZSTD = 'zstd'
+    """Frames are compressed with zstandard (requires 'zstandard' package), each one is a zstd frame"""
+
+
+class ListingFormat(str, Enum):
+    JSON = 'json'
+    """JSON array"""
+
+    NDJSON = 'ndjson'
+    """Newline delimited JSON, one item per line"""
@@ -1,11 +1,26 @@
 from __future__ import annotations
 
+import binascii
+import json
+from base64 import b64decode
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, FrozenSet
 
 from fastapi import Header
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, validator, root_validator
+
+from app.schemas.enums import ChecksumAlgorithm, UploadConcat
+
+content_hash_algorithms: FrozenSet[ChecksumAlgorithm] = frozenset({ChecksumAlgorithm.SHA256, ChecksumAlgorithm.BLAKE2B})
+"""Algorithms strong enough to identify content - files with equal checksums share one blob"""
+
+
+def _must_contain_at_least_one_directory(v: Path) -> Path:
+    path_parts: List[str] = str(v).split('/')
+    if len(path_parts) < 2:
+        raise ValueError('Each file must be put in at least one directory.')
+    return v
 
 
 class FileBase(BaseModel):
@@ -28,24 +43,199 @@ class FileRead(FileBase):
     checksum: Optional[str] = None
 
 
+class DirectoryRead(BaseModel):
+    path: str
+    file_count: int
+    """Number of files in the directory and its subdirectories"""
+    total_size_bytes: int
+    """Size of files in the directory and its subdirectories"""
+
+    class Config:
+        orm_mode = True
+
+
+class DirectoryListing(BaseModel):
+    directories: List[DirectoryRead]
+    """Immediate subdirectories"""
+    files: List[FileRead]
+    """Files placed directly in the directory"""
+
+
+class BatchDelete(BaseModel):
+    file_paths: List[str] = []
+    directory: Optional[str] = None
+    """All files in the directory and its subdirectories are deleted"""
+
+    @validator('directory')
+    def directory_must_not_be_root(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None:
+            v = v.rstrip('/')
+            if not v:
+                raise ValueError('Directory must not be empty.')
+        return v
+
+    @root_validator(skip_on_failure=True)
+    def must_select_files(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        if not values['file_paths'] and values['directory'] is None:
+            raise ValueError('File paths or directory must be given.')
+        return values
+
+
+class FileDeleteResult(BaseModel):
+    file_path: str
+    status_code: int
+    """200 - file was deleted, 404 - user has no file with this path"""
+
+
+class SignedDownloadUrl(BaseModel):
+    url: str
+    """Downloads the file without access token"""
+    expires_at: datetime
+
+
+class BlockSignature(BaseModel):
+    weak: int
+    strong: str
+
+
+class FileSignatures(BaseModel):
+    version: str
+    file_size: int
+    block_size: int
+    blocks: List[BlockSignature]
+
+
 class UploadCacheData(BaseModel):
     owner_id: str
     loid: int
     file_path: str
+    checksum_algorithm: ChecksumAlgorithm = ChecksumAlgorithm.MD5
+    upload_offset: int = 0
+    is_partial: bool = False
+    upload_length: Optional[int] = None
     creation_time: datetime = datetime.utcnow()
 
     class Config:
         orm_values = True
 
+    def to_redis_hash(self) -> Dict[str, str]:
+        return {key: str(value) for key, value in json.loads(self.json(exclude_none=True)).items()}
+
+    @classmethod
+    def from_redis_hash(cls, redis_hash: Dict[bytes, bytes]) -> UploadCacheData:
+        return cls.parse_obj(
+            {key.decode('utf-8'): value.decode('utf-8') for key, value in redis_hash.items()}
+        )
+
 
 class UploadCreationHeaders(BaseModel):
+    upload_concat: Optional[UploadConcat] = None
+    file_path: Optional[Path] = None
+    checksum_algorithm: ChecksumAlgorithm = ChecksumAlgorithm.MD5
+    upload_length: Optional[int] = None
+    upload_checksum: Optional[UploadChecksum] = None
+    file_checksum: Optional[str] = None
+
+    @validator('upload_length')
+    def must_not_be_negative(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 0:
+            raise ValueError('Upload length must not be negative.')
+        return v
+
+    @validator('file_path', always=True)
+    def must_contain_at_least_one_directory(cls, v: Optional[Path], values: Dict[str, Any]) -> Optional[Path]:
+        if v is None:
+            # partial uploads get their path when they are concatenated
+            if values.get('upload_concat') != UploadConcat.PARTIAL:
+                raise ValueError('File path is required.')
+            return v
+        return _must_contain_at_least_one_directory(v)
+
+    @validator('file_checksum')
+    def must_identify_content(cls, v: Optional[str], values: Dict[str, Any]) -> Optional[str]:
+        if v is None:
+            return v
+        if values.get('checksum_algorithm') not in content_hash_algorithms:
+            raise ValueError('File checksum can be used only with algorithms: '
+                             f"{', '.join(sorted(content_hash_algorithms))}.")
+        if values.get('upload_concat') == UploadConcat.PARTIAL:
+            raise ValueError('File checksum can not be used by partial uploads.')
+        if values.get('upload_length') is None:
+            raise ValueError('File checksum requires Upload-Length.')
+        try:
+            bytes.fromhex(v)
+        except ValueError:
+            raise ValueError('File checksum must be hex encoded.')
+        return v.lower()
+
+    @classmethod
+    def as_header(
+            cls,
+            file_path: Optional[Path] = Header(
+                None,
+                description='new file location, not used by partial uploads',
+                convert_underscores=True
+            ),
+            upload_checksum_algorithm: ChecksumAlgorithm = Header(
+                ChecksumAlgorithm.MD5,
+                description='Algorithm used to calculate checksum of the whole file.',
+                convert_underscores=True
+            ),
+            upload_concat: Optional[UploadConcat] = Header(
+                None,
+                description="'partial' - upload is a part of a file, "
+                            "parts are uploaded in parallel and concatenated afterwards.",
+                convert_underscores=True
+            ),
+            upload_length: Optional[int] = Header(
+                None,
+                description='Size of the whole upload in bytes. '
+                            'Upload sent whole with the creation request is stored right away.',
+                convert_underscores=True
+            ),
+            upload_checksum: Optional[str] = Header(
+                None,
+                description="Checksum of the chunk sent with the creation request: "
+                            "'<algorithm> <base64 encoded digest>'.",
+                convert_underscores=True
+            ),
+            file_checksum: Optional[str] = Header(
+                None,
+                description='Hex encoded checksum of the whole file (sha256 or blake2b). '
+                            'If the same content is already stored, file is created right away '
+                            'and no data has to be sent.',
+                convert_underscores=True
+            )
+    ) -> UploadCreationHeaders:
+        return cls(
+            file_path=file_path, checksum_algorithm=upload_checksum_algorithm, upload_concat=upload_concat,
+            upload_length=upload_length,
+            upload_checksum=UploadChecksum.from_header(upload_checksum) if upload_checksum else None,
+            file_checksum=file_checksum
+        )
+
+
+class ConcatenationHeaders(BaseModel):
     file_path: Path
+    upload_concat: UploadConcat
+    locations: List[str]
+
+    _must_contain_at_least_one_directory = validator('file_path', allow_reuse=True)(
+        _must_contain_at_least_one_directory
+    )
 
-    @validator('file_path')
-    def must_contain_at_least_one_directory(cls, v: Path) -> Path:
-        path_parts: List[str] = str(v).split('/')
-        if len(path_parts) < 2:
-            raise ValueError('Each file must be put in at least one directory.')
+    @validator('upload_concat')
+    def must_be_final_concatenation(cls, v: UploadConcat) -> UploadConcat:
+        if v != UploadConcat.FINAL:
+            raise ValueError("Upload-Concat must be: 'final;<location> <location> ...'.")
+        return v
+
+    @validator('locations')
+    def must_contain_distinct_locations(cls, v: List[str]) -> List[str]:
+        if not v:
+            raise ValueError('At least one partial upload must be concatenated.')
+        if len(set(v)) != len(v):
+            raise ValueError('Each partial upload can be concatenated only once.')
         return v
 
     @classmethod
@@ -55,13 +245,49 @@ class UploadCreationHeaders(BaseModel):
                 ...,
                 description='new file location',
                 convert_underscores=True
+            ),
+            upload_concat: str = Header(
+                ...,
+                description="'final;<location> <location> ...' - partial uploads to concatenate, in order.",
+                convert_underscores=True
             )
-    ) -> UploadCreationHeaders:
-        return cls(file_path=file_path)
+    ) -> ConcatenationHeaders:
+        concat_type, _, locations = upload_concat.partition(';')
+        return cls(file_path=file_path, upload_concat=concat_type.strip().lower(), locations=locations.split())
+
+
+class UploadChecksum(BaseModel):
+    algorithm: ChecksumAlgorithm
+    digest: str
+
+    @validator('digest')
+    def digest_must_be_base64_encoded(cls, v: str) -> str:
+        try:
+            b64decode(v, validate=True)
+        except binascii.Error:
+            raise ValueError('Checksum digest must be base64 encoded.')
+        return v
+
+    @property
+    def raw_digest(self) -> bytes:
+        return b64decode(self.digest)
+
+    @classmethod
+    def from_header(cls, header: str) -> UploadChecksum:
+        """
+        Parses 'Upload-Checksum' header: '<algorithm> <base64 encoded digest>'.
+        :rtype: UploadChecksum
+        """
+        algorithm, _, digest = header.strip().partition(' ')
+        return cls.parse_obj({'algorithm': algorithm.lower(), 'digest': digest.strip()})
+
+
+UploadCreationHeaders.update_forward_refs()
 
 
 class UploadFileHeaders(BaseModel):
     upload_offset: int
+    upload_checksum: Optional[UploadChecksum] = None
 
     class Config:
         orm_mode = True
@@ -73,6 +299,14 @@ class UploadFileHeaders(BaseModel):
                 ...,
                 description='Tells api at which point it should start writing data at.',
                 convert_underscores=True
+            ),
+            upload_checksum: Optional[str] = Header(
+                None,
+                description="Checksum of the chunk: '<algorithm> <base64 encoded digest>'.",
+                convert_underscores=True
             )
     ) -> UploadFileHeaders:
-        return cls(upload_offset=upload_offset)
+        return cls(
+            upload_offset=upload_offset,
+            upload_checksum=UploadChecksum.from_header(upload_checksum) if upload_checksum else None
+        )
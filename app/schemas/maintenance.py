@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+
+class BlobReapReport(BaseModel):
+    removed_blobs: int = 0
+    reclaimed_bytes: int = 0
+
+    def __add__(self, other: 'BlobReapReport') -> 'BlobReapReport':
+        return BlobReapReport(
+            removed_blobs=self.removed_blobs + other.removed_blobs,
+            reclaimed_bytes=self.reclaimed_bytes + other.reclaimed_bytes
+        )
@@ -0,0 +1,24 @@
+"""persistent large object size function
+
+Revision ID: 3f9c2e71a0d4
+Revises: b7027a79aecd
+Create Date: 2026-10-18 10:12:31.402114
+
+"""
+from alembic import op
+
+from app.repositories.queries.blob_queries import create_get_lo_size_function
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2e71a0d4'
+down_revision = 'b7027a79aecd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(create_get_lo_size_function)
+
+
+def downgrade():
+    op.execute('DROP FUNCTION IF EXISTS get_lo_size(OID)')
@@ -0,0 +1,24 @@
+"""large object concatenation function
+
+Revision ID: 8d41c6b2e5f7
+Revises: 3f9c2e71a0d4
+Create Date: 2026-10-18 14:03:52.718240
+
+"""
+from alembic import op
+
+from app.repositories.queries.blob_queries import create_lo_concat_function
+
+# revision identifiers, used by Alembic.
+revision = '8d41c6b2e5f7'
+down_revision = '3f9c2e71a0d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(create_lo_concat_function)
+
+
+def downgrade():
+    op.execute('DROP FUNCTION IF EXISTS lo_concat(OID, OID[], INTEGER)')
@@ -0,0 +1,48 @@
+"""directory aggregates
+
+Revision ID: a4d9e1f7c3b2
+Revises: e3a7b5c1d902
+Create Date: 2026-10-18 18:41:26.509833
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.repositories.queries.directory_queries import create_file_directory_function, \
+    create_update_directories_function, create_files_update_directories_function, \
+    create_files_update_directories_trigger, fill_directories
+
+# revision identifiers, used by Alembic.
+revision = 'a4d9e1f7c3b2'
+down_revision = 'e3a7b5c1d902'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(create_file_directory_function)
+    op.execute('CREATE INDEX files_by_directory ON files (owner_id, file_directory(file_path), file_path)')
+
+    op.create_table('directories',
+                    sa.Column('owner_id', sa.TEXT(), nullable=False),
+                    sa.Column('path', sa.TEXT(), nullable=False),
+                    sa.Column('parent_path', sa.TEXT(), nullable=True),
+                    sa.Column('file_count', sa.BigInteger(), nullable=False),
+                    sa.Column('total_size_bytes', sa.BigInteger(), nullable=False),
+                    sa.PrimaryKeyConstraint('owner_id', 'path')
+                    )
+    op.create_index('directories_by_parent', 'directories', ['owner_id', 'parent_path'])
+
+    op.execute(create_update_directories_function)
+    op.execute(create_files_update_directories_function)
+    op.execute(create_files_update_directories_trigger)
+    op.execute(fill_directories)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS files_update_directories ON files')
+    op.execute('DROP FUNCTION IF EXISTS files_update_directories()')
+    op.execute('DROP FUNCTION IF EXISTS update_directories(TEXT, TEXT, BIGINT, BIGINT)')
+    op.drop_table('directories')
+    op.drop_index('files_by_directory', table_name='files')
+    op.execute('DROP FUNCTION IF EXISTS file_directory(TEXT)')
@@ -0,0 +1,31 @@
+"""blob deletion queue
+
+Revision ID: b9e2d7a4c1f8
+Revises: f1b8c4d6a2e9
+Create Date: 2026-10-18 20:12:47.390516
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'b9e2d7a4c1f8'
+down_revision = 'f1b8c4d6a2e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blob_deletions',
+                    sa.Column('oid', postgresql.OID(), nullable=False),
+                    sa.Column('queued_at', postgresql.TIMESTAMP(timezone=True), server_default=sa.text('now()'),
+                              nullable=False),
+                    sa.PrimaryKeyConstraint('oid')
+                    )
+    op.create_index('blob_deletions_by_queued_at', 'blob_deletions', ['queued_at'])
+
+
+def downgrade():
+    op.drop_index('blob_deletions_by_queued_at', table_name='blob_deletions')
+    op.drop_table('blob_deletions')
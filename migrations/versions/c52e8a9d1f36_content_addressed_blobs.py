@@ -0,0 +1,36 @@
+"""content addressed blobs
+
+Revision ID: c52e8a9d1f36
+Revises: 8d41c6b2e5f7
+Create Date: 2026-10-18 15:12:07.384215
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c52e8a9d1f36'
+down_revision = '8d41c6b2e5f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blobs',
+                    sa.Column('oid', postgresql.OID(), nullable=False),
+                    sa.Column('content_hash', sa.TEXT(), nullable=True),
+                    sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+                    sa.Column('reference_count', sa.INTEGER(), nullable=False),
+                    sa.PrimaryKeyConstraint('oid'),
+                    sa.UniqueConstraint('content_hash', name='unique_blob_content')
+                    )
+    # existing files don't share blobs, their content is not known
+    op.execute(
+        'INSERT INTO blobs (oid, size_bytes, reference_count) '
+        'SELECT oid, MAX(file_size_bytes), COUNT(*) FROM files GROUP BY oid'
+    )
+
+
+def downgrade():
+    op.drop_table('blobs')
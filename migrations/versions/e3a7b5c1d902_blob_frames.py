@@ -0,0 +1,33 @@
+"""blob frames
+
+Revision ID: e3a7b5c1d902
+Revises: c52e8a9d1f36
+Create Date: 2026-10-18 19:40:21.592031
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'e3a7b5c1d902'
+down_revision = 'c52e8a9d1f36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blob_frames',
+                    sa.Column('oid', postgresql.OID(), nullable=False),
+                    sa.Column('logical_offset', sa.BigInteger(), nullable=False),
+                    sa.Column('logical_size', sa.BigInteger(), nullable=False),
+                    sa.Column('stored_offset', sa.BigInteger(), nullable=False),
+                    sa.Column('stored_size', sa.BigInteger(), nullable=False),
+                    sa.Column('compression', sa.TEXT(), nullable=False),
+                    sa.Column('content_crc', sa.BigInteger(), nullable=True),
+                    sa.PrimaryKeyConstraint('oid', 'logical_offset')
+                    )
+
+
+def downgrade():
+    op.drop_table('blob_frames')
@@ -0,0 +1,23 @@
+"""files oid index
+
+Revision ID: f1b8c4d6a2e9
+Revises: a4d9e1f7c3b2
+Create Date: 2026-10-18 19:27:03.154892
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'f1b8c4d6a2e9'
+down_revision = 'a4d9e1f7c3b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # files are looked up by blob when blobs are reaped or replaced
+    op.create_index('files_by_oid', 'files', ['oid'])
+
+
+def downgrade():
+    op.drop_index('files_by_oid', table_name='files')
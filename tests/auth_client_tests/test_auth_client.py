@@ -0,0 +1,138 @@
+import asyncio
+from typing import Dict, Any
+
+import httpx
+import pytest
+from assertpy import assert_that
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from prometheus_client import REGISTRY
+
+from app.auth_client.auth_client import AuthClient
+from app.core import Settings
+from app.errors import UserInfoNotFoundError, UserSignInError, AuthServiceUnavailableError
+
+settings: Settings = Settings.get()
+
+test_user_info: Dict[str, Any] = {
+    'email': 'test@domain.com',
+    'id': 'test-user-id',
+    'active': True,
+    'passwordLastUpdateInstant': '2021-01-01T00:00:00',
+    'usernameStatus': 'ACTIVE',
+    'twoFactorDelivery': 'None',
+    'verified': True,
+    'tenantId': 'test-tenant-id',
+    'passwordChangeRequired': False,
+    'insertInstant': 1609459200000,
+}
+
+
+class FakeIdentityProvider:
+    def __init__(self) -> None:
+        self.app: FastAPI = FastAPI()
+        self.in_flight: int = 0
+        self.max_in_flight: int = 0
+
+        @self.app.get('/api/user')
+        async def retrieve_user(authorization: str = Header(...)) -> JSONResponse:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+
+            if authorization != 'Bearer valid-token':
+                return JSONResponse(status_code=401, content={'message': 'Invalid token.'})
+            return JSONResponse(content={'user': test_user_info})
+
+        @self.app.post('/oauth2/token')
+        async def exchange_credentials() -> JSONResponse:
+            return JSONResponse(status_code=400, content={'error': 'invalid_grant'})
+
+
+def sample_value(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture(scope='function')
+def identity_provider() -> FakeIdentityProvider:
+    return FakeIdentityProvider()
+
+
+def create_client(identity_provider: FakeIdentityProvider, **overrides: Any) -> AuthClient:
+    return AuthClient(
+        settings.copy(update=overrides),
+        transport=httpx.ASGITransport(app=identity_provider.app)
+    )
+
+
+@pytest.mark.asyncio
+class TestAuthClient:
+    async def test_fetch_user_info(self, identity_provider: FakeIdentityProvider) -> None:
+        client: AuthClient = create_client(identity_provider)
+
+        user_info = await client.fetch_user_info('valid-token')
+        await client.close()
+
+        assert_that(user_info.id).is_equal_to(test_user_info['id'])
+
+    async def test_fetch_user_info__invalid_token(self, identity_provider: FakeIdentityProvider) -> None:
+        client: AuthClient = create_client(identity_provider)
+
+        with pytest.raises(UserInfoNotFoundError) as error:
+            await client.fetch_user_info('invalid-token')
+        await client.close()
+
+        assert_that(error.value.error_code).is_equal_to(401)
+        assert_that(error.value.error_message).is_equal_to({'message': 'Invalid token.'})
+
+    async def test_login_user__invalid_credentials(self, identity_provider: FakeIdentityProvider) -> None:
+        client: AuthClient = create_client(identity_provider)
+
+        with pytest.raises(UserSignInError):
+            await client.login_user('test@domain.com', 'password')
+        await client.close()
+
+    async def test_concurrent_requests_are_bounded(self, identity_provider: FakeIdentityProvider) -> None:
+        client: AuthClient = create_client(identity_provider, auth_max_connections=2)
+
+        await asyncio.gather(*[client.fetch_user_info('valid-token') for _ in range(6)])
+        await client.close()
+
+        assert_that(identity_provider.max_in_flight).is_equal_to(2)
+
+    async def test_identity_provider_unavailable(self) -> None:
+        client: AuthClient = AuthClient(
+            settings.copy(update={'auth_provider_url': 'http://127.0.0.1:1', 'auth_request_timeout_seconds': 1})
+        )
+
+        with pytest.raises(AuthServiceUnavailableError):
+            await client.fetch_user_info('valid-token')
+        await client.close()
+
+    async def test_requests_and_errors_are_counted(self, identity_provider: FakeIdentityProvider) -> None:
+        client: AuthClient = create_client(identity_provider)
+        requests_before: float = sample_value('auth_request_duration_seconds_count', endpoint='/api/user')
+        errors_before: float = sample_value('auth_request_errors_total', endpoint='/api/user', error='401')
+
+        await client.fetch_user_info('valid-token')
+        with pytest.raises(UserInfoNotFoundError):
+            await client.fetch_user_info('invalid-token')
+        await client.close()
+
+        assert_that(sample_value('auth_request_duration_seconds_count', endpoint='/api/user')) \
+            .is_equal_to(requests_before + 2)
+        assert_that(sample_value('auth_request_errors_total', endpoint='/api/user', error='401')) \
+            .is_equal_to(errors_before + 1)
+
+    async def test_requests_are_traced(
+            self, identity_provider: FakeIdentityProvider, span_exporter: InMemorySpanExporter
+    ) -> None:
+        client: AuthClient = create_client(identity_provider)
+
+        await client.fetch_user_info('valid-token')
+        await client.close()
+
+        assert_that([span.name for span in span_exporter.get_finished_spans()]) \
+            .contains('AuthClient.fetch_user_info')
@@ -0,0 +1,119 @@
+import json
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, List
+
+import jwt
+import pytest
+from assertpy import assert_that
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from app.auth_client.token_verifier import TokenVerifier
+from app.auth_client.user_info_cache import UserInfoCache
+from app.core import Settings
+from app.errors import UserInfoNotFoundError
+from app.schemas.enums import UsernameStatus, TwoFactorDelivery
+from app.schemas.users import UserInfo
+
+settings: Settings = Settings.get()
+
+private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+key_id: str = 'test-key-id'
+
+user_info: UserInfo = UserInfo(
+    email='test@domain.com',
+    id='test-user-id',
+    birthDate=date(2000, 1, 1),
+    active=True,
+    passwordLastUpdateInstant=datetime.now(),
+    usernameStatus=UsernameStatus.ACTIVE,
+    twoFactorDelivery=TwoFactorDelivery.NONE,
+    verified=True,
+    tenantId='test-tenant-id',
+    passwordChangeRequired=False,
+    insertInstant=datetime.now().timestamp()
+)
+
+
+class FakeAuthClient:
+    def __init__(self) -> None:
+        self.user_info_calls: int = 0
+        self.key_set_calls: int = 0
+
+    async def fetch_user_info(self, access_token: str) -> UserInfo:
+        self.user_info_calls += 1
+        return user_info
+
+    async def fetch_json_web_keys(self) -> Dict[str, Any]:
+        self.key_set_calls += 1
+        json_web_key: Dict[str, Any] = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+        json_web_key.update({'kid': key_id, 'alg': 'RS256', 'use': 'sig'})
+        return {'keys': [json_web_key]}
+
+
+def create_token(signing_key: Any = private_key, kid: str = key_id, **claims: Any) -> str:
+    payload: Dict[str, Any] = {
+        'sub': user_info.id,
+        'aud': settings.app_id.get_secret_value(),
+        'exp': datetime.utcnow() + timedelta(minutes=5),
+        **claims
+    }
+    return jwt.encode(payload, signing_key, algorithm='RS256', headers={'kid': kid})
+
+
+@pytest.fixture(scope='function')
+def cache() -> UserInfoCache:
+    return UserInfoCache(settings, TokenVerifier(settings))
+
+
+async def assert_rejected(cache: UserInfoCache, token: str, client: FakeAuthClient) -> None:
+    with pytest.raises(UserInfoNotFoundError):
+        await cache.fetch_user_info(token, client)
+
+
+@pytest.mark.asyncio
+class TestUserInfoCache:
+    async def test_user_info_is_cached(self, cache: UserInfoCache) -> None:
+        client: FakeAuthClient = FakeAuthClient()
+        token: str = create_token()
+
+        results: List[UserInfo] = [await cache.fetch_user_info(token, client) for _ in range(3)]
+
+        assert_that([result.id for result in results]).contains_only(user_info.id)
+        assert_that(client.user_info_calls).is_equal_to(1)
+        assert_that(client.key_set_calls).is_equal_to(1)
+
+    async def test_cached_entry_is_invalidated(self, cache: UserInfoCache) -> None:
+        client: FakeAuthClient = FakeAuthClient()
+        token: str = create_token()
+
+        await cache.fetch_user_info(token, client)
+        cache.invalidate(token)
+        await cache.fetch_user_info(token, client)
+
+        assert_that(client.user_info_calls).is_equal_to(2)
+
+    @pytest.mark.parametrize('claims', [
+        {'exp': datetime.utcnow() - timedelta(minutes=1)},
+        {'aud': 'other_app_id'},
+    ])
+    async def test_invalid_token_is_rejected(self, cache: UserInfoCache, claims: Dict[str, Any]) -> None:
+        client: FakeAuthClient = FakeAuthClient()
+
+        await assert_rejected(cache, create_token(**claims), client)
+        assert_that(client.user_info_calls).is_equal_to(0)
+
+    async def test_token_signed_with_other_key_is_rejected(self, cache: UserInfoCache) -> None:
+        client: FakeAuthClient = FakeAuthClient()
+        other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+        await assert_rejected(cache, create_token(signing_key=other_key), client)
+
+    async def test_unknown_key_id_refreshes_keys_at_most_once(self, cache: UserInfoCache) -> None:
+        client: FakeAuthClient = FakeAuthClient()
+        await cache.fetch_user_info(create_token(), client)
+
+        for _ in range(3):
+            await assert_rejected(cache, create_token(kid='unknown-key-id'), client)
+
+        assert_that(client.key_set_calls).is_equal_to(1)
@@ -4,6 +4,10 @@ import pytest
 from aredis import StrictRedis
 from assertpy import add_extension
 from databases import Database
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from sqlalchemy import create_engine
 from sqlalchemy.engine import Engine
@@ -55,3 +59,19 @@ async def db() -> AsyncGenerator[Database, None]:
     await db.connect()
     yield db
     await db.disconnect()
+
+
+@pytest.fixture(scope='session')
+def installed_span_exporter() -> InMemorySpanExporter:
+    # tracer provider can be installed once per process, spans of all tests are kept in memory
+    exporter: InMemorySpanExporter = InMemorySpanExporter()
+    provider: TracerProvider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    return exporter
+
+
+@pytest.fixture(scope='function')
+def span_exporter(installed_span_exporter: InMemorySpanExporter) -> InMemorySpanExporter:
+    installed_span_exporter.clear()
+    return installed_span_exporter
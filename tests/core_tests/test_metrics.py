@@ -0,0 +1,136 @@
+from typing import AsyncGenerator, List
+
+import pytest
+from aredis import StrictRedis
+from assertpy import assert_that
+from databases import Database
+from fastapi import FastAPI
+from httpx import AsyncClient, Response
+from prometheus_client import REGISTRY
+
+from app.auth_client import logged_user
+from app.core import create_app, get_db, get_redis, Settings
+from app.core.metrics import instrumented, instrument_database, InstrumentedRedis
+from app.schemas.users import UserInfo
+from ..utils.shared_mock_data import user_id_1
+
+settings: Settings = Settings.get()
+
+
+def sample_value(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.asyncio
+@pytest.fixture(scope='function')
+async def aclient(db: Database, redis: StrictRedis) -> AsyncGenerator[AsyncClient, None]:
+    app: FastAPI = create_app()
+
+    def _get_db() -> Database: return db
+
+    def _get_redis() -> StrictRedis: return redis
+
+    def _logged_user() -> UserInfo: return user_id_1
+
+    app.dependency_overrides[get_db] = _get_db
+    app.dependency_overrides[get_redis] = _get_redis
+    app.dependency_overrides[logged_user] = _logged_user
+
+    aclient: AsyncClient = AsyncClient(app=app, base_url='http://testserver')
+    yield aclient
+    await aclient.aclose()
+
+
+@instrumented
+class FakeRepository:
+    async def fetch(self) -> int:
+        return 1
+
+    async def _fetch_private(self) -> int:
+        return 2
+
+
+@pytest.mark.asyncio
+class TestMetricsEndpoint:
+    async def test__request_is_observed_with_route_template(self, aclient: AsyncClient, db: Database) -> None:
+        labels = {'method': 'GET', 'route': '/resumable/files/all', 'status': '204'}
+        before: float = sample_value('http_request_duration_seconds_count', **labels)
+
+        async with db.transaction(force_rollback=True):
+            await aclient.get('/resumable/files/all')
+            response: Response = await aclient.get('/metrics')
+
+        assert_that(response.status_code).is_equal_to(200)
+        assert_that(response.text).contains('http_request_duration_seconds_bucket')
+        assert_that(sample_value('http_request_duration_seconds_count', **labels)).is_equal_to(before + 1)
+
+    async def test__uploaded_chunk_is_observed(self, aclient: AsyncClient, db: Database) -> None:
+        chunk: bytes = b'0123456789' * 30
+        chunks_before: float = sample_value('upload_chunk_size_bytes_count')
+        chunk_bytes_before: float = sample_value('upload_chunk_size_bytes_sum')
+        received_before: float = sample_value('http_received_bytes_total', route='/resumable/files')
+
+        async with db.transaction(force_rollback=True):
+            response: Response = await aclient.post('/resumable/files', headers={'file-path': 'metrics/file'})
+            await aclient.patch(
+                '/resumable/files',
+                content=chunk,
+                params={'location': response.headers.get('location')},
+                headers={'upload-offset': '0', 'content-type': 'application/offset+octet-stream'}
+            )
+
+        assert_that(sample_value('upload_chunk_size_bytes_count')).is_equal_to(chunks_before + 1)
+        assert_that(sample_value('upload_chunk_size_bytes_sum')).is_equal_to(chunk_bytes_before + len(chunk))
+        assert_that(sample_value('http_received_bytes_total', route='/resumable/files')) \
+            .is_greater_than_or_equal_to(received_before + len(chunk))
+
+    async def test__unknown_route_is_not_observed(self, aclient: AsyncClient) -> None:
+        await aclient.get('/not-a-route')
+        response: Response = await aclient.get('/metrics')
+
+        assert_that(response.text).does_not_contain('route="/not-a-route"')
+
+
+@pytest.mark.asyncio
+class TestInstrumentation:
+    async def test__public_repository_methods_are_observed(self) -> None:
+        before: float = sample_value(
+            'repository_call_duration_seconds_count', repository='FakeRepository', method='fetch'
+        )
+
+        assert_that(await FakeRepository().fetch()).is_equal_to(1)
+        assert_that(await FakeRepository()._fetch_private()).is_equal_to(2)
+
+        assert_that(sample_value(
+            'repository_call_duration_seconds_count', repository='FakeRepository', method='fetch'
+        )).is_equal_to(before + 1)
+        assert_that(REGISTRY.get_sample_value(
+            'repository_call_duration_seconds_count', {'repository': 'FakeRepository', 'method': '_fetch_private'}
+        )).is_none()
+
+    async def test__redis_commands_and_pipelines_are_observed(self) -> None:
+        redis: InstrumentedRedis = InstrumentedRedis.from_url(settings.redis_dsn)
+        commands_before: float = sample_value('redis_command_duration_seconds_count', command='GET')
+        pipelines_before: float = sample_value('redis_command_duration_seconds_count', command='PIPELINE')
+
+        await redis.get('metrics:missing')
+        pipeline = await redis.pipeline()
+        await pipeline.get('metrics:missing')
+        await pipeline.execute()
+
+        assert_that(sample_value('redis_command_duration_seconds_count', command='GET')) \
+            .is_equal_to(commands_before + 1)
+        assert_that(sample_value('redis_command_duration_seconds_count', command='PIPELINE')) \
+            .is_equal_to(pipelines_before + 1)
+
+    async def test__database_pool_checkout_is_observed(self) -> None:
+        db: Database = Database(settings.postgres_dsn)
+        instrument_database(db)
+        before: float = sample_value('db_pool_checkout_duration_seconds_count')
+
+        await db.connect()
+        values: List[int] = [await db.fetch_val('SELECT 1') for _ in range(2)]
+        await db.disconnect()
+
+        assert_that(values).is_equal_to([1, 1])
+        assert_that(sample_value('db_pool_checkout_duration_seconds_count')).is_greater_than_or_equal_to(before + 2)
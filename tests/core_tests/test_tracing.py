@@ -0,0 +1,185 @@
+import json
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncGenerator, AsyncIterator, List, Dict, Optional
+
+import pytest
+from aredis import StrictRedis
+from assertpy import assert_that
+from databases import Database
+from fastapi import FastAPI
+from httpx import AsyncClient, Response
+from opentelemetry import propagate
+from opentelemetry.sdk.trace import TracerProvider, ReadableSpan
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from app.auth_client import logged_user
+from app.core import create_app, get_db, get_redis, Settings
+from app.core.metrics import InstrumentedRedis
+from app.core.tracing import traced, register_tracing, create_tracer_provider
+from app.schemas.users import UserInfo
+from ..utils.shared_mock_data import user_id_1
+
+settings: Settings = Settings.get()
+
+trace_id: str = '0af7651916cd43dd8448eb211c80319c'
+parent_span_id: str = 'b7ad6b7169203331'
+
+
+def find_span(spans: List[ReadableSpan], name: str) -> ReadableSpan:
+    matching: List[ReadableSpan] = [span for span in spans if span.name == name]
+    assert_that(matching).is_not_empty()
+    return matching[0]
+
+
+@pytest.mark.asyncio
+@pytest.fixture(scope='function')
+async def aclient(db: Database) -> AsyncGenerator[AsyncClient, None]:
+    app: FastAPI = create_app()
+    register_tracing(app)
+    redis: StrictRedis = InstrumentedRedis.from_url(settings.redis_dsn)
+
+    def _get_db() -> Database: return db
+
+    def _get_redis() -> StrictRedis: return redis
+
+    def _logged_user() -> UserInfo: return user_id_1
+
+    app.dependency_overrides[get_db] = _get_db
+    app.dependency_overrides[get_redis] = _get_redis
+    app.dependency_overrides[logged_user] = _logged_user
+
+    aclient: AsyncClient = AsyncClient(app=app, base_url='http://testserver')
+    yield aclient
+    await aclient.aclose()
+
+
+@traced
+class FakeStorage:
+    async def write_to_blob(self, loid: int, offset: int, data: bytes) -> int:
+        return len(data)
+
+    @asynccontextmanager
+    async def open_reader(self, loid: int, offset: int = 0) -> AsyncIterator[int]:
+        yield loid
+
+    async def _write_private(self) -> None:
+        ...
+
+
+@pytest.mark.asyncio
+class TestTracingMiddleware:
+    async def test__uploaded_chunk_is_traced(
+            self, aclient: AsyncClient, db: Database, span_exporter: InMemorySpanExporter
+    ) -> None:
+        chunk: bytes = b'0123456789' * 30
+
+        async with db.transaction(force_rollback=True):
+            response: Response = await aclient.post('/resumable/files', headers={'file-path': 'tracing/file'})
+            span_exporter.clear()
+            await aclient.patch(
+                '/resumable/files',
+                content=chunk,
+                params={'location': response.headers.get('location')},
+                headers={'upload-offset': '0', 'content-type': 'application/offset+octet-stream'}
+            )
+
+        spans: List[ReadableSpan] = list(span_exporter.get_finished_spans())
+        request: ReadableSpan = find_span(spans, 'PATCH /resumable/files')
+        session_lookup: ReadableSpan = find_span(spans, 'HGETALL')
+        blob_writers: List[ReadableSpan] = [span for span in spans if span.name.endswith('.open_writer')]
+        chunk_write: ReadableSpan = find_span(spans, 'LargeObjectWriter.write')
+
+        assert_that(request.parent).is_none()
+        assert_that(dict(request.attributes)).contains_entry(
+            {'http.route': '/resumable/files'}, {'http.status_code': 200}, {'blob.offset': 0},
+            {'chunk.size': len(chunk)}
+        )
+        assert_that(session_lookup.parent.span_id).is_equal_to(request.context.span_id)
+        assert_that(dict(session_lookup.attributes)).contains_entry({'db.system': 'redis'})
+        assert_that([writer.parent.span_id for writer in blob_writers]).contains(request.context.span_id)
+        for writer in blob_writers:
+            assert_that(dict(writer.attributes)).contains_entry(
+                {'blob.oid': request.attributes['blob.oid']}, {'blob.offset': 0}
+            )
+        assert_that(chunk_write.parent.span_id) \
+            .is_equal_to(find_span(spans, 'BlobRepository.open_writer').context.span_id)
+        assert_that(dict(chunk_write.attributes)).contains_entry({'chunk.size': len(chunk)})
+        assert_that({span.context.trace_id for span in spans}).is_length(1)
+
+    async def test__request_continues_trace_of_caller(
+            self, aclient: AsyncClient, span_exporter: InMemorySpanExporter
+    ) -> None:
+        await aclient.get(
+            '/resumable/files/directory', params={'path': 'missing'},
+            headers={'traceparent': f'00-{trace_id}-{parent_span_id}-01'}
+        )
+
+        request: ReadableSpan = find_span(
+            list(span_exporter.get_finished_spans()), 'GET /resumable/files/directory'
+        )
+
+        assert_that(format(request.context.trace_id, '032x')).is_equal_to(trace_id)
+        assert_that(format(request.parent.span_id, '016x')).is_equal_to(parent_span_id)
+
+
+@pytest.mark.asyncio
+class TestTraced:
+    async def test__public_methods_run_in_spans_with_blob_attributes(
+            self, span_exporter: InMemorySpanExporter
+    ) -> None:
+        storage: FakeStorage = FakeStorage()
+
+        assert_that(await storage.write_to_blob(7, offset=10, data=b'abc')).is_equal_to(3)
+        async with storage.open_reader(8) as loid:
+            assert_that(loid).is_equal_to(8)
+        await storage._write_private()
+
+        spans: Dict[str, ReadableSpan] = {span.name: span for span in span_exporter.get_finished_spans()}
+
+        assert_that(spans).is_length(2)
+        assert_that(dict(spans['FakeStorage.write_to_blob'].attributes)).is_equal_to(
+            {'blob.oid': 7, 'blob.offset': 10, 'chunk.size': 3}
+        )
+        assert_that(dict(spans['FakeStorage.open_reader'].attributes)).is_equal_to(
+            {'blob.oid': 8, 'blob.offset': 0}
+        )
+
+
+class TestTracerProvider:
+    @staticmethod
+    def create_provider(tmp_path: Path, sample_ratio: float) -> TracerProvider:
+        return create_tracer_provider(settings.copy(update={
+            'tracing_sample_ratio': sample_ratio, 'tracing_file_path': str(tmp_path / 'traces.jsonl')
+        }))
+
+    def test__spans_are_appended_to_file(self, tmp_path: Path) -> None:
+        provider: TracerProvider = self.create_provider(tmp_path, 1.0)
+
+        with provider.get_tracer('test').start_as_current_span('first'):
+            pass
+        with provider.get_tracer('test').start_as_current_span('second'):
+            pass
+        provider.shutdown()
+
+        lines: List[str] = (tmp_path / 'traces.jsonl').read_text().splitlines()
+
+        assert_that([json.loads(line)['name'] for line in lines]).is_equal_to(['first', 'second'])
+
+    def test__new_traces_are_sampled_with_ratio(self, tmp_path: Path) -> None:
+        provider: TracerProvider = self.create_provider(tmp_path, 0.0)
+        exporter: InMemorySpanExporter = InMemorySpanExporter()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+
+        with provider.get_tracer('test').start_as_current_span('new trace'):
+            pass
+        with provider.get_tracer('test').start_as_current_span(
+                'sampled by caller', context=propagate.extract({'traceparent': f'00-{trace_id}-{parent_span_id}-01'})
+        ):
+            pass
+        provider.shutdown()
+
+        names: List[Optional[str]] = [span.name for span in exporter.get_finished_spans()]
+
+        assert_that(names).is_equal_to(['sampled by caller'])
@@ -0,0 +1,47 @@
+from time import sleep
+
+from assertpy import assert_that
+
+from app.core.ttl_cache import TTLCache
+
+
+class TestTTLCache:
+    def test_returns_stored_value(self) -> None:
+        cache: TTLCache[str, int] = TTLCache(max_size=10, ttl_seconds=60)
+        cache.set('key', 1)
+
+        assert_that(cache.get('key')).is_equal_to(1)
+        assert_that(cache.get('missing')).is_none()
+
+    def test_expired_entry_is_not_returned(self) -> None:
+        cache: TTLCache[str, int] = TTLCache(max_size=10, ttl_seconds=60)
+        cache.set('key', 1, ttl_seconds=0.01)
+        sleep(0.02)
+
+        assert_that(cache.get('key')).is_none()
+        assert_that(len(cache)).is_equal_to(0)
+
+    def test_least_recently_used_entry_is_evicted(self) -> None:
+        cache: TTLCache[str, int] = TTLCache(max_size=2, ttl_seconds=60)
+        cache.set('first', 1)
+        cache.set('second', 2)
+        cache.get('first')
+        cache.set('third', 3)
+
+        assert_that(cache.get('second')).is_none()
+        assert_that(cache.get('first')).is_equal_to(1)
+        assert_that(cache.get('third')).is_equal_to(3)
+
+    def test_disabled_cache_stores_nothing(self) -> None:
+        cache: TTLCache[str, int] = TTLCache(max_size=10, ttl_seconds=0)
+        cache.set('key', 1)
+
+        assert_that(cache.enabled).is_false()
+        assert_that(cache.get('key')).is_none()
+
+    def test_invalidate(self) -> None:
+        cache: TTLCache[str, int] = TTLCache(max_size=10, ttl_seconds=60)
+        cache.set('key', 1)
+        cache.invalidate('key')
+
+        assert_that(cache.get('key')).is_none()
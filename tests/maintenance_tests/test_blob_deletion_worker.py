@@ -0,0 +1,141 @@
+from typing import List, Optional, Iterable
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from assertpy import assert_that
+from databases import Database
+
+from app.core import Settings
+from app.core.database_schema import files_table
+from app.maintenance import BlobDeletionWorker
+from app.repositories.blob_deletion_queue import BlobDeletionQueue
+from app.repositories.blob_repository import BlobRepository
+from tests.utils.shared_mock_data import user_id_1
+
+settings: Settings = Settings.get().copy(update={'blob_deletion_rate': 0, 'blob_deletion_poll_seconds': 0})
+
+
+class FailingBlobRepository(BlobRepository):
+    async def remove_unreferenced_blobs(self, loids: Iterable[int]) -> List[int]:
+        raise ConnectionError('storage is unavailable')
+
+
+@pytest.fixture(scope='function')
+def blob_repository(db: Database) -> BlobRepository:
+    return BlobRepository.create(db)
+
+
+@pytest.fixture(scope='function')
+def blob_deletion_queue(db: Database) -> BlobDeletionQueue:
+    return BlobDeletionQueue.create(db)
+
+
+@pytest.fixture(scope='function')
+def worker(blob_repository: BlobRepository, blob_deletion_queue: BlobDeletionQueue) -> BlobDeletionWorker:
+    return BlobDeletionWorker(blob_repository, blob_deletion_queue, settings)
+
+
+async def create_blobs(blob_repository: BlobRepository, count: int) -> List[int]:
+    return [await blob_repository.create_blob() for _ in range(count)]
+
+
+async def fetch_existing_blobs(db: Database, loids: List[int]) -> List[int]:
+    return [mapping['oid'] for mapping in await db.fetch_all(
+        'SELECT oid FROM pg_largeobject_metadata WHERE oid = ANY(CAST(:loids AS OID[])) ORDER BY oid', {'loids': loids}
+    )]
+
+
+class TestBlobDeletionWorker:
+
+    @pytest.mark.asyncio
+    async def test__blobs_queued__all_removed_and_queue_emptied(
+            self, worker: BlobDeletionWorker, blob_repository: BlobRepository,
+            blob_deletion_queue: BlobDeletionQueue, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loids: List[int] = await create_blobs(blob_repository, 3)
+            await blob_deletion_queue.enqueue(loids)
+            await blob_deletion_queue.enqueue(loids[:1])
+
+            removed: int = await worker.drain()
+
+            assert_that(removed).is_equal_to(3)
+            assert_that(await fetch_existing_blobs(db, loids)).is_empty()
+            assert_that(await blob_deletion_queue.fetch_length()).is_zero()
+
+    @pytest.mark.asyncio
+    async def test__blob_referenced_again__blob_kept_and_dequeued(
+            self, worker: BlobDeletionWorker, blob_repository: BlobRepository,
+            blob_deletion_queue: BlobDeletionQueue, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loid, = await create_blobs(blob_repository, 1)
+            await blob_deletion_queue.enqueue([loid])
+            await db.execute(files_table.insert({
+                'oid': loid, 'owner_id': user_id_1.id, 'file_path': 'test_path/file', 'file_size_bytes': 0
+            }))
+
+            removed: Optional[int] = await worker.remove_next()
+
+            assert_that(removed).is_equal_to(loid)
+            assert_that(await fetch_existing_blobs(db, [loid])).is_equal_to([loid])
+            assert_that(await blob_deletion_queue.fetch_length()).is_zero()
+
+    @pytest.mark.asyncio
+    async def test__removal_fails__blob_stays_queued(
+            self, blob_repository: BlobRepository, blob_deletion_queue: BlobDeletionQueue, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loid, = await create_blobs(blob_repository, 1)
+            await blob_deletion_queue.enqueue([loid])
+            worker: BlobDeletionWorker = BlobDeletionWorker(FailingBlobRepository(db), blob_deletion_queue, settings)
+
+            with pytest.raises(ConnectionError):
+                await worker.remove_next()
+
+            assert_that(await blob_deletion_queue.fetch_length()).is_equal_to(1)
+
+    @pytest.mark.asyncio
+    async def test__blob_claimed_by_other_worker__next_blob_claimed(self) -> None:
+        first_db, second_db = Database(settings.postgres_dsn), Database(settings.postgres_dsn)
+        await first_db.connect()
+        await second_db.connect()
+
+        try:
+            await BlobDeletionQueue(first_db).enqueue([4000000001, 4000000002])
+
+            async with BlobDeletionQueue(first_db).claim() as first_loid:
+                async with BlobDeletionQueue(second_db).claim() as second_loid:
+                    async with BlobDeletionQueue(second_db).claim() as third_loid:
+                        pass
+
+            assert_that([first_loid, second_loid, third_loid]).is_equal_to([4000000001, 4000000002, None])
+        finally:
+            await first_db.execute('DELETE FROM blob_deletions WHERE oid IN (4000000001, 4000000002)')
+            await first_db.disconnect()
+            await second_db.disconnect()
+
+    @pytest.mark.asyncio
+    async def test__rate_limited__removals_spaced_evenly(
+            self, blob_deletion_queue: BlobDeletionQueue, blob_repository: BlobRepository,
+            db: Database, monkeypatch: MonkeyPatch
+    ) -> None:
+        delays: List[float] = []
+
+        async def _sleep(delay: float) -> None:
+            delays.append(delay)
+
+        monkeypatch.setattr('app.maintenance.blob_deletion_worker.asyncio.sleep', _sleep)
+        worker: BlobDeletionWorker = BlobDeletionWorker(
+            blob_repository, blob_deletion_queue, settings.copy(update={'blob_deletion_rate': 4})
+        )
+
+        async with db.transaction(force_rollback=True):
+            await blob_deletion_queue.enqueue(await create_blobs(blob_repository, 3))
+
+            await worker.drain()
+
+        # last wait finds queue empty
+        assert_that(delays).is_length(4)
+        for delay, expected in zip(delays, [0, 0.25, 0.5, 0.75]):
+            assert_that(delay).is_close_to(expected, 0.05)
@@ -0,0 +1,127 @@
+from secrets import token_urlsafe
+from typing import Set, List, Dict, Optional
+
+import pytest
+from aredis import StrictRedis
+from assertpy import assert_that
+from databases import Database
+
+from app.core import Settings
+from app.core.database_schema import files_table
+from app.maintenance import BlobReaper
+from app.repositories.blob_repository import BlobRepository
+from app.repositories.upload_sessions_repository import UploadSessionsRepository
+from app.schemas.files import UploadCacheData
+from app.schemas.maintenance import BlobReapReport
+from tests.utils.shared_mock_data import user_id_1
+
+settings: Settings = Settings.get().copy(
+    update={'blob_reaper_batch_size': 2, 'blob_reaper_batch_pause_seconds': 0}
+)
+
+blob_content: bytes = b'orphaned blob content'
+
+
+@pytest.fixture(scope='function')
+def blob_repository(db: Database) -> BlobRepository:
+    return BlobRepository.create(db)
+
+
+@pytest.fixture(scope='function')
+def upload_sessions_repository(redis: StrictRedis) -> UploadSessionsRepository:
+    return UploadSessionsRepository.create(redis, settings)
+
+
+@pytest.fixture(scope='function')
+def blob_reaper(
+        blob_repository: BlobRepository, upload_sessions_repository: UploadSessionsRepository
+) -> BlobReaper:
+    return BlobReaper(blob_repository, upload_sessions_repository, settings)
+
+
+async def create_blobs(blob_repository: BlobRepository, count: int) -> List[int]:
+    loids: List[int] = []
+    for _ in range(count):
+        loid: int = await blob_repository.create_blob()
+        await blob_repository.write_to_blob(loid, 0, blob_content)
+        loids.append(loid)
+    return loids
+
+
+class TestBlobReaper:
+
+    @pytest.mark.asyncio
+    async def test__orphans_referenced_and_live_blobs__only_orphans_removed(
+            self, blob_reaper: BlobReaper, blob_repository: BlobRepository,
+            upload_sessions_repository: UploadSessionsRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            orphans: List[int] = await create_blobs(blob_repository, 3)
+            referenced, live = await create_blobs(blob_repository, 2)
+
+            await db.execute(files_table.insert({
+                'oid': referenced, 'owner_id': user_id_1.id, 'file_path': 'test_path/reaper_file',
+                'file_size_bytes': len(blob_content)
+            }))
+            location: str = token_urlsafe(16)
+            await upload_sessions_repository.create_session(
+                location, UploadCacheData(owner_id=user_id_1.id, loid=live, file_path='test_path/reaper_upload')
+            )
+
+            found: Set[int] = await blob_reaper.find_orphans()
+            report: BlobReapReport = await blob_reaper.reap(found & set(orphans))
+            remaining: Dict[int, int] = await blob_repository.get_sizes(orphans + [referenced, live])
+
+            await upload_sessions_repository.delete_session(location, live)
+
+            assert_that(found).contains(*orphans).does_not_contain(referenced, live)
+            assert_that(report).is_equal_to(
+                BlobReapReport(removed_blobs=3, reclaimed_bytes=3 * len(blob_content))
+            )
+            assert_that(remaining).contains_only(referenced, live)
+
+    @pytest.mark.asyncio
+    async def test__dry_run__nothing_removed(
+            self, blob_reaper: BlobReaper, blob_repository: BlobRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            orphans: List[int] = await create_blobs(blob_repository, 2)
+
+            report: BlobReapReport = await blob_reaper.reap(set(orphans), dry_run=True)
+            remaining: Dict[int, int] = await blob_repository.get_sizes(orphans)
+
+            assert_that(report.removed_blobs).is_equal_to(2)
+            assert_that(remaining).contains_only(*orphans)
+
+    @pytest.mark.asyncio
+    async def test__run_once__orphans_removed(
+            self, blob_reaper: BlobReaper, blob_repository: BlobRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            orphans: List[int] = await create_blobs(blob_repository, 2)
+
+            report: Optional[BlobReapReport] = await blob_reaper.run_once(grace_seconds=0)
+            remaining: Dict[int, int] = await blob_repository.get_sizes(orphans)
+
+            assert_that(report.removed_blobs).is_greater_than_or_equal_to(2)
+            assert_that(remaining).is_empty()
+
+    @pytest.mark.asyncio
+    async def test__other_reaper_running__nothing_removed(
+            self, blob_reaper: BlobReaper, blob_repository: BlobRepository, db: Database
+    ) -> None:
+        other_worker_db: Database = Database(settings.postgres_dsn)
+        await other_worker_db.connect()
+
+        async with db.transaction(force_rollback=True):
+            orphans: List[int] = await create_blobs(blob_repository, 2)
+
+            async with BlobRepository(other_worker_db).advisory_lock(BlobReaper.advisory_lock_key) as acquired:
+                report: Optional[BlobReapReport] = await blob_reaper.run_once(grace_seconds=0)
+            remaining: Dict[int, int] = await blob_repository.get_sizes(orphans)
+
+        await other_worker_db.disconnect()
+
+        assert_that(acquired).is_true()
+        assert_that(report).is_none()
+        assert_that(remaining).contains_only(*orphans)
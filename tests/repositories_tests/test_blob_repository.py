@@ -1,4 +1,4 @@
-from typing import List, Tuple
+from typing import List, Tuple, Dict
 
 import pytest
 from assertpy import assert_that
@@ -86,6 +86,59 @@ class TestReadFromBlob:
             assert_that(result).is_equal_to(expected_result)
 
 
+class TestOpenWriter:
+
+    @pytest.mark.asyncio
+    async def test__data_written_sequentially__data_appended_at_offset(
+            self, blob_repository: BlobRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loid: int = await write_to_blob(blob_repository, b'0123456789')
+
+            async with blob_repository.open_writer(loid, offset=5) as writer:
+                for piece in [b'abc', b'def', b'gh']:
+                    await writer.write(piece)
+
+            result: bytes = await db.execute('SELECT lo_get(:loid)', {'loid': loid})
+
+            assert_that(result).is_equal_to(b'01234abcdefgh')
+
+    @pytest.mark.asyncio
+    async def test__block_fails__nothing_written(
+            self, blob_repository: BlobRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loid: int = await write_to_blob(blob_repository, b'0123456789')
+
+            with pytest.raises(ValueError):
+                async with blob_repository.open_writer(loid, offset=10) as writer:
+                    await writer.write(b'abc')
+                    raise ValueError()
+
+            result: bytes = await db.execute('SELECT lo_get(:loid)', {'loid': loid})
+
+            assert_that(result).is_equal_to(b'0123456789')
+
+
+class TestIterateBlob:
+    blob_content: bytes = test_blob_content.encode('utf-8')
+
+    @pytest.mark.parametrize('offset,length', [(0, 100), (3, 10), (20, 3)])
+    @pytest.mark.asyncio
+    async def test__range_requested__returns_slices_of_range(
+            self, blob_repository: BlobRepository, db: Database, offset: int, length: int
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loid: int = await write_to_blob(blob_repository, self.blob_content)
+
+            slices: List[bytes] = [
+                chunk async for chunk in blob_repository.iterate_blob(loid, offset, length, 4)
+            ]
+
+            assert_that(b''.join(slices)).is_equal_to(self.blob_content[offset:offset + length])
+            assert_that(max(len(chunk) for chunk in slices)).is_less_than_or_equal_to(4)
+
+
 class TestRemoveBlob:
 
     @pytest.mark.asyncio
@@ -124,3 +177,59 @@ class TestGetLastByte:
             result: int = await blob_repository.get_last_byte(loid=loid)
 
             assert_that(result).is_equal_to(expected_result)
+
+
+class TestGetSizes:
+
+    @pytest.mark.asyncio
+    async def test__blobs_exist__returns_size_of_each_blob(
+            self, blob_repository: BlobRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            blob_contents: List[bytes] = [
+                test_blob_content.encode('utf-8'),
+                test_blob_content[:10].encode('utf-8'),
+                b''
+            ]
+            expected_result: Dict[int, int] = {
+                await write_to_blob(blob_repository, content): len(content)
+                for content in blob_contents
+            }
+
+            result: Dict[int, int] = await blob_repository.get_sizes(expected_result.keys())
+
+            assert_that(result).is_equal_to(expected_result)
+
+    @pytest.mark.asyncio
+    async def test__blob_does_not_exist__blob_left_out(
+            self, blob_repository: BlobRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loid: int = await write_to_blob(blob_repository, test_blob_content.encode('utf-8'))
+            await blob_repository.remove_blob(loid)
+
+            result: Dict[int, int] = await blob_repository.get_sizes([loid])
+
+            assert_that(result).is_empty()
+
+
+class TestConcatenateBlobs:
+
+    @pytest.mark.asyncio
+    async def test__parts_exist__parts_appended_and_removed(
+            self, blob_repository: BlobRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            content: bytes = test_blob_content.encode('utf-8')
+            loids: List[int] = [
+                await write_to_blob(blob_repository, content[start:start + 7])
+                for start in range(0, len(content), 7)
+            ]
+
+            result: int = await blob_repository.concatenate_blobs(loids[0], loids[1:], slice_size=3)
+            blob: bytes = await blob_repository.read_from_blob(loids[0], 0, len(content))
+            remaining: Dict[int, int] = await blob_repository.get_sizes(loids)
+
+            assert_that(result).is_equal_to(len(content))
+            assert_that(blob).is_equal_to(content)
+            assert_that(remaining).contains_only(loids[0])
@@ -0,0 +1,243 @@
+import gzip
+import zlib
+from io import BytesIO
+from pathlib import Path
+from typing import List, Dict, Any, Mapping
+
+import pytest
+from assertpy import assert_that
+from databases import Database
+from faker import Faker
+from pytest_mock import MockerFixture
+
+from app.core.database_schema import blob_frames_table
+from app.repositories import compressed_blob_storage
+from app.repositories.blob_repository import BlobRepository
+from app.repositories.blob_storage import BlobStorage, StoredEncoding
+from app.repositories.compressed_blob_storage import CompressedBlobStorage, crc32_combine
+from app.repositories.file_system_blob_repository import FileSystemBlobRepository
+from app.schemas.enums import BlobCompression
+
+frame_size: int = 64
+
+faker: Faker = Faker('en_US')
+
+test_content: bytes = ' '.join(faker.sentences(20)).encode('utf-8')
+
+
+@pytest.fixture(scope='function', params=['postgres', 'filesystem'])
+def storage(request: Any, db: Database, tmp_path: Path) -> BlobStorage:
+    if request.param == 'filesystem':
+        return FileSystemBlobRepository(db, str(tmp_path))
+    return BlobRepository(db)
+
+
+@pytest.fixture(scope='function')
+def blob_repository(db: Database, storage: BlobStorage) -> CompressedBlobStorage:
+    return CompressedBlobStorage(db, storage, BlobCompression.GZIP, frame_size)
+
+
+async def write_in_chunks(blob_repository: BlobStorage, chunks: List[bytes]) -> int:
+    loid: int = await blob_repository.create_blob()
+    await blob_repository.write_to_blob(loid, 0, chunks[0])
+
+    offset: int = len(chunks[0])
+    for chunk in chunks[1:]:
+        async with blob_repository.open_writer(loid, offset) as writer:
+            await writer.write(chunk)
+        offset += len(chunk)
+
+    return loid
+
+
+async def read_encoded(blob_repository: CompressedBlobStorage, loid: int) -> bytes:
+    encoding: StoredEncoding = await blob_repository.fetch_encoding(loid)
+    stored_data: bytes = await blob_repository.stored.read_from_blob(loid, 0, 10 * len(test_content))
+    return encoding.header + stored_data + encoding.trailer
+
+
+async def fetch_frames(db: Database, loid: int) -> List[Dict[str, Any]]:
+    mappings: List[Mapping[str, Any]] = await db.fetch_all(
+        blob_frames_table.select(blob_frames_table.c.oid == loid).order_by(blob_frames_table.c.logical_offset)
+    )
+    return [dict(mapping) for mapping in mappings]
+
+
+class TestWriteAndRead:
+
+    @pytest.mark.asyncio
+    async def test__written_in_chunks__frames_compressed_and_content_read_back(
+            self, blob_repository: CompressedBlobStorage, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loid: int = await write_in_chunks(blob_repository, [test_content[:100], test_content[100:]])
+
+            frames: List[Dict[str, Any]] = await fetch_frames(db, loid)
+            stored_data: bytes = await blob_repository.stored.read_from_blob(loid, 0, 10 * len(test_content))
+
+            assert_that(await blob_repository.read_from_blob(loid, 0, len(test_content))).is_equal_to(test_content)
+            assert_that(await blob_repository.get_last_byte(loid)).is_equal_to(len(test_content))
+            assert_that([frame['logical_size'] for frame in frames[:3]]).is_equal_to([64, 36, 64])
+            assert_that(sum(frame['stored_size'] for frame in frames)).is_equal_to(len(stored_data))
+            assert_that(frames[-1]['content_crc']).is_equal_to(zlib.crc32(test_content))
+            assert_that(gzip.decompress(await read_encoded(blob_repository, loid))).is_equal_to(test_content)
+
+    @pytest.mark.parametrize('offset,length', [(0, 10), (60, 10), (130, 200), (len(test_content) - 5, 100)])
+    @pytest.mark.asyncio
+    async def test__range_read__only_touched_frames_decompressed(
+            self, blob_repository: CompressedBlobStorage, db: Database, mocker: MockerFixture,
+            offset: int, length: int
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loid: int = await write_in_chunks(blob_repository, [test_content])
+            decompress = mocker.spy(compressed_blob_storage, '_decompress')
+
+            result: bytes = await blob_repository.read_from_blob(loid, offset, length)
+
+            touched_frames: int = (min(offset + length, len(test_content)) - 1) // frame_size - offset // frame_size + 1
+            assert_that(result).is_equal_to(test_content[offset:offset + length])
+            assert_that(decompress.call_count).is_equal_to(touched_frames)
+
+    @pytest.mark.asyncio
+    async def test__read_sequentially_in_small_slices__each_frame_decompressed_once(
+            self, blob_repository: CompressedBlobStorage, db: Database, mocker: MockerFixture
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loid: int = await write_in_chunks(blob_repository, [test_content])
+            decompress = mocker.spy(compressed_blob_storage, '_decompress')
+
+            slices: List[bytes] = [
+                chunk async for chunk in blob_repository.iterate_blob(loid, 0, len(test_content), 10)
+            ]
+
+            assert_that(b''.join(slices)).is_equal_to(test_content)
+            assert_that(decompress.call_count).is_equal_to(-(-len(test_content) // frame_size))
+
+    @pytest.mark.asyncio
+    async def test__compression_disabled__blob_stored_as_it_is(
+            self, storage: BlobStorage, db: Database
+    ) -> None:
+        blob_repository: CompressedBlobStorage = CompressedBlobStorage(
+            db, storage, BlobCompression.IDENTITY, frame_size
+        )
+        async with db.transaction(force_rollback=True):
+            loid: int = await write_in_chunks(blob_repository, [test_content[:100], test_content[100:]])
+
+            assert_that(await fetch_frames(db, loid)).is_empty()
+            assert_that(await storage.read_from_blob(loid, 0, len(test_content))).is_equal_to(test_content)
+            assert_that(await blob_repository.fetch_encoding(loid)).is_equal_to(
+                StoredEncoding(BlobCompression.IDENTITY)
+            )
+
+    @pytest.mark.asyncio
+    async def test__zstd_compression__content_read_back(
+            self, storage: BlobStorage, db: Database
+    ) -> None:
+        zstandard = pytest.importorskip('zstandard')
+        blob_repository: CompressedBlobStorage = CompressedBlobStorage(db, storage, BlobCompression.ZSTD, frame_size)
+        async with db.transaction(force_rollback=True):
+            loid: int = await write_in_chunks(blob_repository, [test_content[:100], test_content[100:]])
+
+            stored_data: bytes = await storage.read_from_blob(loid, 0, 10 * len(test_content))
+
+            assert_that(await blob_repository.read_from_blob(loid, 50, 100)).is_equal_to(test_content[50:150])
+            assert_that(await blob_repository.fetch_encoding(loid)).is_equal_to(
+                StoredEncoding(BlobCompression.ZSTD)
+            )
+            assert_that(
+                zstandard.ZstdDecompressor().stream_reader(BytesIO(stored_data), read_across_frames=True).read()
+            ).is_equal_to(test_content)
+
+
+@pytest.mark.parametrize('first,second', [(b'', b''), (b'abc', b''), (b'', b'abc'), (test_content, b'x' * 1000)])
+def test__crc32_combined__equals_crc32_of_concatenation(first: bytes, second: bytes) -> None:
+    result: int = crc32_combine(zlib.crc32(first), zlib.crc32(second), len(second))
+
+    assert_that(result).is_equal_to(zlib.crc32(first + second))
+
+
+class TestOpenWriter:
+
+    @pytest.mark.asyncio
+    async def test__block_fails__frames_not_stored(
+            self, blob_repository: CompressedBlobStorage, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loid: int = await write_in_chunks(blob_repository, [test_content[:100]])
+
+            with pytest.raises(ValueError):
+                async with blob_repository.open_writer(loid, 100) as writer:
+                    await writer.write(test_content[100:300])
+                    raise ValueError()
+
+            assert_that(await blob_repository.get_last_byte(loid)).is_equal_to(100)
+            assert_that(await blob_repository.read_from_blob(loid, 0, 1000)).is_equal_to(test_content[:100])
+
+    @pytest.mark.asyncio
+    async def test__offset_is_not_end_of_blob__raises_error(
+            self, blob_repository: CompressedBlobStorage, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loid: int = await write_in_chunks(blob_repository, [test_content[:100]])
+
+            with pytest.raises(ValueError):
+                async with blob_repository.open_writer(loid, 50):
+                    pass
+
+
+class TestConcatenateBlobs:
+
+    @pytest.mark.asyncio
+    async def test__compressed_and_not_compressed_parts__content_read_back(
+            self, blob_repository: CompressedBlobStorage, storage: BlobStorage, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            first: int = await write_in_chunks(blob_repository, [test_content[:100]])
+            stored_as_is: int = await write_in_chunks(storage, [test_content[100:250]])
+            last: int = await write_in_chunks(blob_repository, [test_content[250:]])
+
+            file_size: int = await blob_repository.concatenate_blobs(first, [stored_as_is, last], 100)
+
+            assert_that(file_size).is_equal_to(len(test_content))
+            assert_that(await blob_repository.get_last_byte(first)).is_equal_to(len(test_content))
+            assert_that(await blob_repository.read_from_blob(first, 0, file_size)).is_equal_to(test_content)
+            assert_that(await blob_repository.read_from_blob(first, 90, 200)).is_equal_to(test_content[90:290])
+            assert_that(await blob_repository.fetch_encoding(first)).is_none()
+            assert_that(await fetch_frames(db, last)).is_empty()
+
+    @pytest.mark.asyncio
+    async def test__all_parts_compressed__blob_sent_as_single_gzip_stream(
+            self, blob_repository: CompressedBlobStorage, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loids: List[int] = [
+                await write_in_chunks(blob_repository, [part])
+                for part in [test_content[:100], test_content[100:250], test_content[250:]]
+            ]
+
+            await blob_repository.concatenate_blobs(loids[0], loids[1:], 100)
+
+            frames: List[Dict[str, Any]] = await fetch_frames(db, loids[0])
+            assert_that(frames[-1]['content_crc']).is_equal_to(zlib.crc32(test_content))
+            assert_that(gzip.decompress(await read_encoded(blob_repository, loids[0]))).is_equal_to(test_content)
+
+            async with blob_repository.open_writer(loids[0], len(test_content)) as writer:
+                await writer.write(b'appended')
+
+            assert_that(gzip.decompress(await read_encoded(blob_repository, loids[0]))) \
+                .is_equal_to(test_content + b'appended')
+
+
+class TestRemoveBlob:
+
+    @pytest.mark.asyncio
+    async def test__blob_compressed__frames_removed(
+            self, blob_repository: CompressedBlobStorage, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loid: int = await write_in_chunks(blob_repository, [test_content])
+
+            await blob_repository.remove_blob(loid)
+
+            assert_that(await fetch_frames(db, loid)).is_empty()
+            assert_that(await blob_repository.stored.get_sizes([loid])).is_empty()
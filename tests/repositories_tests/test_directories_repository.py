@@ -0,0 +1,113 @@
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+from assertpy import assert_that
+from databases import Database
+
+from app.core.database_schema import files_table
+from app.errors import DirectoryDoesNotExistError
+from app.repositories.directories_repository import DirectoriesRepository
+from app.schemas.files import DirectoryRead, DirectoryListing, FileRead
+from tests.utils.shared_mock_data import user_id_1, user_id_2, bytes_in_mb
+
+test_tree: List[Tuple[str, str, int]] = [
+    (user_id_1.id, 'photos/2020/a.jpg', 100),
+    (user_id_1.id, 'photos/2020/b.jpg', 200),
+    (user_id_1.id, 'photos/2021/c.jpg', 400),
+    (user_id_1.id, 'photos/d.jpg', 800),
+    (user_id_1.id, 'documents/e.pdf', 1600),
+    (user_id_2.id, 'photos/f.jpg', 3200)
+]
+
+
+@pytest.fixture(scope='function')
+def directories_repository(db: Database) -> DirectoriesRepository:
+    return DirectoriesRepository.create(db)
+
+
+async def insert_test_tree(db: Database) -> None:
+    for oid, (owner_id, file_path, file_size) in enumerate(test_tree, start=20000):
+        await db.execute(files_table.insert({
+            'oid': oid, 'owner_id': owner_id, 'file_path': file_path, 'file_size_bytes': file_size
+        }))
+
+
+class TestFetchDirectory:
+
+    @pytest.mark.parametrize('path,file_count,total_size', [
+        ('photos', 4, 1500), ('photos/2020', 2, 300), ('documents', 1, 1600)
+    ])
+    @pytest.mark.asyncio
+    async def test__directory_has_files__returns_recursive_aggregates(
+            self, directories_repository: DirectoriesRepository, db: Database,
+            path: str, file_count: int, total_size: int
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_tree(db)
+
+            result: DirectoryRead = await directories_repository.fetch_directory(user_id_1, path)
+
+            assert_that(result).is_equal_to(
+                DirectoryRead(path=path, file_count=file_count, total_size_bytes=total_size)
+            )
+
+    @pytest.mark.asyncio
+    async def test__files_resized_and_deleted__aggregates_updated(
+            self, directories_repository: DirectoriesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_tree(db)
+
+            await db.execute(files_table.update()
+                             .where(files_table.c.file_path == 'photos/2020/a.jpg')
+                             .values(file_size_bytes=150))
+            await db.execute(files_table.delete()
+                             .where(files_table.c.file_path == 'photos/2021/c.jpg'))
+
+            photos: DirectoryRead = await directories_repository.fetch_directory(user_id_1, 'photos')
+            assert_that(photos).is_equal_to(DirectoryRead(path='photos', file_count=3, total_size_bytes=1150))
+            with pytest.raises(DirectoryDoesNotExistError):
+                await directories_repository.fetch_directory(user_id_1, 'photos/2021')
+
+    @pytest.mark.asyncio
+    async def test__directory_of_other_user__raises_error(
+            self, directories_repository: DirectoriesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_tree(db)
+
+            with pytest.raises(DirectoryDoesNotExistError):
+                await directories_repository.fetch_directory(user_id_2, 'documents')
+
+
+class TestFetchChildren:
+
+    @pytest.mark.asyncio
+    async def test__directory_has_children__returns_subdirectories_and_files(
+            self, directories_repository: DirectoriesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_tree(db)
+
+            result: DirectoryListing = await directories_repository.fetch_children(user_id_1, 'photos')
+
+            assert_that(result).is_equal_to(DirectoryListing(
+                directories=[
+                    DirectoryRead(path='photos/2020', file_count=2, total_size_bytes=300),
+                    DirectoryRead(path='photos/2021', file_count=1, total_size_bytes=400)
+                ],
+                files=[FileRead(file_path=Path('photos/d.jpg'), file_size_mb=800 / bytes_in_mb)]
+            ))
+
+    @pytest.mark.asyncio
+    async def test__no_directory_given__returns_top_level_directories(
+            self, directories_repository: DirectoriesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_tree(db)
+
+            result: DirectoryListing = await directories_repository.fetch_children(user_id_1, None)
+
+            assert_that([directory.path for directory in result.directories]).is_equal_to(['documents', 'photos'])
+            assert_that(result.files).is_empty()
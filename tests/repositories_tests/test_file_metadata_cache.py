@@ -0,0 +1,63 @@
+from typing import AsyncGenerator, Optional
+
+import pytest
+from aredis import StrictRedis
+from assertpy import assert_that
+
+from app.core.ttl_cache import TTLCache
+from app.repositories.file_metadata_cache import FileMetadataCache
+from app.schemas.files import FileDb
+from tests.utils.shared_mock_data import test_files
+
+test_file: FileDb = test_files[0]
+
+
+@pytest.mark.asyncio
+@pytest.fixture(scope='function', params=['memory', 'redis'])
+async def cache(request: pytest.FixtureRequest, redis: StrictRedis) -> AsyncGenerator[FileMetadataCache, None]:
+    cache: FileMetadataCache = FileMetadataCache(TTLCache(10, 30), redis if request.param == 'redis' else None, 30)
+    yield cache
+    await cache.invalidate(test_file.owner_id, str(test_file.file_path))
+
+
+class TestFileMetadataCache:
+
+    @pytest.mark.asyncio
+    async def test__file_cached__returns_file(self, cache: FileMetadataCache) -> None:
+        await cache.set(test_file)
+        result: Optional[FileDb] = await cache.get(test_file.owner_id, str(test_file.file_path))
+
+        assert_that(result).is_equal_to(test_file)
+
+    @pytest.mark.asyncio
+    async def test__file_invalidated__returns_none(self, cache: FileMetadataCache) -> None:
+        await cache.set(test_file)
+        await cache.invalidate(test_file.owner_id, str(test_file.file_path))
+
+        assert_that(await cache.get(test_file.owner_id, str(test_file.file_path))).is_none()
+
+    @pytest.mark.asyncio
+    async def test__same_path_of_other_owner__returns_none(
+            self, cache: FileMetadataCache
+    ) -> None:
+        await cache.set(test_file)
+
+        assert_that(await cache.get('other_owner', str(test_file.file_path))).is_none()
+
+    @pytest.mark.asyncio
+    async def test__redis_cache__entry_expires_after_ttl(self, redis: StrictRedis) -> None:
+        cache: FileMetadataCache = FileMetadataCache(TTLCache(10, 30), redis, 30)
+
+        await cache.set(test_file)
+        ttl: int = await redis.ttl(cache._redis_key(test_file.owner_id, str(test_file.file_path)))
+        await cache.invalidate(test_file.owner_id, str(test_file.file_path))
+
+        assert_that(ttl).is_between(1, 30)
+
+    @pytest.mark.asyncio
+    async def test__ttl_is_zero__nothing_cached(self, redis: StrictRedis) -> None:
+        cache: FileMetadataCache = FileMetadataCache(TTLCache(10, 0), redis, 0)
+
+        await cache.set(test_file)
+
+        assert_that(await cache.get(test_file.owner_id, str(test_file.file_path))).is_none()
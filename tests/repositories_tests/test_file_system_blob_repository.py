@@ -0,0 +1,169 @@
+import os
+from pathlib import Path
+from typing import List, Dict
+
+import pytest
+from assertpy import assert_that
+from databases import Database
+
+from app.core import Settings
+from app.core.database_schema import files_table
+from app.repositories.blob_storage import BlobStorage, get_blob_storage
+from app.repositories.file_system_blob_repository import FileSystemBlobRepository
+from app.schemas.enums import BlobStorageType
+from tests.utils.shared_mock_data import user_id_1
+
+test_blob_content: bytes = b'This is test blob content'
+
+
+@pytest.fixture(scope='function')
+def blob_repository(db: Database, tmp_path: Path) -> FileSystemBlobRepository:
+    return FileSystemBlobRepository(db, str(tmp_path))
+
+
+async def write_to_blob(blob_repository: FileSystemBlobRepository, data: bytes) -> int:
+    loid: int = await blob_repository.create_blob()
+    await blob_repository.write_to_blob(loid, 0, data)
+    return loid
+
+
+def test__filesystem_storage_selected__filesystem_repository_created(db: Database, tmp_path: Path) -> None:
+    settings: Settings = Settings.get().copy(
+        update={'blob_storage': BlobStorageType.FILESYSTEM, 'blob_storage_path': str(tmp_path)}
+    )
+
+    blob_storage: BlobStorage = get_blob_storage(db, settings)
+
+    assert_that(blob_storage.stored).is_instance_of(FileSystemBlobRepository)
+
+
+class TestCreateBlob:
+
+    @pytest.mark.asyncio
+    async def test__works_correctly__empty_file_created_in_sharded_directory(
+            self, blob_repository: FileSystemBlobRepository, tmp_path: Path
+    ) -> None:
+        loid: int = await blob_repository.create_blob()
+        name: str = f'{loid:08x}'
+
+        assert_that(blob_repository.local_path(loid)).is_equal_to(str(tmp_path / name[:2] / name[2:4] / name))
+        assert_that(os.path.getsize(blob_repository.local_path(loid))).is_zero()
+
+
+class TestReadAndWrite:
+
+    @pytest.mark.asyncio
+    async def test__data_written_at_offsets__data_read_back(
+            self, blob_repository: FileSystemBlobRepository
+    ) -> None:
+        loid: int = await write_to_blob(blob_repository, b'0123456789')
+        await blob_repository.write_to_blob(loid, 10, b'abc')
+
+        result: bytes = await blob_repository.read_from_blob(loid, 5, 6)
+
+        assert_that(result).is_equal_to(b'56789a')
+        assert_that(await blob_repository.get_last_byte(loid)).is_equal_to(13)
+
+    @pytest.mark.parametrize('offset,length', [(0, 100), (3, 10), (20, 3)])
+    @pytest.mark.asyncio
+    async def test__range_iterated__returns_slices_of_range(
+            self, blob_repository: FileSystemBlobRepository, offset: int, length: int
+    ) -> None:
+        loid: int = await write_to_blob(blob_repository, test_blob_content)
+
+        slices: List[bytes] = [chunk async for chunk in blob_repository.iterate_blob(loid, offset, length, 4)]
+
+        assert_that(b''.join(slices)).is_equal_to(test_blob_content[offset:offset + length])
+        assert_that(max(len(chunk) for chunk in slices)).is_less_than_or_equal_to(4)
+
+
+class TestOpenWriter:
+
+    @pytest.mark.asyncio
+    async def test__data_written_sequentially__data_appended_at_offset(
+            self, blob_repository: FileSystemBlobRepository
+    ) -> None:
+        loid: int = await write_to_blob(blob_repository, b'0123456789')
+
+        async with blob_repository.open_writer(loid, offset=5) as writer:
+            for piece in [b'abc', b'def', b'gh']:
+                await writer.write(piece)
+
+        assert_that(Path(blob_repository.local_path(loid)).read_bytes()).is_equal_to(b'01234abcdefgh')
+
+    @pytest.mark.asyncio
+    async def test__block_fails__appended_data_discarded(
+            self, blob_repository: FileSystemBlobRepository
+    ) -> None:
+        loid: int = await write_to_blob(blob_repository, b'0123456789')
+
+        with pytest.raises(ValueError):
+            async with blob_repository.open_writer(loid, offset=10) as writer:
+                await writer.write(b'abc')
+                raise ValueError()
+
+        assert_that(Path(blob_repository.local_path(loid)).read_bytes()).is_equal_to(b'0123456789')
+
+
+class TestConcatenateBlobs:
+
+    @pytest.mark.asyncio
+    async def test__parts_exist__parts_appended_and_removed(
+            self, blob_repository: FileSystemBlobRepository
+    ) -> None:
+        loids: List[int] = [await write_to_blob(blob_repository, part) for part in [b'abc', b'defgh', b'', b'ij']]
+
+        result: int = await blob_repository.concatenate_blobs(loids[0], loids[1:], 2)
+        sizes: Dict[int, int] = await blob_repository.get_sizes(loids)
+
+        assert_that(result).is_equal_to(10)
+        assert_that(sizes).is_equal_to({loids[0]: 10})
+        assert_that(await blob_repository.read_from_blob(loids[0], 0, 100)).is_equal_to(b'abcdefghij')
+
+
+class TestRemoveBlob:
+
+    @pytest.mark.asyncio
+    async def test__blob_exists__returns_true_and_file_removed(
+            self, blob_repository: FileSystemBlobRepository
+    ) -> None:
+        loid: int = await write_to_blob(blob_repository, test_blob_content)
+
+        result: bool = await blob_repository.remove_blob(loid)
+
+        assert_that(result).is_true()
+        assert_that(os.path.exists(blob_repository.local_path(loid))).is_false()
+
+    @pytest.mark.asyncio
+    async def test__blob_does_not_exist__returns_false(
+            self, blob_repository: FileSystemBlobRepository
+    ) -> None:
+        result: bool = await blob_repository.remove_blob(12345)
+
+        assert_that(result).is_false()
+
+
+class TestUnreferencedBlobs:
+
+    @pytest.mark.asyncio
+    async def test__some_blobs_referenced__only_unreferenced_fetched_in_pages_and_removed(
+            self, blob_repository: FileSystemBlobRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            loids: List[int] = sorted([await write_to_blob(blob_repository, test_blob_content) for _ in range(5)])
+            referenced: int = loids[1]
+            await db.execute(files_table.insert({
+                'oid': referenced, 'owner_id': user_id_1.id, 'file_path': 'test_path/referenced_file',
+                'file_size_bytes': len(test_blob_content)
+            }))
+
+            first_page: List[int] = await blob_repository.fetch_unreferenced_blobs(0, 2)
+            second_page: List[int] = await blob_repository.fetch_unreferenced_blobs(first_page[-1], 2)
+            last_page: List[int] = await blob_repository.fetch_unreferenced_blobs(second_page[-1], 2)
+            removed: List[int] = await blob_repository.remove_unreferenced_blobs(loids)
+
+            assert_that(first_page + second_page + last_page).is_equal_to(
+                [loid for loid in loids if loid != referenced]
+            )
+            assert_that(removed).does_not_contain(referenced).is_length(4)
+            assert_that(await blob_repository.get_sizes(loids)).contains_only(referenced)
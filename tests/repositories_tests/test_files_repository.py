@@ -1,14 +1,17 @@
 from pathlib import Path
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 
 import pytest
 from assertpy import assert_that
 from databases import Database
 from sqlalchemy.sql import Select
 
-from app.core.database_schema import files_table
-from app.errors import FileDoesNotExistsError
-from app.repositories.files_repository import FilesRepository
+from app.core.database_schema import files_table, blobs_table, blob_deletions_table
+from app.core.ttl_cache import TTLCache
+from app.errors import FileDoesNotExistsError, FileModifiedError
+from app.repositories.blob_deletion_queue import BlobDeletionQueue
+from app.repositories.file_metadata_cache import FileMetadataCache
+from app.repositories.files_repository import FilesRepository, DeletedFiles
 from app.schemas.files import FileDb, FileRead
 from app.schemas.users import UserInfo
 from tests.utils.shared_mock_data import insert_test_data, user_id_3, test_files, bytes_in_mb, user_id_1, user_id_2
@@ -16,7 +19,17 @@ from tests.utils.shared_mock_data import insert_test_data, user_id_3, test_files
 
 @pytest.fixture(scope='function')
 def files_repository(db: Database) -> FilesRepository:
-    return FilesRepository.create(db)
+    return FilesRepository(db)
+
+
+@pytest.fixture(scope='function')
+def cached_files_repository(db: Database) -> FilesRepository:
+    return FilesRepository(db, FileMetadataCache(TTLCache(10, 30), None, 30))
+
+
+@pytest.fixture(scope='function')
+def queueing_files_repository(db: Database) -> FilesRepository:
+    return FilesRepository(db, blob_deletion_queue=BlobDeletionQueue(db))
 
 
 class TestFetchAllUserFiles:
@@ -57,6 +70,44 @@ class TestFetchAllUserFiles:
 
             assert_that(result).is_equal_to([])
 
+    @pytest.mark.asyncio
+    async def test__fetched_in_pages__each_page_continues_after_previous_one(
+            self, files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            first_page: List[FileRead] = await files_repository.fetch_all_user_files(user_id_1, limit=1)
+            second_page: List[FileRead] = await files_repository.fetch_all_user_files(
+                user_id_1, after=str(first_page[-1].file_path), limit=1
+            )
+            last_page: List[FileRead] = await files_repository.fetch_all_user_files(
+                user_id_1, after=str(second_page[-1].file_path), limit=1
+            )
+
+            assert_that(first_page + second_page).is_equal_to(self.test_data[0][1])
+            assert_that(last_page).is_empty()
+
+
+class TestIterateUserFiles:
+
+    @pytest.mark.asyncio
+    async def test__user_has_files__yields_files_ordered_by_path(
+            self, files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            result: List[Dict[str, Any]] = [
+                file async for file in files_repository.iterate_user_files(user_id_1, after='test_path/file_1')
+            ]
+
+            assert_that(result).is_equal_to([{
+                'file_path': str(file.file_path),
+                'file_size_mb': file.file_size_bytes / bytes_in_mb,
+                'checksum': file.file_checksum
+            } for file in test_files[1:2]])
+
 
 class TestDeleteFile:
 
@@ -69,13 +120,141 @@ class TestDeleteFile:
 
             test_oid: int = test_files[0].oid
 
-            await files_repository.delete_file(test_oid)
+            blob_unreferenced: bool = await files_repository.delete_file(test_files[0])
 
             query: Select = files_table.select(files_table.c.oid == test_oid)
 
             result = await db.fetch_one(query)
 
             assert_that(result).is_none()
+            assert_that(blob_unreferenced).is_true()
+
+    @pytest.mark.asyncio
+    async def test__blob_shared_by_files__blob_unreferenced_after_last_file_deleted(
+            self, files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await files_repository.create_file(10003, 'test_path/file_a', 10, 'abc', user_id_1, 'sha256:abc')
+            await files_repository.create_file_from_content('sha256:abc', 'test_path/file_b', 'abc', user_id_2)
+            files: List[FileDb] = [
+                await files_repository.fetch_db_file(file_path, user_info)
+                for file_path, user_info in [('test_path/file_a', user_id_1), ('test_path/file_b', user_id_2)]
+            ]
+
+            first_delete: bool = await files_repository.delete_file(files[0])
+            reference_count: int = await db.fetch_val(
+                blobs_table.select(blobs_table.c.oid == 10003).with_only_columns([blobs_table.c.reference_count])
+            )
+            last_delete: bool = await files_repository.delete_file(files[1])
+
+            assert_that(first_delete).is_false()
+            assert_that(reference_count).is_equal_to(1)
+            assert_that(last_delete).is_true()
+            assert_that(await db.fetch_one(blobs_table.select(blobs_table.c.oid == 10003))).is_none()
+
+    @pytest.mark.asyncio
+    async def test__deletion_queue_given__blob_queued_instead_of_left_to_caller(
+            self, queueing_files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            blob_unreferenced: bool = await queueing_files_repository.delete_file(test_files[0])
+            queued: List[int] = [mapping['oid'] for mapping in await db.fetch_all(blob_deletions_table.select())]
+
+            assert_that(blob_unreferenced).is_false()
+            assert_that(queued).is_equal_to([test_files[0].oid])
+
+
+class TestDeleteFiles:
+
+    @pytest.mark.asyncio
+    async def test__directory_given__deletes_files_in_it_and_its_subdirectories(
+            self, files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            for loid, file_path in enumerate(['a_b/c', 'a_b/d/e', 'axb/f', 'a_bc/g'], start=10003):
+                await files_repository.create_file(loid, file_path, 10, 'abc', user_id_1)
+
+            result: DeletedFiles = await files_repository.delete_files(user_id_1, [], 'a_b')
+            remaining: List[str] = [file.file_path for file in await files_repository.fetch_all_user_files(user_id_1)]
+
+            # '_' isn't a wildcard, 'a_bc' isn't in 'a_b'
+            assert_that([str(file.file_path) for file in result.files]).is_equal_to(['a_b/c', 'a_b/d/e'])
+            assert_that(result.unreferenced_blobs).is_equal_to([10003, 10004])
+            assert_that(remaining).is_equal_to([Path('a_bc/g'), Path('axb/f')])
+
+    @pytest.mark.asyncio
+    async def test__blob_shared_by_deleted_and_other_files__released_once_per_deleted_file(
+            self, files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await files_repository.create_file(10003, 'test_path/file_a', 10, 'abc', user_id_1, 'sha256:abc')
+            for file_path in ['test_path/file_b', 'test_path/file_c']:
+                await files_repository.create_file_from_content('sha256:abc', file_path, 'abc', user_id_1)
+
+            first_result: DeletedFiles = await files_repository.delete_files(
+                user_id_1, ['test_path/file_a', 'test_path/file_b', 'test_path/missing']
+            )
+            reference_count: int = await db.fetch_val(
+                blobs_table.select(blobs_table.c.oid == 10003).with_only_columns([blobs_table.c.reference_count])
+            )
+            last_result: DeletedFiles = await files_repository.delete_files(user_id_1, ['test_path/file_c'])
+
+            assert_that(first_result.files).is_length(2)
+            assert_that(first_result.unreferenced_blobs).is_empty()
+            assert_that(reference_count).is_equal_to(1)
+            assert_that(last_result.unreferenced_blobs).is_equal_to([10003])
+            assert_that(await db.fetch_one(blobs_table.select(blobs_table.c.oid == 10003))).is_none()
+
+
+class TestReplaceBlob:
+
+    @pytest.mark.asyncio
+    async def test__file_not_modified__file_points_to_new_blob(
+            self, files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            old_blob_unreferenced: bool = await files_repository.replace_blob(test_files[0], 10003, 20, 'abc')
+            result: FileDb = await files_repository.fetch_db_file(str(test_files[0].file_path), user_id_1)
+
+            assert_that(old_blob_unreferenced).is_true()
+            assert_that(result).is_equal_to(
+                test_files[0].copy(update={'oid': 10003, 'file_size_bytes': 20, 'file_checksum': 'abc'})
+            )
+
+    @pytest.mark.asyncio
+    async def test__blob_shared_by_files__old_blob_kept_for_other_file(
+            self, files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await files_repository.create_file(10003, 'test_path/file_a', 10, 'abc', user_id_1, 'sha256:abc')
+            await files_repository.create_file_from_content('sha256:abc', 'test_path/file_b', 'abc', user_id_2)
+            file_db: FileDb = await files_repository.fetch_db_file('test_path/file_a', user_id_1)
+
+            old_blob_unreferenced: bool = await files_repository.replace_blob(
+                file_db, 10004, 12, 'def', 'sha256:def'
+            )
+            reference_counts: List[Tuple[int, int]] = [
+                (mapping['oid'], mapping['reference_count'])
+                for mapping in await db.fetch_all(blobs_table.select().order_by(blobs_table.c.oid))
+            ]
+
+            assert_that(old_blob_unreferenced).is_false()
+            assert_that(reference_counts).is_equal_to([(10003, 1), (10004, 1)])
+
+    @pytest.mark.asyncio
+    async def test__file_modified_in_the_meantime__raises_error(
+            self, files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+            await files_repository.replace_blob(test_files[0], 10003, 20, 'abc')
+
+            with pytest.raises(FileModifiedError):
+                await files_repository.replace_blob(test_files[0], 10004, 30, 'def')
 
 
 class TestFetchDbFile:
@@ -90,7 +269,7 @@ class TestFetchDbFile:
             expected_result: FileDb = test_files[0]
 
             result: FileDb = await files_repository \
-                .fetch_db_file(str(expected_result.file_path))
+                .fetch_db_file(str(expected_result.file_path), user_id_1)
 
             assert_that(result).is_equal_to(expected_result)
 
@@ -100,7 +279,65 @@ class TestFetchDbFile:
     ) -> None:
         async with db.transaction(force_rollback=True):
             with pytest.raises(FileDoesNotExistsError):
-                await files_repository.fetch_db_file('fake_file_path/fake_file')
+                await files_repository.fetch_db_file('fake_file_path/fake_file', user_id_1)
+
+    @pytest.mark.asyncio
+    async def test__file_belongs_to_other_user__raises_error(
+            self, files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            with pytest.raises(FileDoesNotExistsError):
+                await files_repository.fetch_db_file(str(test_files[2].file_path), user_id_1)
+
+
+class TestFetchCachedDbFile:
+
+    @pytest.mark.asyncio
+    async def test__file_fetched_before__served_from_cache(
+            self, cached_files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+            file_path: str = str(test_files[0].file_path)
+
+            await cached_files_repository.fetch_db_file(file_path, user_id_1, cached=True)
+            # changed behind repository's back, cached file is still returned
+            await db.execute(files_table.update().where(files_table.c.id == test_files[0].id).values(file_size_bytes=1))
+            result: FileDb = await cached_files_repository.fetch_db_file(file_path, user_id_1, cached=True)
+            fresh_result: FileDb = await cached_files_repository.fetch_db_file(file_path, user_id_1)
+
+            assert_that(result).is_equal_to(test_files[0])
+            assert_that(fresh_result.file_size_bytes).is_equal_to(1)
+
+    @pytest.mark.asyncio
+    async def test__blob_replaced__cache_invalidated(
+            self, cached_files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+            file_path: str = str(test_files[0].file_path)
+
+            file_db: FileDb = await cached_files_repository.fetch_db_file(file_path, user_id_1, cached=True)
+            await cached_files_repository.replace_blob(file_db, 10003, 20, 'abc')
+            result: FileDb = await cached_files_repository.fetch_db_file(file_path, user_id_1, cached=True)
+
+            assert_that(result.oid).is_equal_to(10003)
+
+    @pytest.mark.asyncio
+    async def test__file_deleted__cache_invalidated(
+            self, cached_files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+            file_path: str = str(test_files[0].file_path)
+
+            file_db: FileDb = await cached_files_repository.fetch_db_file(file_path, user_id_1, cached=True)
+            await cached_files_repository.delete_file(file_db)
+
+            with pytest.raises(FileDoesNotExistsError):
+                await cached_files_repository.fetch_db_file(file_path, user_id_1, cached=True)
 
 
 class TestCreateFile:
@@ -137,3 +374,39 @@ class TestCreateFile:
             )
 
             assert_that(result).is_equal_to(expected_result)
+
+
+class TestCreateFileFromContent:
+
+    @pytest.mark.asyncio
+    async def test__content_stored__file_shares_blob(
+            self, files_repository: FilesRepository, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await files_repository.create_file(10003, 'test_path/file_a', 10, 'abc', user_id_1, 'sha256:abc')
+
+            result: Optional[FileRead] = await files_repository.create_file_from_content(
+                'sha256:abc', 'test_path/file_b', 'abc', user_id_2, 10
+            )
+            file_db: FileDb = await files_repository.fetch_db_file('test_path/file_b', user_id_2)
+
+            assert_that(result).is_equal_to(
+                FileRead(file_path=Path('test_path/file_b'), file_size_mb=10 / bytes_in_mb, checksum='abc')
+            )
+            assert_that(file_db.oid).is_equal_to(10003)
+            assert_that(file_db.owner_id).is_equal_to(user_id_2.id)
+
+    @pytest.mark.parametrize('content_hash,file_size', [('sha256:other', None), ('sha256:abc', 11)])
+    @pytest.mark.asyncio
+    async def test__content_not_stored__returns_none(
+            self, files_repository: FilesRepository, db: Database,
+            content_hash: str, file_size: Optional[int]
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await files_repository.create_file(10003, 'test_path/file_a', 10, 'abc', user_id_1, 'sha256:abc')
+
+            result: Optional[FileRead] = await files_repository.create_file_from_content(
+                content_hash, 'test_path/file_b', 'abc', user_id_2, file_size
+            )
+
+            assert_that(result).is_none()
@@ -0,0 +1,134 @@
+import re
+from pathlib import Path
+from typing import List, Tuple, Any, Optional, Dict, Callable
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from assertpy import assert_that
+from databases import Database
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import ClauseElement
+
+from app.repositories.blob_deletion_queue import BlobDeletionQueue
+from app.repositories.blob_repository import BlobRepository
+from app.repositories.compressed_blob_storage import CompressedBlobStorage
+from app.repositories.directories_repository import DirectoriesRepository
+from app.repositories.file_system_blob_repository import FileSystemBlobRepository
+from app.repositories.files_repository import FilesRepository
+from app.schemas.enums import BlobCompression
+from app.schemas.files import FileDb
+from app.schemas.users import UserInfo
+from tests.utils.shared_mock_data import user_id_1
+
+seeded_rows: int = 1000000
+"""Rows seeded in tables read by repositories, enough for planner to pick indexes when they fit"""
+
+seed_tables: List[str] = [
+    'ALTER TABLE files DISABLE TRIGGER files_update_directories',
+    f"""
+    INSERT INTO files (oid, owner_id, file_path, file_size_bytes, file_checksum)
+    SELECT n, 'owner_' || (n % 1000), 'directory_' || (n % 10) || '/file_' || n, n, md5(n :: TEXT)
+    FROM generate_series(1, {seeded_rows}) AS n
+    """,
+    f"""
+    INSERT INTO blobs (oid, content_hash, size_bytes, reference_count)
+    SELECT n, md5(n :: TEXT), n, 1 FROM generate_series(1, {seeded_rows}) AS n
+    """,
+    f"""
+    INSERT INTO blob_frames (oid, logical_offset, logical_size, stored_offset, stored_size, compression)
+    SELECT n, 0, 100, 0, 50, 'gzip' FROM generate_series(1, {seeded_rows}) AS n
+    """,
+    """
+    INSERT INTO directories (owner_id, path, parent_path, file_count, total_size_bytes)
+    SELECT 'owner_' || (n / 10), 'directory_' || (n % 10), NULL, 100, 100 FROM generate_series(0, 9999) AS n
+    """,
+    f"""
+    INSERT INTO blob_deletions (oid, queued_at)
+    SELECT n, now() - n * INTERVAL '1 second' FROM generate_series(1, {seeded_rows}) AS n
+    """,
+    'ANALYZE files',
+    'ANALYZE blobs',
+    'ANALYZE blob_frames',
+    'ANALYZE directories',
+    'ANALYZE blob_deletions'
+]
+
+_seq_scan: re.Pattern = re.compile(r'Seq Scan on (files|blobs|blob_frames|directories|blob_deletions)\b')
+
+RecordedQuery = Tuple[Any, Optional[Dict[str, Any]]]
+
+owner: UserInfo = user_id_1.copy(update={'id': 'owner_5'})
+
+
+def record_queries(db: Database, monkeypatch: MonkeyPatch) -> List[RecordedQuery]:
+    """
+    Records every query sent through db by repositories, before it's executed.
+    """
+    recorded: List[RecordedQuery] = []
+
+    def recording(method: Callable[..., Any]) -> Callable[..., Any]:
+        def wrapper(query: Any, values: Optional[Dict[str, Any]] = None) -> Any:
+            recorded.append((query, values))
+            return method(query, values)
+
+        return wrapper
+
+    for name in ['fetch_all', 'fetch_one', 'fetch_val', 'execute', 'iterate']:
+        monkeypatch.setattr(db, name, recording(getattr(db, name)))
+
+    return recorded
+
+
+async def explain(db: Database, query: Any, values: Optional[Dict[str, Any]]) -> str:
+    if isinstance(query, ClauseElement):
+        # compiled with named parameters, as databases would send it
+        compiled: Any = query.compile(dialect=postgresql.dialect())
+        query, values = compiled.string % {name: f':{name}' for name in compiled.params}, compiled.params
+
+    rows: List[Any] = await db.fetch_all(f'EXPLAIN {query}', values)
+    return '\n'.join(row[0] for row in rows)
+
+
+@pytest.mark.asyncio
+async def test__repository_queries_run_on_seeded_tables__no_sequential_scans(
+        db: Database, monkeypatch: MonkeyPatch, tmp_path: Path
+) -> None:
+    async with db.transaction(force_rollback=True):
+        for query in seed_tables:
+            await db.execute(query)
+
+        recorded: List[RecordedQuery] = record_queries(db, monkeypatch)
+
+        files_repository: FilesRepository = FilesRepository(db, blob_deletion_queue=BlobDeletionQueue(db))
+        await files_repository.fetch_all_user_files(owner, after='directory_1/file_5', limit=100)
+        [file async for file in files_repository.iterate_user_files(owner, limit=100)]
+        file_db: FileDb = await files_repository.fetch_db_file('directory_5/file_5', owner)
+        await files_repository.replace_blob(file_db, seeded_rows + 1, 10, 'abc')
+        await files_repository.delete_file(file_db.copy(update={'oid': seeded_rows + 1}))
+        await files_repository.create_file(seeded_rows + 2, 'directory_5/new_file', 10, 'abc', owner)
+        await files_repository.create_file_from_content('md5:unknown', 'directory_5/other_file', 'abc', owner)
+        await files_repository.delete_files(owner, ['directory_5/file_5', 'directory_5/file_1005'], 'directory_7')
+
+        directories_repository: DirectoriesRepository = DirectoriesRepository.create(db)
+        await directories_repository.fetch_directory(owner, 'directory_5')
+        await directories_repository.fetch_children(owner, 'directory_5')
+
+        await BlobRepository(db).fetch_unreferenced_blobs(0, 100)
+        async with BlobDeletionQueue(db).claim():
+            pass
+        compressed_storage: CompressedBlobStorage = CompressedBlobStorage(
+            db, FileSystemBlobRepository(db, str(tmp_path)), BlobCompression.GZIP, 64
+        )
+        await compressed_storage.get_last_byte(15)
+        await compressed_storage.fetch_encoding(15)
+        await compressed_storage.remove_unreferenced_blobs([15, 16])
+        await compressed_storage.remove_blob(17)
+
+        monkeypatch.undo()
+        sequential_scans: List[str] = [
+            plan for plan in [await explain(db, query, values) for query, values in recorded]
+            if _seq_scan.search(plan)
+        ]
+
+        assert_that(recorded).is_not_empty()
+        assert_that(sequential_scans).is_empty()
@@ -0,0 +1,169 @@
+from secrets import token_urlsafe
+from typing import AsyncGenerator, Set
+
+import pytest
+from aredis import StrictRedis
+from assertpy import assert_that
+
+from app.core import Settings
+from app.errors import LocationNotFoundError, UploadOffsetConflictError
+from app.repositories.upload_sessions_repository import UploadSessionsRepository
+from app.schemas.enums import ChecksumAlgorithm
+from app.schemas.files import UploadCacheData
+from tests.utils.shared_mock_data import user_id_1
+
+settings: Settings = Settings.get()
+
+test_cache_data: UploadCacheData = UploadCacheData(
+    owner_id=user_id_1.id, loid=10000, file_path='test_path/file_1',
+    checksum_algorithm=ChecksumAlgorithm.SHA256
+)
+
+
+@pytest.mark.asyncio
+@pytest.fixture(scope='function')
+async def location(redis: StrictRedis) -> AsyncGenerator[str, None]:
+    location: str = token_urlsafe(16)
+    yield location
+    await redis.delete(location)
+    await redis.zrem(UploadSessionsRepository.live_blobs_key, test_cache_data.loid)
+
+
+@pytest.fixture(scope='function')
+def upload_sessions_repository(redis: StrictRedis) -> UploadSessionsRepository:
+    return UploadSessionsRepository.create(redis, settings)
+
+
+class TestFetchSession:
+
+    @pytest.mark.asyncio
+    async def test__session_exists__returns_session(
+            self, upload_sessions_repository: UploadSessionsRepository, location: str
+    ) -> None:
+        await upload_sessions_repository.create_session(location, test_cache_data)
+
+        result: UploadCacheData = await upload_sessions_repository.fetch_session(location)
+
+        assert_that(result).is_equal_to(test_cache_data)
+
+    @pytest.mark.asyncio
+    async def test__session_does_not_exist__raises_error(
+            self, upload_sessions_repository: UploadSessionsRepository, location: str
+    ) -> None:
+        with pytest.raises(LocationNotFoundError):
+            await upload_sessions_repository.fetch_session(location)
+
+
+async def advance_offset(
+        upload_sessions_repository: UploadSessionsRepository, location: str, upload_offset: int, new_offset: int
+) -> int:
+    claim: str = await upload_sessions_repository.claim_offset(location, upload_offset)
+    return await upload_sessions_repository.advance_offset(location, upload_offset, new_offset, claim)
+
+
+class TestClaimOffset:
+
+    @pytest.mark.asyncio
+    async def test__offset_already_claimed__raises_error(
+            self, upload_sessions_repository: UploadSessionsRepository, location: str
+    ) -> None:
+        await upload_sessions_repository.create_session(location, test_cache_data)
+        await upload_sessions_repository.claim_offset(location, 0)
+
+        with pytest.raises(UploadOffsetConflictError) as error:
+            await upload_sessions_repository.claim_offset(location, 0)
+
+        assert_that(error.value.headers).is_equal_to({'upload-offset': '0'})
+
+    @pytest.mark.asyncio
+    async def test__claim_released__offset_can_be_claimed_again(
+            self, upload_sessions_repository: UploadSessionsRepository, location: str
+    ) -> None:
+        await upload_sessions_repository.create_session(location, test_cache_data)
+        claim: str = await upload_sessions_repository.claim_offset(location, 0)
+
+        await upload_sessions_repository.release_claim(claim, location)
+
+        assert_that(await upload_sessions_repository.claim_offset(location, 0)).is_not_equal_to(claim)
+
+    @pytest.mark.asyncio
+    async def test__advanced_without_own_claim__raises_error(
+            self, upload_sessions_repository: UploadSessionsRepository, location: str
+    ) -> None:
+        await upload_sessions_repository.create_session(location, test_cache_data)
+        await upload_sessions_repository.claim_offset(location, 0)
+
+        with pytest.raises(UploadOffsetConflictError):
+            await upload_sessions_repository.advance_offset(location, 0, 100, 'other-claim')
+
+        assert_that((await upload_sessions_repository.fetch_session(location)).upload_offset).is_equal_to(0)
+
+
+class TestAdvanceOffset:
+
+    @pytest.mark.asyncio
+    async def test__offset_matches__offset_advanced(
+            self, upload_sessions_repository: UploadSessionsRepository, location: str
+    ) -> None:
+        await upload_sessions_repository.create_session(location, test_cache_data)
+
+        result: int = await advance_offset(upload_sessions_repository, location, 0, 100)
+        session: UploadCacheData = await upload_sessions_repository.fetch_session(location)
+
+        assert_that(result).is_equal_to(100)
+        assert_that(session.upload_offset).is_equal_to(100)
+
+    @pytest.mark.asyncio
+    async def test__offset_already_advanced__raises_error(
+            self, upload_sessions_repository: UploadSessionsRepository, location: str
+    ) -> None:
+        await upload_sessions_repository.create_session(location, test_cache_data)
+        await advance_offset(upload_sessions_repository, location, 0, 100)
+
+        with pytest.raises(UploadOffsetConflictError):
+            await advance_offset(upload_sessions_repository, location, 0, 100)
+
+    @pytest.mark.asyncio
+    async def test__session_does_not_exist__raises_error(
+            self, upload_sessions_repository: UploadSessionsRepository, location: str
+    ) -> None:
+        with pytest.raises(LocationNotFoundError):
+            await advance_offset(upload_sessions_repository, location, 0, 100)
+
+
+class TestSessionExpiration:
+
+    @pytest.mark.asyncio
+    async def test__session_created__expires_and_blob_tracked(
+            self, upload_sessions_repository: UploadSessionsRepository, location: str, redis: StrictRedis
+    ) -> None:
+        await upload_sessions_repository.create_session(location, test_cache_data)
+
+        ttl: int = await redis.ttl(location)
+        live_blobs: Set[int] = await upload_sessions_repository.fetch_live_blobs()
+
+        assert_that(ttl).is_greater_than(0).is_less_than_or_equal_to(settings.upload_session_ttl_seconds)
+        assert_that(live_blobs).contains(test_cache_data.loid)
+
+    @pytest.mark.asyncio
+    async def test__offset_advanced__expiration_extended(
+            self, upload_sessions_repository: UploadSessionsRepository, location: str, redis: StrictRedis
+    ) -> None:
+        await upload_sessions_repository.create_session(location, test_cache_data)
+        await redis.expire(location, 10)
+
+        await advance_offset(upload_sessions_repository, location, 0, 100)
+
+        assert_that(await redis.ttl(location)).is_greater_than(10)
+
+    @pytest.mark.asyncio
+    async def test__session_deleted__blob_no_longer_tracked(
+            self, upload_sessions_repository: UploadSessionsRepository, location: str
+    ) -> None:
+        await upload_sessions_repository.create_session(location, test_cache_data)
+
+        await upload_sessions_repository.delete_session(location, test_cache_data.loid)
+
+        assert_that(await upload_sessions_repository.fetch_live_blobs()).does_not_contain(test_cache_data.loid)
+        with pytest.raises(LocationNotFoundError):
+            await upload_sessions_repository.fetch_session(location)
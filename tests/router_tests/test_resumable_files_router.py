@@ -1,6 +1,13 @@
+import asyncio
+import gzip
 import hashlib
+import json
+import struct
+import zlib
+from base64 import b64encode
+from functools import partial
 from pathlib import Path
-from typing import List, AsyncGenerator, Tuple
+from typing import List, AsyncGenerator, Tuple, Dict, Union, Any, Optional
 
 import pytest
 from aredis import StrictRedis
@@ -8,25 +15,32 @@ from assertpy import assert_that
 from databases import Database
 from faker import Faker
 from fastapi import FastAPI
-from httpx import AsyncClient, Response
+from httpx import AsyncClient, Response, URL
+from pydantic import SecretStr
 from sqlalchemy.sql import Insert, Select
 
 from app import create_app
 from app.auth_client import logged_user
 from app.core import get_db, get_redis, Settings
 from app.core.database_schema import files_table
-from app.schemas.files import FileRead, FileDb
+from app.maintenance import BlobDeletionWorker
+from app.repositories.blob_deletion_queue import BlobDeletionQueue
+from app.repositories.blob_repository import BlobRepository
+from app.repositories.blob_storage import BlobStorage, get_blob_storage
+from app.repositories.compressed_blob_storage import CompressedBlobStorage
+from app.repositories.file_system_blob_repository import FileSystemBlobRepository
+from app.repositories.upload_sessions_repository import UploadSessionsRepository
+from app.routers.signed_urls import sign_download
+from app.routers.utils import upload_hashes
+from app.schemas.enums import BlobCompression
+from app.schemas.files import FileRead, FileDb, FileSignatures, BlockSignature
 from app.schemas.users import UserInfo
 from tests.utils.shared_mock_data import insert_test_data, user_id_1, bytes_in_mb, test_files
 
 settings: Settings = Settings.get()
 
 
-@pytest.mark.asyncio
-@pytest.fixture(scope='function')
-async def aclient(
-        db: Database, redis: StrictRedis
-) -> AsyncGenerator[AsyncClient, None]:
+def create_test_app(db: Database, redis: StrictRedis) -> FastAPI:
     app: FastAPI = create_app()
 
     def _get_db() -> Database: return db
@@ -39,6 +53,82 @@ async def aclient(
     app.dependency_overrides[get_redis] = _get_redis
     app.dependency_overrides[logged_user] = _logged_user
 
+    return app
+
+
+@pytest.mark.asyncio
+@pytest.fixture(scope='function')
+async def aclient(
+        db: Database, redis: StrictRedis
+) -> AsyncGenerator[AsyncClient, None]:
+    aclient: AsyncClient = AsyncClient(app=create_test_app(db, redis), base_url='http://testserver')
+    yield aclient
+    await aclient.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.fixture(scope='function')
+async def file_system_aclient(
+        db: Database, redis: StrictRedis, tmp_path: Path
+) -> AsyncGenerator[AsyncClient, None]:
+    app: FastAPI = create_test_app(db, redis)
+
+    def _get_blob_storage() -> BlobStorage: return FileSystemBlobRepository(db, str(tmp_path))
+
+    app.dependency_overrides[get_blob_storage] = _get_blob_storage
+
+    aclient: AsyncClient = AsyncClient(app=app, base_url='http://testserver')
+    yield aclient
+    await aclient.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.fixture(scope='function', params=['postgres', 'filesystem'])
+async def compressed_aclient(
+        request: Any, db: Database, redis: StrictRedis, tmp_path: Path
+) -> AsyncGenerator[AsyncClient, None]:
+    app: FastAPI = create_test_app(db, redis)
+    storage: BlobStorage = FileSystemBlobRepository(db, str(tmp_path)) \
+        if request.param == 'filesystem' else BlobRepository(db)
+
+    def _get_blob_storage() -> BlobStorage: return CompressedBlobStorage(db, storage, BlobCompression.GZIP, 256)
+
+    app.dependency_overrides[get_blob_storage] = _get_blob_storage
+
+    aclient: AsyncClient = AsyncClient(app=app, base_url='http://testserver')
+    yield aclient
+    await aclient.aclose()
+
+
+@pytest.fixture(scope='function')
+def signing_app(db: Database, redis: StrictRedis) -> FastAPI:
+    app: FastAPI = create_test_app(db, redis)
+    signing_settings: Settings = settings.copy(update={'download_url_secret': SecretStr('test_secret')})
+
+    def _get_settings() -> Settings: return signing_settings
+
+    app.dependency_overrides[Settings.get] = _get_settings
+    return app
+
+
+@pytest.mark.asyncio
+@pytest.fixture(scope='function')
+async def signing_aclient(signing_app: FastAPI) -> AsyncGenerator[AsyncClient, None]:
+    aclient: AsyncClient = AsyncClient(app=signing_app, base_url='http://testserver')
+    yield aclient
+    await aclient.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.fixture(scope='function')
+async def inline_deletion_aclient(db: Database, redis: StrictRedis) -> AsyncGenerator[AsyncClient, None]:
+    app: FastAPI = create_test_app(db, redis)
+    inline_settings: Settings = settings.copy(update={'blob_deletion_queue': False})
+
+    def _get_settings() -> Settings: return inline_settings
+
+    app.dependency_overrides[Settings.get] = _get_settings
+
     aclient: AsyncClient = AsyncClient(app=app, base_url='http://testserver')
     yield aclient
     await aclient.aclose()
@@ -53,6 +143,7 @@ faker: Faker = Faker('en_US')
 
 test_content: bytes = ' '.join(faker.sentences(10)).encode('utf-8')
 test_content_hash: str = calculate_hash(test_content)
+test_content_sha256: str = hashlib.sha256(test_content).hexdigest()
 
 
 async def insert_uploaded_data(db: Database, file: FileDb) -> None:
@@ -100,6 +191,34 @@ async def upload_file(aclient: AsyncClient, confirm_upload: bool) -> Tuple[str,
     return file_path, location
 
 
+async def store_whole_file(aclient: AsyncClient, file_path: str, **headers: str) -> Response:
+    return await aclient.post(
+        '/resumable/files',
+        content=test_content,
+        headers={
+            'file-path': file_path,
+            'upload-length': str(len(test_content)),
+            'upload-checksum-algorithm': 'sha256',
+            'content-type': 'application/offset+octet-stream',
+            **headers
+        }
+    )
+
+
+async def fetch_file_oids(db: Database) -> List[int]:
+    return [mapping['oid'] for mapping in await db.fetch_all(files_table.select().order_by(files_table.c.id))]
+
+
+async def fetch_existing_blobs(db: Database, loids: List[int]) -> List[int]:
+    return [mapping['oid'] for mapping in await db.fetch_all(
+        'SELECT oid FROM pg_largeobject_metadata WHERE oid = ANY(CAST(:loids AS OID[]))', {'loids': loids}
+    )]
+
+
+async def drain_blob_deletions(db: Database, storage: Optional[BlobStorage] = None) -> int:
+    return await BlobDeletionWorker(storage or BlobRepository(db), BlobDeletionQueue(db), settings).drain()
+
+
 class TestFetchUserFiles:
 
     @pytest.mark.asyncio
@@ -129,6 +248,100 @@ class TestFetchUserFiles:
 
         assert_that(response.status_code).is_equal_to(204)
 
+    @pytest.mark.asyncio
+    async def test__page_is_full__links_to_next_page(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            first_page: Response = await aclient.get('/resumable/files/all', params={'limit': 1})
+            second_page: Response = await aclient.get(first_page.links['next']['url'])
+            last_page: Response = await aclient.get(second_page.links['next']['url'])
+
+            assert_that([file['file_path'] for file in first_page.json() + second_page.json()]) \
+                .is_equal_to([str(file.file_path) for file in test_files if file.owner_id == user_id_1.id])
+            assert_that(second_page.links['next']['url']).contains('limit=1')
+            assert_that(last_page.status_code).is_equal_to(204)
+
+    @pytest.mark.parametrize('listing_format,media_type', [
+        ('json', 'application/json'), ('ndjson', 'application/x-ndjson')
+    ])
+    @pytest.mark.asyncio
+    async def test__listing_streamed__returns_all_files(
+            self, aclient: AsyncClient, db: Database, listing_format: str, media_type: str
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            response: Response = await aclient.get('/resumable/files/all', params={'stream': listing_format})
+
+            files: List[Dict[str, Any]] = response.json() if listing_format == 'json' \
+                else [json.loads(line) for line in response.text.splitlines()]
+            assert_that(response.headers.get('content-type')).is_equal_to(media_type)
+            assert_that([FileRead.parse_obj(file) for file in files]).is_equal_to([FileRead(
+                file_path=file.file_path,
+                file_size_mb=file.file_size_bytes / bytes_in_mb,
+                checksum=file.file_checksum
+            ) for file in test_files if file.owner_id == user_id_1.id])
+
+    @pytest.mark.asyncio
+    async def test__user_has_no_files_and_listing_streamed__returns_empty_array(
+            self, aclient: AsyncClient
+    ) -> None:
+        response: Response = await aclient.get('/resumable/files/all', params={'stream': 'json'})
+
+        assert_that(response.status_code).is_equal_to(200)
+        assert_that(response.json()).is_equal_to([])
+
+
+class TestFetchDirectory:
+
+    @pytest.mark.asyncio
+    async def test__directory_has_files__returns_aggregates(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+            user_files: List[FileDb] = [file for file in test_files if file.owner_id == user_id_1.id]
+
+            response: Response = await aclient.get('/resumable/files/directory', params={'path': 'test_path/'})
+
+            assert_that(response.json()).is_equal_to({
+                'path': 'test_path',
+                'file_count': len(user_files),
+                'total_size_bytes': sum(file.file_size_bytes for file in user_files)
+            })
+
+    @pytest.mark.asyncio
+    async def test__directory_does_not_exist__returns_404(
+            self, aclient: AsyncClient
+    ) -> None:
+        response: Response = await aclient.get('/resumable/files/directory', params={'path': 'test_path'})
+
+        assert_that(response.status_code).is_equal_to(404)
+
+    @pytest.mark.asyncio
+    async def test__children_listed__returns_files_of_directory(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            top_level: Response = await aclient.get('/resumable/files/directory/children')
+            response: Response = await aclient.get(
+                '/resumable/files/directory/children', params={'path': 'test_path'}
+            )
+
+            assert_that([directory['path'] for directory in top_level.json()['directories']]) \
+                .is_equal_to(['test_path'])
+            assert_that(response.json()['directories']).is_empty()
+            assert_that([FileRead.parse_obj(file) for file in response.json()['files']]).is_equal_to([FileRead(
+                file_path=file.file_path,
+                file_size_mb=file.file_size_bytes / bytes_in_mb,
+                checksum=file.file_checksum
+            ) for file in test_files if file.owner_id == user_id_1.id])
+
 
 class TestDownloadFile:
 
@@ -166,7 +379,7 @@ class TestDownloadFile:
         assert_that(response.status_code).is_equal_to(404)
 
     @pytest.mark.asyncio
-    async def test__accessing_file_of_other_user__returns_403(
+    async def test__accessing_file_of_other_user__returns_404(
             self, aclient: AsyncClient, db: Database
     ) -> None:
         async with db.transaction(force_rollback=True):
@@ -179,8 +392,187 @@ class TestDownloadFile:
                 }
             )
 
+            assert_that(response.status_code).is_equal_to(404)
+
+    @pytest.mark.asyncio
+    async def test__file_deleted_after_download__returns_404(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(aclient, True)
+            params: Dict[str, Union[str, int]] = {'file_path': file_path, 'upload_offset': 0}
+
+            # file is cached by first download
+            first_response: Response = await aclient.get('/resumable/files', params=params)
+            await aclient.delete('/resumable/files', params={'file_path': file_path})
+            response: Response = await aclient.get('/resumable/files', params=params)
+
+            assert_that(first_response.status_code).is_equal_to(200)
+            assert_that(response.status_code).is_equal_to(404)
+
+
+class TestStreamFile:
+    single_range_test_data: List[Tuple[str, bytes]] = [
+        ('bytes=0-9', test_content[0:10]),
+        ('bytes=100-', test_content[100:]),
+        ('bytes=-20', test_content[-20:]),
+        ('bytes=5-9, 0-4', test_content[0:10])
+    ]
+
+    @pytest.mark.asyncio
+    async def test__no_range_requested__streams_whole_file(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(aclient, True)
+
+            response: Response = await aclient.get(
+                '/resumable/files/stream',
+                params={'file_path': file_path}
+            )
+
+            assert_that(response.status_code).is_equal_to(200)
+            assert_that(response.headers.get('accept-ranges')).is_equal_to('bytes')
+            assert_that(int(response.headers.get('content-length'))).is_equal_to(len(test_content))
+            assert_that(response.content).is_equal_to(test_content)
+
+    @pytest.mark.parametrize('range_header,expected_result', single_range_test_data)
+    @pytest.mark.asyncio
+    async def test__single_range_requested__returns_partial_content(
+            self, aclient: AsyncClient, db: Database,
+            range_header: str, expected_result: bytes
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(aclient, True)
+
+            response: Response = await aclient.get(
+                '/resumable/files/stream',
+                params={'file_path': file_path},
+                headers={'range': range_header}
+            )
+
+            assert_that(response.status_code).is_equal_to(206)
+            assert_that(response.headers.get('content-range')).ends_with(f'/{len(test_content)}')
+            assert_that(response.content).is_equal_to(expected_result)
+
+    @pytest.mark.asyncio
+    async def test__multiple_ranges_requested__returns_multipart_content(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(aclient, True)
+
+            response: Response = await aclient.get(
+                '/resumable/files/stream',
+                params={'file_path': file_path},
+                headers={'range': 'bytes=0-9, 100-149'}
+            )
+
+            assert_that(response.status_code).is_equal_to(206)
+            assert_that(response.headers.get('content-type')).starts_with('multipart/byteranges')
+            assert_that(int(response.headers.get('content-length'))).is_equal_to(len(response.content))
+            assert_that(response.content).contains(test_content[0:10], test_content[100:150])
+            assert_that(response.content.decode('utf-8')).contains(
+                f'bytes 0-9/{len(test_content)}', f'bytes 100-149/{len(test_content)}'
+            )
+
+    @pytest.mark.asyncio
+    async def test__range_outside_of_file__returns_416(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(aclient, True)
+
+            response: Response = await aclient.get(
+                '/resumable/files/stream',
+                params={'file_path': file_path},
+                headers={'range': f'bytes={len(test_content)}-'}
+            )
+
+            assert_that(response.status_code).is_equal_to(416)
+            assert_that(response.headers.get('content-range')).is_equal_to(f'bytes */{len(test_content)}')
+
+    @pytest.mark.asyncio
+    async def test__accessing_file_of_other_user__returns_404(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            response: Response = await aclient.get(
+                '/resumable/files/stream',
+                params={'file_path': str(test_files[2].file_path)}
+            )
+
+            assert_that(response.status_code).is_equal_to(404)
+
+
+class TestSignedDownloadUrl:
+
+    @pytest.mark.asyncio
+    async def test__url_signed__downloads_without_access_token_and_file_lookup(
+            self, signing_app: FastAPI, signing_aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(signing_aclient, True)
+
+            signed_response: Response = await signing_aclient.get(
+                '/resumable/files/signed-url', params={'file_path': file_path}
+            )
+            # neither logged user nor file row is needed to download blob
+            del signing_app.dependency_overrides[logged_user]
+            await db.execute(files_table.delete())
+            response: Response = await signing_aclient.get(
+                signed_response.json()['url'], headers={'range': 'bytes=0-9'}
+            )
+
+            assert_that(signed_response.status_code).is_equal_to(200)
+            assert_that(response.status_code).is_equal_to(206)
+            assert_that(response.content).is_equal_to(test_content[0:10])
+            assert_that(response.headers.get('cache-control')).starts_with('private, max-age=')
+
+    @pytest.mark.parametrize('tampered', [{'oid': 1}, {'size': 1}, {'owner': 'other_user'}, {'signature': 'abc'}])
+    @pytest.mark.asyncio
+    async def test__url_tampered__returns_403(
+            self, signing_aclient: AsyncClient, db: Database, tampered: Dict[str, Union[str, int]]
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(signing_aclient, True)
+
+            signed_response: Response = await signing_aclient.get(
+                '/resumable/files/signed-url', params={'file_path': file_path}
+            )
+            response: Response = await signing_aclient.get(
+                str(URL(signed_response.json()['url']).copy_merge_params(tampered))
+            )
+
+            assert_that(response.status_code).is_equal_to(403)
+
+    @pytest.mark.asyncio
+    async def test__url_expired__returns_403(
+            self, signing_aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            params: Dict[str, Union[int, str]] = sign_download(test_files[0], settings.copy(update={
+                'download_url_secret': SecretStr('test_secret'), 'download_url_ttl_seconds': -1
+            }))
+            response: Response = await signing_aclient.get('/resumable/files/signed', params=params)
+
             assert_that(response.status_code).is_equal_to(403)
 
+    @pytest.mark.asyncio
+    async def test__secret_not_set__returns_501(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(aclient, True)
+
+            response: Response = await aclient.get('/resumable/files/signed-url', params={'file_path': file_path})
+
+            assert_that(response.status_code).is_equal_to(501)
+
 
 class TestCreateNewUpload:
 
@@ -212,11 +604,8 @@ class TestCreateNewUpload:
 
         assert_that(response.status_code).is_equal_to(400)
 
-
-class TestUploadFile:
-
     @pytest.mark.asyncio
-    async def test__all_data_passed_correctly__returns_upload_offset(
+    async def test__whole_file_sent__file_stored_in_one_request(
             self, aclient: AsyncClient, db: Database
     ) -> None:
         async with db.transaction(force_rollback=True):
@@ -224,92 +613,839 @@ class TestUploadFile:
 
             response: Response = await aclient.post(
                 '/resumable/files',
+                content=test_content,
                 headers={
-                    'file-path': file_path
+                    'file-path': file_path,
+                    'upload-length': str(len(test_content)),
+                    'content-type': 'application/offset+octet-stream'
                 }
             )
+            file_db: FileDb = FileDb.parse_obj(
+                await db.fetch_one(files_table.select(files_table.c.file_path == file_path))
+            )
+            download: Response = await aclient.get('/resumable/files/stream', params={'file_path': file_path})
+
+            assert_that(response.status_code).is_equal_to(201)
+            assert_that(response.headers).does_not_contain_key('location')
+            assert_that(FileRead.parse_obj(response.json()).checksum).is_equal_to(test_content_hash)
+            assert_that(file_db.file_checksum).is_equal_to(test_content_hash)
+            assert_that(file_db.file_size_bytes).is_equal_to(len(test_content))
+            assert_that(download.content).is_equal_to(test_content)
+
+    @pytest.mark.asyncio
+    async def test__first_chunk_sent__upload_continued_with_patch(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            first_chunk, second_chunk = split_content(2)
 
+            response: Response = await aclient.post(
+                '/resumable/files',
+                content=first_chunk,
+                headers={
+                    'file-path': 'test_directory/test_file',
+                    'upload-length': str(len(test_content)),
+                    'content-type': 'application/offset+octet-stream'
+                }
+            )
             location: str = response.headers.get('location')
 
-            response = await aclient.patch(
+            offset: Response = await aclient.head('/resumable/files', params={'location': location})
+            await aclient.patch(
                 '/resumable/files',
-                files={'chunk': test_content},
+                files={'chunk': second_chunk},
                 params={'location': location},
-                headers={'upload-offset': '0'}
+                headers={'upload-offset': response.headers.get('upload-offset')}
+            )
+            response = await aclient.post(
+                '/resumable/files/confirm', params={'location': location, 'checksum': test_content_hash}
             )
 
-            upload_offset: int = int(response.headers.get('upload-offset'))
-
-            assert_that(upload_offset).is_equal_to(len(test_content))
+            assert_that(offset.headers.get('upload-offset')).is_equal_to(str(len(first_chunk)))
+            assert_that(offset.headers.get('upload-length')).is_equal_to(str(len(test_content)))
+            assert_that(response.status_code).is_equal_to(201)
+            assert_that(FileRead.parse_obj(response.json()).checksum).is_equal_to(test_content_hash)
 
     @pytest.mark.asyncio
-    async def test__incorrect_location__returns_404(
+    async def test__chunk_exceeds_upload_length__returns_413(
             self, aclient: AsyncClient
     ) -> None:
-        response = await aclient.patch(
+        response: Response = await aclient.post(
             '/resumable/files',
-            files={'chunk': test_content},
-            params={'location': 'fake-location'},
-            headers={'upload-offset': '0'}
+            content=test_content,
+            headers={
+                'file-path': 'test_directory/test_file',
+                'upload-length': str(len(test_content) - 1),
+                'content-type': 'application/offset+octet-stream'
+            }
         )
 
-        assert_that(response.status_code).is_equal_to(404)
+        assert_that(response.status_code).is_equal_to(413)
 
     @pytest.mark.asyncio
-    async def test__upload_offset_header_not_present__returns_422(
+    async def test__chunk_bigger_than_max_chunk_size__returns_413(
             self, aclient: AsyncClient
     ) -> None:
-        response = await aclient.patch(
+        response: Response = await aclient.post(
             '/resumable/files',
-            files={'chunk': test_content},
-            params={'location': 'fake-location'}
+            content=b'x' * (settings.max_chunk_size + 1),
+            headers={
+                'file-path': 'test_directory/test_file',
+                'content-type': 'application/offset+octet-stream'
+            }
+        )
+
+        assert_that(response.status_code).is_equal_to(413)
+
+    @pytest.mark.asyncio
+    async def test__content_already_stored__file_created_without_data(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await store_whole_file(aclient, 'test_directory/original_file')
+
+            response: Response = await aclient.post(
+                '/resumable/files',
+                headers={
+                    'file-path': 'test_directory/copied_file',
+                    'upload-length': str(len(test_content)),
+                    'upload-checksum-algorithm': 'sha256',
+                    'file-checksum': test_content_sha256
+                }
+            )
+            download: Response = await aclient.get(
+                '/resumable/files/stream', params={'file_path': 'test_directory/copied_file'}
+            )
+            oids: List[int] = await fetch_file_oids(db)
+
+            assert_that(response.status_code).is_equal_to(201)
+            assert_that(response.headers.get('upload-offset')).is_equal_to(str(len(test_content)))
+            assert_that(FileRead.parse_obj(response.json()).checksum).is_equal_to(test_content_sha256)
+            assert_that(oids).is_length(2)
+            assert_that(set(oids)).is_length(1)
+            assert_that(download.content).is_equal_to(test_content)
+
+    @pytest.mark.asyncio
+    async def test__content_not_stored__upload_created(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            response: Response = await aclient.post(
+                '/resumable/files',
+                headers={
+                    'file-path': 'test_directory/test_file',
+                    'upload-length': str(len(test_content)),
+                    'upload-checksum-algorithm': 'sha256',
+                    'file-checksum': test_content_sha256
+                }
+            )
+
+            assert_that(response.status_code).is_equal_to(201)
+            assert_that(response.headers).contains_key('location')
+            assert_that(await fetch_file_oids(db)).is_empty()
+
+    @pytest.mark.asyncio
+    async def test__whole_file_with_stored_content_sent__file_shares_blob(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await store_whole_file(aclient, 'test_directory/original_file')
+
+            response: Response = await store_whole_file(aclient, 'test_directory/copied_file')
+
+            assert_that(response.status_code).is_equal_to(201)
+            assert_that(set(await fetch_file_oids(db))).is_length(1)
+
+    @pytest.mark.asyncio
+    async def test__whole_file_does_not_match_file_checksum__returns_460(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            response: Response = await store_whole_file(
+                aclient, 'test_directory/test_file', **{'file-checksum': hashlib.sha256(b'other').hexdigest()}
+            )
+
+            assert_that(response.status_code).is_equal_to(460)
+            assert_that(await fetch_file_oids(db)).is_empty()
+
+    @pytest.mark.parametrize('headers', [
+        {'upload-checksum-algorithm': 'md5', 'upload-length': '10'},
+        {'upload-checksum-algorithm': 'sha256'},
+        {'upload-checksum-algorithm': 'sha256', 'upload-length': '10', 'upload-concat': 'partial'}
+    ])
+    @pytest.mark.asyncio
+    async def test__file_checksum_can_not_identify_content__returns_400(
+            self, aclient: AsyncClient, headers: Dict[str, str]
+    ) -> None:
+        response: Response = await aclient.post(
+            '/resumable/files',
+            headers={'file-path': 'test_directory/test_file', 'file-checksum': test_content_sha256, **headers}
+        )
+
+        assert_that(response.status_code).is_equal_to(400)
+
+
+class TestUploadFile:
+
+    @pytest.mark.asyncio
+    async def test__all_data_passed_correctly__returns_upload_offset(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path: str = 'test_directory/test_file'
+
+            response: Response = await aclient.post(
+                '/resumable/files',
+                headers={
+                    'file-path': file_path
+                }
+            )
+
+            location: str = response.headers.get('location')
+
+            response = await aclient.patch(
+                '/resumable/files',
+                files={'chunk': test_content},
+                params={'location': location},
+                headers={'upload-offset': '0'}
+            )
+
+            upload_offset: int = int(response.headers.get('upload-offset'))
+
+            assert_that(upload_offset).is_equal_to(len(test_content))
+
+    @pytest.mark.asyncio
+    async def test__incorrect_location__returns_404(
+            self, aclient: AsyncClient
+    ) -> None:
+        response = await aclient.patch(
+            '/resumable/files',
+            files={'chunk': test_content},
+            params={'location': 'fake-location'},
+            headers={'upload-offset': '0'}
+        )
+
+        assert_that(response.status_code).is_equal_to(404)
+
+    @pytest.mark.asyncio
+    async def test__upload_offset_header_not_present__returns_422(
+            self, aclient: AsyncClient
+    ) -> None:
+        response = await aclient.patch(
+            '/resumable/files',
+            files={'chunk': test_content},
+            params={'location': 'fake-location'}
         )
 
         assert_that(response.status_code).is_equal_to(422)
 
+    @pytest.mark.parametrize('upload_offset', [0, 5])
+    @pytest.mark.asyncio
+    async def test__offset_does_not_match_upload__returns_409_and_current_offset(
+            self, aclient: AsyncClient, db: Database, upload_offset: int
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(aclient, False)
+
+            response: Response = await aclient.patch(
+                '/resumable/files',
+                files={'chunk': test_content},
+                params={'location': location},
+                headers={'upload-offset': str(upload_offset)}
+            )
+
+            assert_that(response.status_code).is_equal_to(409)
+            assert_that(int(response.headers.get('upload-offset'))).is_equal_to(len(test_content))
+
+    @pytest.mark.asyncio
+    async def test__concurrent_chunks_with_same_offset__only_one_written(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path: str = 'test_directory/test_file'
+            response: Response = await aclient.post(
+                '/resumable/files',
+                headers={'file-path': file_path}
+            )
+            location: str = response.headers.get('location')
+            chunks: List[bytes] = [test_content, test_content.upper()]
+
+            responses: List[Response] = await asyncio.gather(*[aclient.patch(
+                '/resumable/files',
+                files={'chunk': chunk},
+                params={'location': location},
+                headers={'upload-offset': '0'}
+            ) for chunk in chunks])
+            status_codes: List[int] = [response.status_code for response in responses]
+            written_chunk: bytes = chunks[status_codes.index(200)]
+
+            response = await aclient.post(
+                '/resumable/files/confirm',
+                params={'location': location, 'checksum': calculate_hash(written_chunk)}
+            )
+            stream_response: Response = await aclient.get(
+                '/resumable/files/stream', params={'file_path': file_path}
+            )
+
+            assert_that(sorted(status_codes)).is_equal_to([200, 409])
+            assert_that(response.status_code).is_equal_to(201)
+            assert_that(stream_response.content).is_equal_to(written_chunk)
+
+    @pytest.mark.asyncio
+    async def test__chunk_exceeds_upload_length__returns_413(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            response: Response = await aclient.post(
+                '/resumable/files',
+                headers={'file-path': 'test_directory/test_file', 'upload-length': str(len(test_content) - 1)}
+            )
+
+            response = await aclient.patch(
+                '/resumable/files',
+                files={'chunk': test_content},
+                params={'location': response.headers.get('location')},
+                headers={'upload-offset': '0'}
+            )
+
+            assert_that(response.status_code).is_equal_to(413)
+
+    @pytest.mark.asyncio
+    async def test__chunk_sent_as_raw_body__chunk_streamed_into_blob(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path: str = 'test_directory/test_file'
+            response: Response = await aclient.post('/resumable/files', headers={'file-path': file_path})
+            location: str = response.headers.get('location')
+            digest: str = b64encode(hashlib.md5(test_content).digest()).decode('ascii')
+
+            response = await aclient.patch(
+                '/resumable/files',
+                content=test_content,
+                params={'location': location},
+                headers={
+                    'upload-offset': '0',
+                    'upload-checksum': f'md5 {digest}',
+                    'content-type': 'application/offset+octet-stream'
+                }
+            )
+            await aclient.post(
+                '/resumable/files/confirm', params={'location': location, 'checksum': test_content_hash}
+            )
+            download: Response = await aclient.get('/resumable/files/stream', params={'file_path': file_path})
+
+            assert_that(response.status_code).is_equal_to(200)
+            assert_that(int(response.headers.get('upload-offset'))).is_equal_to(len(test_content))
+            assert_that(download.content).is_equal_to(test_content)
+
+    @pytest.mark.asyncio
+    async def test__raw_chunk_checksum_incorrect__returns_460_and_nothing_written(
+            self, aclient: AsyncClient, db: Database, redis: StrictRedis
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            response: Response = await aclient.post(
+                '/resumable/files', headers={'file-path': 'test_directory/test_file'}
+            )
+            location: str = response.headers.get('location')
+            loid: int = int(await redis.hget(location, 'loid'))
+            digest: str = b64encode(hashlib.md5(b'other content').digest()).decode('ascii')
+
+            response = await aclient.patch(
+                '/resumable/files',
+                content=test_content,
+                params={'location': location},
+                headers={
+                    'upload-offset': '0',
+                    'upload-checksum': f'md5 {digest}',
+                    'content-type': 'application/offset+octet-stream'
+                }
+            )
+            offset: Response = await aclient.head('/resumable/files', params={'location': location})
+            blob_size: int = await db.execute('SELECT get_lo_size(CAST(:loid AS OID))', {'loid': loid})
+
+            assert_that(response.status_code).is_equal_to(460)
+            assert_that(offset.headers.get('upload-offset')).is_equal_to('0')
+            assert_that(blob_size).is_equal_to(0)
+
+    @pytest.mark.asyncio
+    async def test__raw_chunk_declared_too_big__returns_413(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            response: Response = await aclient.post(
+                '/resumable/files', headers={'file-path': 'test_directory/test_file'}
+            )
+
+            response = await aclient.patch(
+                '/resumable/files',
+                content=b'x' * (settings.max_chunk_size + 1),
+                params={'location': response.headers.get('location')},
+                headers={'upload-offset': '0', 'content-type': 'application/offset+octet-stream'}
+            )
+
+            assert_that(response.status_code).is_equal_to(413)
+
+    @pytest.mark.asyncio
+    async def test__raw_chunk_content_type_incorrect__returns_415(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            response: Response = await aclient.post(
+                '/resumable/files', headers={'file-path': 'test_directory/test_file'}
+            )
+
+            response = await aclient.patch(
+                '/resumable/files',
+                content=test_content,
+                params={'location': response.headers.get('location')},
+                headers={'upload-offset': '0', 'content-type': 'text/plain'}
+            )
+
+            assert_that(response.status_code).is_equal_to(415)
+
+    @pytest.mark.parametrize('algorithm', ['md5', 'sha1', 'sha256', 'blake2b'])
+    @pytest.mark.asyncio
+    async def test__chunk_checksum_correct__chunk_written(
+            self, aclient: AsyncClient, db: Database, algorithm: str
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            response: Response = await aclient.post(
+                '/resumable/files',
+                headers={'file-path': 'test_directory/test_file'}
+            )
+
+            location: str = response.headers.get('location')
+            digest: str = b64encode(hashlib.new(algorithm, test_content).digest()).decode('ascii')
+
+            response = await aclient.patch(
+                '/resumable/files',
+                files={'chunk': test_content},
+                params={'location': location},
+                headers={'upload-offset': '0', 'upload-checksum': f'{algorithm} {digest}'}
+            )
+
+            assert_that(response.status_code).is_equal_to(200)
+
+    @pytest.mark.asyncio
+    async def test__chunk_checksum_incorrect__returns_460_and_chunk_not_written(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            response: Response = await aclient.post(
+                '/resumable/files',
+                headers={'file-path': 'test_directory/test_file'}
+            )
+
+            location: str = response.headers.get('location')
+            digest: str = b64encode(hashlib.sha1(b'other content').digest()).decode('ascii')
+
+            response = await aclient.patch(
+                '/resumable/files',
+                files={'chunk': test_content},
+                params={'location': location},
+                headers={'upload-offset': '0', 'upload-checksum': f'sha1 {digest}'}
+            )
+
+            assert_that(response.status_code).is_equal_to(460)
+
+            response = await aclient.head(
+                '/resumable/files',
+                params={'location': location}
+            )
+
+            assert_that(int(response.headers.get('upload-offset'))).is_equal_to(0)
+
+    @pytest.mark.parametrize('checksum_header', ['crc32 AAAAAA==', 'sha1 not-base64!'])
+    @pytest.mark.asyncio
+    async def test__chunk_checksum_header_incorrect__returns_400(
+            self, aclient: AsyncClient, checksum_header: str
+    ) -> None:
+        response = await aclient.patch(
+            '/resumable/files',
+            files={'chunk': test_content},
+            params={'location': 'fake-location'},
+            headers={'upload-offset': '0', 'upload-checksum': checksum_header}
+        )
+
+        assert_that(response.status_code).is_equal_to(400)
+
+
+class TestConfirmUpload:
+
+    @pytest.mark.asyncio
+    async def test__data_passed_correctly__returns_confirmed_file(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path: str = 'test_directory/test_file'
+
+            response: Response = await aclient.post(
+                '/resumable/files',
+                headers={
+                    'file-path': file_path
+                }
+            )
+
+            location: str = response.headers.get('location')
+
+            await aclient.patch(
+                '/resumable/files',
+                files={'chunk': test_content},
+                params={'location': location},
+                headers={'upload-offset': '0'}
+            )
+
+            expected_result: FileRead = FileRead(
+                file_path=Path(file_path),
+                file_size_mb=(len(test_content) / bytes_in_mb),
+                checksum=test_content_hash
+            )
+
+            response = await aclient.post(
+                '/resumable/files/confirm',
+                params={
+                    'location': location,
+                    'checksum': test_content_hash
+                }
+            )
+
+            result: FileRead = FileRead.parse_obj(response.json())
+
+            assert_that(result).is_equal_to(expected_result)
+
+    @pytest.mark.parametrize('algorithm', ['md5', 'sha256', 'blake2b'])
+    @pytest.mark.asyncio
+    async def test__file_uploaded_in_chunks__returns_checksum_of_selected_algorithm(
+            self, aclient: AsyncClient, db: Database, algorithm: str
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            response: Response = await aclient.post(
+                '/resumable/files',
+                headers={
+                    'file-path': 'test_directory/test_file',
+                    'upload-checksum-algorithm': algorithm
+                }
+            )
+
+            location: str = response.headers.get('location')
+            middle: int = len(test_content) // 2
+
+            for offset, chunk in ((0, test_content[:middle]), (middle, test_content[middle:])):
+                await aclient.patch(
+                    '/resumable/files',
+                    files={'chunk': chunk},
+                    params={'location': location},
+                    headers={'upload-offset': str(offset)}
+                )
+
+            expected_checksum: str = hashlib.new(algorithm, test_content).hexdigest()
+
+            response = await aclient.post(
+                '/resumable/files/confirm',
+                params={
+                    'location': location,
+                    'checksum': expected_checksum
+                }
+            )
+
+            result: FileRead = FileRead.parse_obj(response.json())
+
+            assert_that(result.checksum).is_equal_to(expected_checksum)
+
+    @pytest.mark.asyncio
+    async def test__upload_not_hashed_by_this_process__checksum_calculated_from_blob(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(aclient, False)
+
+            upload_hashes.discard(location)
+
+            response: Response = await aclient.post(
+                '/resumable/files/confirm',
+                params={
+                    'location': location,
+                    'checksum': test_content_hash
+                }
+            )
+
+            assert_that(response.status_code).is_equal_to(201)
+
+    @pytest.mark.asyncio
+    async def test__checksums_do_not_match__returns_460(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(aclient, False)
+
+            response: Response = await aclient.post(
+                '/resumable/files/confirm',
+                params={
+                    'location': location,
+                    'checksum': calculate_hash(b'other content')
+                }
+            )
+
+            assert_that(response.status_code).is_equal_to(460)
+
+    @pytest.mark.asyncio
+    async def test__upload_incomplete__returns_400_and_upload_removed(
+            self, aclient: AsyncClient, db: Database, redis: StrictRedis
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            response: Response = await aclient.post(
+                '/resumable/files',
+                content=test_content,
+                headers={
+                    'file-path': 'test_directory/test_file',
+                    'upload-length': str(len(test_content) + 1),
+                    'content-type': 'application/offset+octet-stream'
+                }
+            )
+            location: str = response.headers.get('location')
+            loid: int = int(await redis.hget(location, 'loid'))
+
+            response = await aclient.post('/resumable/files/confirm', params={'location': location})
+            offset: Response = await aclient.head('/resumable/files', params={'location': location})
+            blob_exists: bool = await db.execute(
+                'SELECT EXISTS(SELECT 1 FROM pg_largeobject_metadata WHERE oid = :loid)', {'loid': loid}
+            )
+
+            assert_that(response.status_code).is_equal_to(400)
+            assert_that(offset.status_code).is_equal_to(404)
+            assert_that(blob_exists).is_false()
+
+    @pytest.mark.asyncio
+    async def test__checksums_do_not_match__blob_removed(
+            self, aclient: AsyncClient, db: Database, redis: StrictRedis
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(aclient, False)
+            loid: int = int(await redis.hget(location, 'loid'))
+
+            await aclient.post(
+                '/resumable/files/confirm',
+                params={
+                    'location': location,
+                    'checksum': calculate_hash(b'other content')
+                }
+            )
+
+            blob_exists: bool = await db.execute(
+                'SELECT EXISTS(SELECT 1 FROM pg_largeobject_metadata WHERE oid = :loid)', {'loid': loid}
+            )
+
+            assert_that(blob_exists).is_false()
+
+    @pytest.mark.asyncio
+    async def test__content_already_stored__file_shares_blob_and_upload_removed(
+            self, aclient: AsyncClient, db: Database, redis: StrictRedis
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await store_whole_file(aclient, 'test_directory/original_file')
+            response: Response = await aclient.post(
+                '/resumable/files',
+                headers={'file-path': 'test_directory/copied_file', 'upload-checksum-algorithm': 'sha256'}
+            )
+            location: str = response.headers.get('location')
+            loid: int = int(await redis.hget(location, 'loid'))
+            await aclient.patch(
+                '/resumable/files', files={'chunk': test_content},
+                params={'location': location}, headers={'upload-offset': '0'}
+            )
+
+            response = await aclient.post(
+                '/resumable/files/confirm', params={'location': location, 'checksum': test_content_sha256}
+            )
+            oids: List[int] = await fetch_file_oids(db)
+            blob_exists: bool = await db.execute(
+                'SELECT EXISTS(SELECT 1 FROM pg_largeobject_metadata WHERE oid = :loid)', {'loid': loid}
+            )
+
+            assert_that(response.status_code).is_equal_to(201)
+            assert_that(set(oids)).is_length(1).does_not_contain(loid)
+            assert_that(blob_exists).is_false()
+
+
+async def upload_partial(aclient: AsyncClient, chunk: bytes, algorithm: str = 'md5') -> str:
+    response: Response = await aclient.post(
+        '/resumable/files',
+        headers={'upload-concat': 'partial', 'upload-checksum-algorithm': algorithm}
+    )
+    location: str = response.headers.get('location')
+
+    await aclient.patch(
+        '/resumable/files',
+        files={'chunk': chunk},
+        params={'location': location},
+        headers={'upload-offset': '0'}
+    )
+    return location
+
+
+def split_content(parts: int) -> List[bytes]:
+    part_size: int = -(-len(test_content) // parts)
+    return [test_content[start:start + part_size] for start in range(0, len(test_content), part_size)]
+
+
+class TestConcatenateUploads:
+
+    @pytest.mark.parametrize('algorithm', ['md5', 'sha256'])
+    @pytest.mark.asyncio
+    async def test__parts_uploaded_out_of_order__returns_concatenated_file(
+            self, aclient: AsyncClient, db: Database, algorithm: str
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            parts: List[bytes] = split_content(3)
+            # requests share test connection, so parts are uploaded one by one (last part first)
+            locations: List[str] = [
+                await upload_partial(aclient, part, algorithm) for part in reversed(parts)
+            ][::-1]
+
+            expected_checksum: str = hashlib.new(
+                algorithm, b''.join(hashlib.new(algorithm, part).digest() for part in parts)
+            ).hexdigest() + '-3'
+
+            response: Response = await aclient.post(
+                '/resumable/files/concatenate',
+                params={'checksum': expected_checksum},
+                headers={
+                    'file-path': 'test_directory/test_file',
+                    'upload-concat': f"final;{' '.join(locations)}"
+                }
+            )
+            result: FileRead = FileRead.parse_obj(response.json())
+
+            download: Response = await aclient.get(
+                '/resumable/files/stream', params={'file_path': 'test_directory/test_file'}
+            )
+            offset: Response = await aclient.head('/resumable/files', params={'location': locations[0]})
+
+            assert_that(response.status_code).is_equal_to(201)
+            assert_that(result.checksum).is_equal_to(expected_checksum)
+            assert_that(download.content).is_equal_to(test_content)
+            assert_that(offset.status_code).is_equal_to(404)
+
+    @pytest.mark.asyncio
+    async def test__checksums_do_not_match__returns_460_and_parts_kept(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            locations: List[str] = [await upload_partial(aclient, part) for part in split_content(2)]
+
+            response: Response = await aclient.post(
+                '/resumable/files/concatenate',
+                params={'checksum': 'incorrect-checksum'},
+                headers={
+                    'file-path': 'test_directory/test_file',
+                    'upload-concat': f"final;{' '.join(locations)}"
+                }
+            )
+            offset: Response = await aclient.head('/resumable/files', params={'location': locations[0]})
+
+            assert_that(response.status_code).is_equal_to(460)
+            assert_that(offset.status_code).is_equal_to(200)
+
+    @pytest.mark.asyncio
+    async def test__checksum_not_requested__file_created_without_checksum(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            locations: List[str] = [await upload_partial(aclient, part) for part in split_content(2)]
+
+            response: Response = await aclient.post(
+                '/resumable/files/concatenate',
+                headers={
+                    'file-path': 'test_directory/test_file',
+                    'upload-concat': f"final;{' '.join(locations)}"
+                }
+            )
 
-class TestConfirmUpload:
+            assert_that(response.status_code).is_equal_to(201)
+            assert_that(FileRead.parse_obj(response.json()).checksum).is_none()
 
     @pytest.mark.asyncio
-    async def test__data_passed_correctly__returns_confirmed_file(
-            self, aclient: AsyncClient, db: Database
+    async def test__parts_already_claimed__returns_409_and_parts_cannot_be_written(
+            self, aclient: AsyncClient, db: Database, redis: StrictRedis
     ) -> None:
         async with db.transaction(force_rollback=True):
-            file_path: str = 'test_directory/test_file'
+            locations: List[str] = [await upload_partial(aclient, part) for part in split_content(2)]
+            await UploadSessionsRepository(redis, settings).claim_uploads(locations)
 
             response: Response = await aclient.post(
-                '/resumable/files',
+                '/resumable/files/concatenate',
                 headers={
-                    'file-path': file_path
+                    'file-path': 'test_directory/test_file',
+                    'upload-concat': f"final;{' '.join(locations)}"
                 }
             )
-
-            location: str = response.headers.get('location')
-
-            await aclient.patch(
+            offset: Response = await aclient.head('/resumable/files', params={'location': locations[0]})
+            patch_response: Response = await aclient.patch(
                 '/resumable/files',
                 files={'chunk': test_content},
-                params={'location': location},
-                headers={'upload-offset': '0'}
+                params={'location': locations[0]},
+                headers={'upload-offset': offset.headers.get('upload-offset')}
             )
 
-            expected_result: FileRead = FileRead(
-                file_path=Path(file_path),
-                file_size_mb=(len(test_content) / bytes_in_mb),
-                checksum=test_content_hash
+            assert_that(response.status_code).is_equal_to(409)
+            assert_that(patch_response.status_code).is_equal_to(409)
+
+    @pytest.mark.asyncio
+    async def test__part_data_removed__returns_410_and_parts_released(
+            self, aclient: AsyncClient, db: Database, redis: StrictRedis
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            locations: List[str] = [await upload_partial(aclient, part) for part in split_content(2)]
+            loid: int = int(await redis.hget(locations[1], 'loid'))
+            await db.execute('SELECT lo_unlink(CAST(:loid AS OID))', {'loid': loid})
+            concatenate = partial(aclient.post, '/resumable/files/concatenate', headers={
+                'file-path': 'test_directory/test_file',
+                'upload-concat': f"final;{' '.join(locations)}"
+            })
+
+            responses: List[Response] = [await concatenate(), await concatenate()]
+
+            assert_that([response.status_code for response in responses]).is_equal_to([410, 410])
+
+    @pytest.mark.asyncio
+    async def test__upload_is_not_partial__returns_400(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(aclient, False)
+
+            response: Response = await aclient.post(
+                '/resumable/files/concatenate',
+                headers={'file-path': 'test_directory/other_file', 'upload-concat': f'final;{location}'}
             )
 
-            response = await aclient.post(
-                '/resumable/files/confirm',
-                params={
-                    'location': location,
-                    'checksum': test_content_hash
-                }
+            assert_that(response.status_code).is_equal_to(400)
+
+    @pytest.mark.asyncio
+    async def test__partial_upload_confirmed__returns_400(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            location: str = await upload_partial(aclient, test_content)
+
+            response: Response = await aclient.post(
+                '/resumable/files/confirm', params={'location': location}
             )
 
-            result: FileRead = FileRead.parse_obj(response.json())
+            assert_that(response.status_code).is_equal_to(400)
 
-            assert_that(result).is_equal_to(expected_result)
+    @pytest.mark.parametrize('upload_concat', ['partial', 'final;', 'final;same same'])
+    @pytest.mark.asyncio
+    async def test__upload_concat_header_incorrect__returns_400(
+            self, aclient: AsyncClient, upload_concat: str
+    ) -> None:
+        response: Response = await aclient.post(
+            '/resumable/files/concatenate',
+            headers={'file-path': 'test_directory/test_file', 'upload-concat': upload_concat}
+        )
+
+        assert_that(response.status_code).is_equal_to(400)
 
 
 class TestFetchUploadOffset:
@@ -368,6 +1504,24 @@ class TestDeleteFile:
 
             assert_that(result).is_none()
 
+    @pytest.mark.asyncio
+    async def test__blob_shared_with_other_file__blob_kept(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await store_whole_file(aclient, 'test_directory/original_file')
+            await store_whole_file(aclient, 'test_directory/copied_file')
+
+            response: Response = await aclient.delete(
+                '/resumable/files', params={'file_path': 'test_directory/original_file'}
+            )
+            download: Response = await aclient.get(
+                '/resumable/files/stream', params={'file_path': 'test_directory/copied_file'}
+            )
+
+            assert_that(response.status_code).is_equal_to(200)
+            assert_that(download.content).is_equal_to(test_content)
+
     @pytest.mark.asyncio
     async def test__file_does_not_exists__returns_404(
             self, aclient: AsyncClient, db: Database
@@ -383,7 +1537,7 @@ class TestDeleteFile:
             assert_that(response.status_code).is_equal_to(404)
 
     @pytest.mark.asyncio
-    async def test__file_belongs_to_other_user__returns_403(
+    async def test__file_belongs_to_other_user__returns_404(
             self, aclient: AsyncClient, db: Database
     ) -> None:
         async with db.transaction(force_rollback=True):
@@ -396,4 +1550,457 @@ class TestDeleteFile:
                 }
             )
 
-            assert_that(response.status_code).is_equal_to(403)
+            assert_that(response.status_code).is_equal_to(404)
+
+
+class TestDeleteFiles:
+
+    @pytest.mark.asyncio
+    async def test__paths_and_directory_given__reports_result_of_every_path(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            for file_path in ['test_directory/a', 'test_directory/sub/b', 'other_directory/c', 'other_directory/d']:
+                await store_whole_file(aclient, file_path)
+
+            response: Response = await aclient.post('/resumable/files/delete', json={
+                'file_paths': ['other_directory/c', 'missing_directory/e'], 'directory': 'test_directory/'
+            })
+            download: Response = await aclient.get(
+                '/resumable/files/stream', params={'file_path': 'other_directory/d'}
+            )
+
+            assert_that(response.status_code).is_equal_to(200)
+            assert_that(response.json()).is_equal_to([
+                {'file_path': 'other_directory/c', 'status_code': 200},
+                {'file_path': 'missing_directory/e', 'status_code': 404},
+                {'file_path': 'test_directory/a', 'status_code': 200},
+                {'file_path': 'test_directory/sub/b', 'status_code': 200}
+            ])
+            # blob shared by all files is kept for the remaining one
+            assert_that(download.content).is_equal_to(test_content)
+
+    @pytest.mark.asyncio
+    async def test__files_deleted__blobs_queued_and_removed_by_worker(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(aclient, True)
+            await store_whole_file(aclient, 'test_directory/stored_file')
+            loids: List[int] = await fetch_file_oids(db)
+
+            await aclient.post('/resumable/files/delete', json={'directory': 'test_directory'})
+            blobs_after_delete: List[int] = await fetch_existing_blobs(db, loids)
+            removed: int = await drain_blob_deletions(db)
+
+            assert_that(loids).is_length(2)
+            assert_that(blobs_after_delete).is_length(2)
+            assert_that(removed).is_equal_to(2)
+            assert_that(await fetch_existing_blobs(db, loids)).is_empty()
+
+    @pytest.mark.asyncio
+    async def test__deletion_queue_disabled__blobs_removed_in_batches(
+            self, inline_deletion_aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(inline_deletion_aclient, True)
+            await store_whole_file(inline_deletion_aclient, 'test_directory/stored_file')
+            loids: List[int] = await fetch_file_oids(db)
+
+            await inline_deletion_aclient.post('/resumable/files/delete', json={'directory': 'test_directory'})
+
+            assert_that(loids).is_length(2)
+            assert_that(await fetch_existing_blobs(db, loids)).is_empty()
+
+    @pytest.mark.asyncio
+    async def test__files_of_other_user__not_deleted(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            response: Response = await aclient.post(
+                '/resumable/files/delete', json={'file_paths': [str(test_files[2].file_path)]}
+            )
+
+            assert_that(response.json()).is_equal_to([
+                {'file_path': str(test_files[2].file_path), 'status_code': 404}
+            ])
+            assert_that(await fetch_file_oids(db)).contains(test_files[2].oid)
+
+    @pytest.mark.parametrize('batch', [{}, {'file_paths': []}, {'directory': '/'}])
+    @pytest.mark.asyncio
+    async def test__no_files_selected__returns_422(
+            self, aclient: AsyncClient, batch: Dict[str, Any]
+    ) -> None:
+        response: Response = await aclient.post('/resumable/files/delete', json=batch)
+
+        assert_that(response.status_code).is_equal_to(422)
+
+
+def encode_delta(*instructions: Union[Tuple[int, int], bytes]) -> bytes:
+    delta: bytearray = bytearray()
+    for instruction in instructions:
+        if isinstance(instruction, bytes):
+            delta += b'L' + struct.pack('>Q', len(instruction)) + instruction
+        else:
+            delta += b'C' + struct.pack('>QQ', *instruction)
+    return bytes(delta)
+
+
+modified_content: bytes = test_content[:100] + b'modified part' + test_content[150:]
+modified_content_delta: bytes = encode_delta((0, 100), b'modified part', (150, len(test_content) - 150))
+
+
+async def update_with_delta(
+        aclient: AsyncClient, file_path: str, delta: bytes, **headers: str
+) -> Response:
+    signatures: Response = await aclient.get('/resumable/files/signatures', params={'file_path': file_path})
+    return await aclient.put(
+        '/resumable/files/delta',
+        params={'file_path': file_path},
+        content=delta,
+        headers={'if-match': signatures.headers.get('etag'), **headers}
+    )
+
+
+class TestFetchFileSignatures:
+
+    @pytest.mark.asyncio
+    async def test__file_exists__returns_signatures_of_blocks(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await store_whole_file(aclient, 'test_directory/test_file')
+            file_oid, = await fetch_file_oids(db)
+            blocks: List[bytes] = [test_content[start:start + 64] for start in range(0, len(test_content), 64)]
+
+            response: Response = await aclient.get(
+                '/resumable/files/signatures', params={'file_path': 'test_directory/test_file', 'block_size': 64}
+            )
+            signatures: FileSignatures = FileSignatures.parse_obj(response.json())
+
+            assert_that(response.status_code).is_equal_to(200)
+            assert_that(response.headers.get('etag')).is_equal_to(f'"{file_oid}"')
+            assert_that(signatures.version).is_equal_to(str(file_oid))
+            assert_that(signatures.file_size).is_equal_to(len(test_content))
+            assert_that(signatures.blocks).is_equal_to([
+                BlockSignature(weak=zlib.adler32(block), strong=hashlib.blake2b(block, digest_size=16).hexdigest())
+                for block in blocks
+            ])
+
+    @pytest.mark.parametrize('block_size', [1, 32 * 1024 * 1024])
+    @pytest.mark.asyncio
+    async def test__block_size_out_of_range__returns_422(
+            self, aclient: AsyncClient, db: Database, block_size: int
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await store_whole_file(aclient, 'test_directory/test_file')
+
+            response: Response = await aclient.get(
+                '/resumable/files/signatures',
+                params={'file_path': 'test_directory/test_file', 'block_size': block_size}
+            )
+
+            assert_that(response.status_code).is_equal_to(422)
+
+    @pytest.mark.asyncio
+    async def test__accessing_file_of_other_user__returns_404(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            response: Response = await aclient.get(
+                '/resumable/files/signatures', params={'file_path': str(test_files[2].file_path)}
+            )
+
+            assert_that(response.status_code).is_equal_to(404)
+
+
+class TestUpdateFileWithDelta:
+
+    @pytest.mark.asyncio
+    async def test__delta_correct__new_version_stored_in_place_of_old_one(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await store_whole_file(aclient, 'test_directory/test_file')
+            old_oid, = await fetch_file_oids(db)
+
+            response: Response = await update_with_delta(
+                aclient, 'test_directory/test_file', modified_content_delta,
+                **{'upload-checksum-algorithm': 'sha256', 'file-checksum': hashlib.sha256(modified_content).hexdigest()}
+            )
+            download: Response = await aclient.get(
+                '/resumable/files/stream', params={'file_path': 'test_directory/test_file'}
+            )
+            new_oid, = await fetch_file_oids(db)
+            # old version is queued for removal
+            await drain_blob_deletions(db)
+            old_blob_exists: bool = await db.execute(
+                'SELECT EXISTS(SELECT 1 FROM pg_largeobject_metadata WHERE oid = :loid)', {'loid': old_oid}
+            )
+
+            assert_that(response.status_code).is_equal_to(200)
+            assert_that(FileRead.parse_obj(response.json())).is_equal_to(FileRead(
+                file_path=Path('test_directory/test_file'),
+                file_size_mb=len(modified_content) / bytes_in_mb,
+                checksum=hashlib.sha256(modified_content).hexdigest()
+            ))
+            assert_that(response.headers.get('etag')).is_equal_to(f'"{new_oid}"')
+            assert_that(new_oid).is_not_equal_to(old_oid)
+            assert_that(download.content).is_equal_to(modified_content)
+            assert_that(old_blob_exists).is_false()
+
+    @pytest.mark.asyncio
+    async def test__blob_shared_with_other_file__other_file_keeps_old_version(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await store_whole_file(aclient, 'test_directory/original_file')
+            await store_whole_file(aclient, 'test_directory/copied_file')
+
+            response: Response = await update_with_delta(
+                aclient, 'test_directory/original_file', modified_content_delta
+            )
+            downloads: List[Response] = [await aclient.get(
+                '/resumable/files/stream', params={'file_path': file_path}
+            ) for file_path in ['test_directory/original_file', 'test_directory/copied_file']]
+
+            assert_that(response.status_code).is_equal_to(200)
+            assert_that([download.content for download in downloads]).is_equal_to([modified_content, test_content])
+
+    @pytest.mark.asyncio
+    async def test__file_modified_since_signatures_fetched__returns_412_and_file_not_modified(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await store_whole_file(aclient, 'test_directory/test_file')
+            signatures: Response = await aclient.get(
+                '/resumable/files/signatures', params={'file_path': 'test_directory/test_file'}
+            )
+            await update_with_delta(aclient, 'test_directory/test_file', encode_delta(b'other version'))
+
+            response: Response = await aclient.put(
+                '/resumable/files/delta',
+                params={'file_path': 'test_directory/test_file'},
+                content=modified_content_delta,
+                headers={'if-match': signatures.headers.get('etag')}
+            )
+            download: Response = await aclient.get(
+                '/resumable/files/stream', params={'file_path': 'test_directory/test_file'}
+            )
+
+            assert_that(response.status_code).is_equal_to(412)
+            assert_that(download.content).is_equal_to(b'other version')
+
+    @pytest.mark.parametrize('delta', [
+        encode_delta((100, len(test_content))),
+        encode_delta((0, 100))[:-3],
+        encode_delta(b'modified part')[:-3],
+        b'X' + encode_delta((0, 100))[1:]
+    ])
+    @pytest.mark.asyncio
+    async def test__delta_malformed__returns_400_and_file_not_modified(
+            self, aclient: AsyncClient, db: Database, delta: bytes
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await store_whole_file(aclient, 'test_directory/test_file')
+            oids: List[int] = await fetch_file_oids(db)
+
+            response: Response = await update_with_delta(aclient, 'test_directory/test_file', delta)
+            download: Response = await aclient.get(
+                '/resumable/files/stream', params={'file_path': 'test_directory/test_file'}
+            )
+
+            assert_that(response.status_code).is_equal_to(400)
+            assert_that(await fetch_file_oids(db)).is_equal_to(oids)
+            assert_that(download.content).is_equal_to(test_content)
+
+    @pytest.mark.asyncio
+    async def test__checksums_do_not_match__returns_460_and_file_not_modified(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await store_whole_file(aclient, 'test_directory/test_file')
+
+            response: Response = await update_with_delta(
+                aclient, 'test_directory/test_file', modified_content_delta,
+                **{'upload-checksum-algorithm': 'sha256', 'file-checksum': test_content_sha256}
+            )
+            download: Response = await aclient.get(
+                '/resumable/files/stream', params={'file_path': 'test_directory/test_file'}
+            )
+
+            assert_that(response.status_code).is_equal_to(460)
+            assert_that(download.content).is_equal_to(test_content)
+
+    @pytest.mark.asyncio
+    async def test__literal_data_exceeds_max_chunk_size__returns_413(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await store_whole_file(aclient, 'test_directory/test_file')
+
+            response: Response = await update_with_delta(
+                aclient, 'test_directory/test_file',
+                encode_delta(b'a' * (settings.max_chunk_size // 2), b'b' * (settings.max_chunk_size // 2 + 1))
+            )
+
+            assert_that(response.status_code).is_equal_to(413)
+
+    @pytest.mark.asyncio
+    async def test__accessing_file_of_other_user__returns_404(
+            self, aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            await insert_test_data(db)
+
+            response: Response = await aclient.put(
+                '/resumable/files/delta',
+                params={'file_path': str(test_files[2].file_path)},
+                content=modified_content_delta,
+                headers={'if-match': f'"{test_files[2].oid}"'}
+            )
+
+            assert_that(response.status_code).is_equal_to(404)
+
+
+class TestFileSystemBlobStorage:
+
+    @pytest.mark.asyncio
+    async def test__file_uploaded_in_chunks__file_streamed_from_disk(
+            self, file_system_aclient: AsyncClient, db: Database, tmp_path: Path
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(file_system_aclient, True)
+
+            response: Response = await file_system_aclient.get(
+                '/resumable/files/stream',
+                params={'file_path': file_path}
+            )
+            partial_response: Response = await file_system_aclient.get(
+                '/resumable/files/stream',
+                params={'file_path': file_path},
+                headers={'range': 'bytes=0-9'}
+            )
+
+            assert_that(response.status_code).is_equal_to(200)
+            assert_that(int(response.headers.get('content-length'))).is_equal_to(len(test_content))
+            assert_that(response.content).is_equal_to(test_content)
+            assert_that(partial_response.status_code).is_equal_to(206)
+            assert_that(partial_response.content).is_equal_to(test_content[:10])
+            assert_that([path.read_bytes() for path in tmp_path.glob('*/*/*')]).is_equal_to([test_content])
+
+    @pytest.mark.asyncio
+    async def test__file_deleted__blob_file_removed(
+            self, file_system_aclient: AsyncClient, db: Database, tmp_path: Path
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(file_system_aclient, True)
+
+            response: Response = await file_system_aclient.delete(
+                '/resumable/files',
+                params={'file_path': file_path}
+            )
+            await drain_blob_deletions(db, FileSystemBlobRepository(db, str(tmp_path)))
+
+            assert_that(response.status_code).is_equal_to(200)
+            assert_that(list(tmp_path.glob('*/*/*'))).is_empty()
+
+    @pytest.mark.asyncio
+    async def test__file_updated_with_delta__old_blob_file_replaced(
+            self, file_system_aclient: AsyncClient, db: Database, tmp_path: Path
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(file_system_aclient, True)
+
+            response: Response = await update_with_delta(file_system_aclient, file_path, modified_content_delta)
+            await drain_blob_deletions(db, FileSystemBlobRepository(db, str(tmp_path)))
+
+            assert_that(response.status_code).is_equal_to(200)
+            assert_that([path.read_bytes() for path in tmp_path.glob('*/*/*')]).is_equal_to([modified_content])
+
+
+class TestCompressedBlobStorage:
+
+    @pytest.mark.asyncio
+    async def test__client_accepts_gzip__compressed_file_sent_without_decompression(
+            self, compressed_aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(compressed_aclient, True)
+
+            async with compressed_aclient.stream(
+                    'GET', '/resumable/files/stream',
+                    params={'file_path': file_path}, headers={'accept-encoding': 'gzip'}
+            ) as response:
+                raw_content: bytes = b''.join([chunk async for chunk in response.aiter_raw()])
+            decoded: Response = await compressed_aclient.get(
+                '/resumable/files/stream', params={'file_path': file_path}, headers={'accept-encoding': 'gzip'}
+            )
+            files: Response = await compressed_aclient.get('/resumable/files/all')
+
+            assert_that(response.status_code).is_equal_to(200)
+            assert_that(response.headers.get('content-encoding')).is_equal_to('gzip')
+            assert_that(response.headers.get('vary')).is_equal_to('accept-encoding')
+            assert_that(int(response.headers.get('content-length'))).is_equal_to(len(raw_content))
+            assert_that(gzip.decompress(raw_content)).is_equal_to(test_content)
+            assert_that(decoded.content).is_equal_to(test_content)
+            assert_that(files.json()[0]['file_size_mb']).is_equal_to(len(test_content) / bytes_in_mb)
+
+    @pytest.mark.parametrize('accept_encoding', ['identity', 'br, gzip;q=0'])
+    @pytest.mark.asyncio
+    async def test__client_does_not_accept_gzip__file_decompressed(
+            self, compressed_aclient: AsyncClient, db: Database, accept_encoding: str
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(compressed_aclient, True)
+
+            response: Response = await compressed_aclient.get(
+                '/resumable/files/stream',
+                params={'file_path': file_path},
+                headers={'accept-encoding': accept_encoding}
+            )
+
+            assert_that(response.headers.get('content-encoding')).is_none()
+            assert_that(int(response.headers.get('content-length'))).is_equal_to(len(test_content))
+            assert_that(response.content).is_equal_to(test_content)
+
+    @pytest.mark.asyncio
+    async def test__range_requested__range_decompressed(
+            self, compressed_aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(compressed_aclient, True)
+
+            response: Response = await compressed_aclient.get(
+                '/resumable/files/stream',
+                params={'file_path': file_path},
+                headers={'range': 'bytes=250-299', 'accept-encoding': 'gzip'}
+            )
+            chunk: Response = await compressed_aclient.get(
+                '/resumable/files', params={'file_path': file_path, 'upload_offset': 250}
+            )
+
+            assert_that(response.status_code).is_equal_to(206)
+            assert_that(response.headers.get('content-encoding')).is_none()
+            assert_that(response.content).is_equal_to(test_content[250:300])
+            assert_that(chunk.json()).is_equal_to(test_content[250:250 + settings.max_chunk_size].decode('utf-8'))
+
+    @pytest.mark.asyncio
+    async def test__file_updated_with_delta__new_version_compressed(
+            self, compressed_aclient: AsyncClient, db: Database
+    ) -> None:
+        async with db.transaction(force_rollback=True):
+            file_path, location = await upload_file(compressed_aclient, True)
+
+            response: Response = await update_with_delta(compressed_aclient, file_path, modified_content_delta)
+            download: Response = await compressed_aclient.get(
+                '/resumable/files/stream', params={'file_path': file_path}, headers={'accept-encoding': 'gzip'}
+            )
+
+            assert_that(response.status_code).is_equal_to(200)
+            assert_that(download.headers.get('content-encoding')).is_equal_to('gzip')
+            assert_that(download.content).is_equal_to(modified_content)
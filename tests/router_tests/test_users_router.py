@@ -65,7 +65,7 @@ form_headers = {
 def mock_register_user(
         mocker: MockerFixture, user_info: Dict[str, Any]
 ) -> None:
-    def _register_user(
+    async def _register_user(
             self: Any, user: UserSignUp, roles: List[str]
     ) -> UserInfo:
         if not user or not roles: